@@ -0,0 +1,139 @@
+"""
+Synthetic PDF corpus generator.
+Papers are written as plain PDF 1.4 files with Helvetica text, so no PDF library is needed.
+"""
+from typing import Iterator, List
+from pathlib import Path
+import random
+
+VOCABULARY = (
+    "analysis approach architecture baseline benchmark classification coefficient computational "
+    "convergence correlation dataset deterministic distribution estimation evaluation experiment "
+    "framework generalization heterogeneous hypothesis implementation inference interpretation "
+    "learning measurement methodology model network observation optimization parameter performance "
+    "prediction probability regression representation robustness sampling significance simulation "
+    "statistical structure supervised technique theoretical training transformation validation "
+    "variance the of and a in to is for that with as on by we are this our results"
+).split()
+
+SECTIONS = ["1 Introduction", "2 Related Work", "3 Methods", "4 Results", "5 Discussion", "6 Conclusion", "References"]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+FONT_SIZE, LEADING = 10, 12
+TITLE_FONT_SIZE = 16
+AUTHORS = "Ada Lovelace, Alan Turing, Grace Hopper"
+DATE = "January 15, 2024"
+ABSTRACT_LINES = 6
+LINES_PER_PAGE = 58
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(words: Iterator[str], width: int, hyphenate: bool, rng: random.Random, count: int) -> List[str]:
+    """Wrap words into count lines of at most width characters, hyphenating long words at line ends."""
+    lines, line = [], ""
+    for word in words:
+        candidate = f"{line} {word}" if line else word
+        if len(candidate) <= width:
+            line = candidate
+            continue
+        room = width - len(line) - 2
+        if hyphenate and len(word) >= 8 and room >= 3 and rng.random() < 0.8:
+            split = min(room, len(word) - 3)
+            lines.append(f"{line} {word[:split]}-" if line else f"{word[:split]}-")
+            line = word[split:]
+        else:
+            lines.append(line)
+            line = word
+        if len(lines) >= count:
+            break
+    return lines[:count]
+
+
+def _page_lines(page: int, num_pages: int, columns: int, hyphenate: bool, rng: random.Random) -> List[List[str]]:
+    """Return the lines of each column of a page."""
+    width = 90 if columns == 1 else 42
+    words = iter(lambda: rng.choice(VOCABULARY), None)
+    column_lines = []
+    for column in range(columns):
+        lines = []
+        if page == 0 and column == 0:
+            lines += [f"A Synthetic Study of {rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY).title()}",
+                      AUTHORS, DATE, "", "Abstract"]
+            lines += _wrap(words, width, hyphenate, rng, ABSTRACT_LINES)
+        # Spread the section headings evenly over the document
+        section = (page * columns + column) * len(SECTIONS) // (num_pages * columns)
+        previous = ((page * columns + column - 1) * len(SECTIONS) // (num_pages * columns)
+                    if page or column else -1)
+        if section != previous:
+            lines += ["", SECTIONS[section]]
+        lines += _wrap(words, width, hyphenate, rng, LINES_PER_PAGE - len(lines))
+        column_lines.append(lines)
+    return column_lines
+
+
+def _content_stream(column_lines: List[List[str]], first_page: bool = False) -> bytes:
+    parts = []
+    column_width = (PAGE_WIDTH - 144) // len(column_lines)
+    for column, lines in enumerate(column_lines):
+        parts.append(f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {72 + column * column_width} {PAGE_HEIGHT - 72} Td")
+        for index, line in enumerate(lines):
+            if first_page and column == 0 and index == 0:
+                # The title is set in a larger font, as on a real first page
+                parts.append(f"/F1 {TITLE_FONT_SIZE} Tf ({_escape(line)}) Tj /F1 {FONT_SIZE} Tf T*")
+            else:
+                parts.append(f"({_escape(line)}) Tj T*")
+        parts.append("ET")
+    return "\n".join(parts).encode("latin-1")
+
+
+def generate_paper(path: str, num_pages: int, columns: int = 1, hyphenate: bool = True, seed: int = 0) -> str:
+    """Write a synthetic paper of num_pages pages to path and return the path."""
+    rng = random.Random(seed)
+    offsets = []
+    pages = [_page_lines(page, num_pages, columns, hyphenate, rng) for page in range(num_pages)]
+    title = pages[0][0][0]
+
+    with open(path, "wb") as file:
+        def write_object(number: int, body: bytes):
+            offsets.append((number, file.tell()))
+            file.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        file.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{4 + 2 * page} 0 R" for page in range(num_pages))
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for page in range(num_pages):
+            stream = _content_stream(pages[page], first_page=page == 0)
+            write_object(4 + 2 * page, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>").encode())
+            write_object(5 + 2 * page,
+                         f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        # Document information dictionary, as written by most authoring tools
+        info = 4 + 2 * num_pages
+        write_object(info, f"<< /Title ({_escape(title)}) /Author ({AUTHORS}) "
+                           f"/CreationDate (D:20240115120000Z) >>".encode("latin-1"))
+
+        xref_offset = file.tell()
+        size = info + 1
+        file.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for _, offset in sorted(offsets):
+            file.write(f"{offset:010d} 00000 n \n".encode())
+        file.write(f"trailer\n<< /Size {size} /Root 1 0 R /Info {info} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return path
+
+
+def generate_corpus(directory: str, page_counts=(1, 10, 100, 1000), layouts=(1, 2)) -> List[str]:
+    """Generate one paper per page count and column layout. Returns the paths."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for num_pages in page_counts:
+        for columns in layouts:
+            path = str(Path(directory) / f"paper_{num_pages}p_{columns}col.pdf")
+            paths.append(generate_paper(path, num_pages, columns=columns, seed=num_pages * 10 + columns))
+    return paths
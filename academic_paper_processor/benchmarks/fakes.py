@@ -0,0 +1,29 @@
+"""Offline stand-ins for the Gemini and BigQuery backends."""
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from pipeline.llm_client import FakeChatModel
+from pipeline.processor import PaperMetadata, ResearchContent
+from pipeline.storage import PaperStorage
+
+__all__ = ["FakeChatModel", "FakeStorage"]
+
+
+class FakeStorage(PaperStorage):
+    """In-memory storage with an optional per-call latency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.rows: List[dict] = []
+        self._lock = threading.Lock()
+
+    def store_paper(self, metadata: PaperMetadata, content: ResearchContent, paper_id: Optional[str] = None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows.append(self._build_row(metadata, content, paper_id))
+
+    def store_papers(self, papers: List[Tuple[PaperMetadata, ResearchContent, Optional[str]]]) -> Dict[int, str]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows.extend(self._build_row(*paper) for paper in papers)
+        return {}
@@ -0,0 +1,200 @@
+"""
+Offline benchmark of the full pipeline.
+
+Runs every stage against a synthetic corpus with fake LLM and storage backends and
+prints a JSON report with per-stage latency percentiles, documents/second, peak RSS and
+allocation counts. Run from the academic_paper_processor directory:
+
+    python -m benchmarks.run --pages 1,10,100 --output bench.json
+"""
+from typing import Any, Callable, Dict, List
+from pathlib import Path
+import argparse
+import datetime
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pipeline import AcademicPaperPipeline, CheckpointStore, ContentProcessor, PaperCache, PDFExtractor
+from pipeline.similarity import SimilarityIndex
+from .corpus import generate_corpus
+from .fakes import FakeChatModel, FakeStorage
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in seconds."""
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+def allocations(fn: Callable, *args) -> Dict[str, int]:
+    """
+    Count the memory blocks and bytes one call of fn still holds when it returns (its
+    result included), and the traced peak during the call.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = fn(*args)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    diff = after.compare_to(before, "filename")
+    return {
+        "retained_blocks": sum(max(0, stat.count_diff) for stat in diff),
+        "retained_bytes": sum(max(0, stat.size_diff) for stat in diff),
+        "peak_bytes": peak,
+    }
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def benchmark_stages(paths: List[str], repeat: int, llm_latency: float, storage_latency: float) -> Dict[str, Any]:
+    """Time each stage on its own for every document."""
+    extractor = PDFExtractor()
+    processor = ContentProcessor(llm=FakeChatModel(latency=llm_latency))
+    storage = FakeStorage(latency=storage_latency)
+
+    samples: Dict[str, List[float]] = {name: [] for name in
+                                       ("extract_text", "_clean_text", "extract_metadata", "analyze_content_parse",
+                                        "analyze_content", "store_paper")}
+    documents = {}
+    for path in paths:
+        raw_text = "\n".join(extractor._iter_raw_pages(path))
+        text = extractor.extract_text(path)
+        response = processor.llm.invoke(processor.analysis_prompt.format(text=text[:20000])).content
+        metadata, content = processor.analyze_content(text)
+
+        stages = {
+            "extract_text": (extractor.extract_text, path),
+            "_clean_text": (extractor._clean_text, raw_text),
+            "extract_metadata": (extractor.extract_metadata, path),
+            "analyze_content_parse": (processor._parse_response, response),
+            "analyze_content": (processor.analyze_content, text),
+            "store_paper": (storage.store_paper, metadata, content, "benchmark"),
+        }
+        document = {"characters": len(text)}
+        for name, (fn, *args) in stages.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn(*args)
+                timings.append(time.perf_counter() - start)
+            samples[name] += timings
+            document[name] = {**percentiles(timings), **allocations(fn, *args)}
+        documents[Path(path).name] = document
+
+    return {
+        "stages": {name: percentiles(values) for name, values in samples.items()},
+        "documents": documents,
+    }
+
+
+def benchmark_pipeline(paths: List[str], repeat: int, llm_latency: float, storage_latency: float) -> Dict[str, Any]:
+    """Run the whole graph and the batch mode with fake backends and an empty cache."""
+    def build(cache_dir: str) -> AcademicPaperPipeline:
+        return AcademicPaperPipeline(
+            content_processor=ContentProcessor(llm=FakeChatModel(latency=llm_latency)),
+            storage=FakeStorage(latency=storage_latency),
+            cache=PaperCache(cache_dir),
+            checkpoints=CheckpointStore(str(Path(cache_dir) / "checkpoints.db")),
+            fingerprints=SimilarityIndex(cache_dir, name="fingerprints"),
+        )
+
+    latencies, sequential_seconds, batch_seconds = [], 0.0, 0.0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pipeline = build(cache_dir)
+            for path in paths:
+                start = time.perf_counter()
+                pipeline.process_document(path)
+                latencies.append(time.perf_counter() - start)
+                sequential_seconds += latencies[-1]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            start = time.perf_counter()
+            results = build(cache_dir).process_batch(paths)
+            batch_seconds += time.perf_counter() - start
+            failures = [r["error"] for r in results if r["error"]]
+            if failures:
+                raise RuntimeError(f"Batch benchmark failed: {failures}")
+
+    documents = len(paths) * repeat
+    return {
+        "process_document": percentiles(latencies),
+        "documents_per_second": documents / sequential_seconds,
+        "batch_documents_per_second": documents / batch_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the academic paper pipeline.")
+    parser.add_argument("--pages", default="1,10,100,1000", help="Comma-separated page counts of the synthetic papers")
+    parser.add_argument("--layouts", default="1,2", help="Comma-separated column counts of the synthetic papers")
+    parser.add_argument("--corpus", default=None, help="Directory of PDFs to use instead of a synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="Seconds per fake storage call")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        if args.corpus:
+            paths = sorted(str(p) for p in Path(args.corpus).glob("*.pdf"))
+        else:
+            paths = generate_corpus(corpus_dir,
+                                    page_counts=[int(p) for p in args.pages.split(",")],
+                                    layouts=[int(c) for c in args.layouts.split(",")])
+
+        report = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+            **benchmark_stages(paths, args.repeat, args.llm_latency, args.storage_latency),
+            "pipeline": benchmark_pipeline(paths, args.repeat, args.llm_latency, args.storage_latency),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
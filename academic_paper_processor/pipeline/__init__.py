@@ -1,75 +1,230 @@
-from typing import Dict,Any
-import tempfile
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from langgraph.graph import Graph
 from .extractor import *
 from .processor import *
 from .storage import *
-from langgraph.graph import Graph, END, START
-from pydantic import BaseModel
+from .cache import PaperCache, compute_paper_id
+from .checkpoint import CheckpointStore, RetryQueue
+from . import resources
+from .metrics import metrics
+from .memory import MemoryBudget
+from dataclasses import dataclass
+import time
 
 
-# Define the state type that will be passed between nodes
-class GraphState(BaseModel):
+# Define the state type that will be passed between nodes. A single instance is passed
+# by reference through the graph; each node fills in its fields and returns it.
+@dataclass(slots=True)
+class GraphState:
     pdf_path: str
-    text: str = ""
-    metadata: Dict = {}
-    content: Dict = {}
+    paper_id: str = ""
+    text: Optional[str] = None
+    metadata: Optional[PaperMetadata] = None
+    content: Optional[ResearchContent] = None
     stored: bool = False
+    # paper_id of the near-duplicate whose analysis was reused instead of calling the LLM
+    duplicate_of: Optional[str] = None
+    # Bytes reserved from the pipeline's MemoryBudget until the text is released
+    reserved_bytes: int = 0
 
 class AcademicPaperPipeline:
     """Main pipeline class orchestrating the document processing workflow."""
 
-    def __init__(self, project_id: str = "your-project", dataset_id: str = "your-dataset", table_id: str = "your-table"):
-        self.pdf_extractor = PDFExtractor()
-        self.content_processor = ContentProcessor()
-        self.storage = BigQueryStorage(project_id, dataset_id,table_id)
+    # Characters of opening text (title, authors, abstract) compared to find near-duplicates
+    FINGERPRINT_CHARS = 5000
+
+    def __init__(self, project_id: str = "your-project", dataset_id: str = "your-dataset", table_id: str = "your-table",
+                 cache: Optional[PaperCache] = None, content_processor: Optional[ContentProcessor] = None,
+                 storage: Optional[PaperStorage] = None, memory_budget_bytes: Optional[int] = None,
+                 checkpoints: Optional[CheckpointStore] = None, retry_interval: float = 30.0,
+                 fingerprints=None, duplicate_threshold: Optional[float] = 0.9,
+                 metadata_confidence: Optional[float] = 0.7, buffered: bool = False,
+                 pdf_extractor: Optional[PDFExtractor] = None):
+        """
+        content_processor and storage default to the Gemini-backed ContentProcessor and
+        BigQueryStorage; pass another PaperStorage (e.g. LocalStorage) or fakes to run offline.
+        buffered makes the default BigQueryStorage write through its background BufferedWriter.
+        pdf_extractor defaults to a PDFExtractor reading whole documents in this process;
+        pass one with max_pages/max_bytes or processes to cap or parallelize extraction.
+        With memory_budget_bytes, the text of all documents processed at once is kept
+        under that many bytes (estimated from the PDF sizes, capped at the extractor's max_bytes).
+        Completed stages are checkpointed in checkpoints, and failed stores are retried in
+        the background every retry_interval seconds.
+        Before the LLM stage the opening text of a paper is compared with the papers already
+        processed (the fingerprints SimilarityIndex); when a cached analysis has a cosine
+        similarity of at least duplicate_threshold it is reused. None disables the check.
+        Title, authors, date and abstract are first read from the PDF itself; when their
+        confidence is at least metadata_confidence the LLM is only asked for the research
+        content. None always leaves the metadata to the LLM.
+        """
+        self.pdf_extractor = pdf_extractor if pdf_extractor is not None else PDFExtractor()
+        self.content_processor = content_processor if content_processor is not None else ContentProcessor()
+        if storage is None:
+            storage = BigQueryStorage(project_id, dataset_id,table_id, buffered=buffered,
+                                      search_index=resources.get_search_index(),
+                                      similarity_index=resources.get_similarity_index())
+        self.storage = storage
+        self.cache = cache if cache is not None else PaperCache()
+        self.memory_budget = (MemoryBudget(memory_budget_bytes, max_text_bytes=self.pdf_extractor.max_bytes)
+                              if memory_budget_bytes else None)
+        self.duplicate_threshold = duplicate_threshold
+        self.metadata_confidence = metadata_confidence
+        if fingerprints is None and duplicate_threshold is not None:
+            fingerprints = resources.get_similarity_index("fingerprints")
+        self.fingerprints = fingerprints if duplicate_threshold is not None else None
+        self.checkpoints = checkpoints if checkpoints is not None else CheckpointStore()
+        # Called with the paper_id of every paper stored, e.g. to drop cached reads of the table
+        self.on_stored: List[Callable[[str], None]] = []
+        self.retry_queue = RetryQueue(self.checkpoints, self.storage, on_stored=self._cache_result,
+                                      interval=retry_interval)
+        if self.checkpoints.pending_retries():
+            # Stores that failed in an earlier run are re-driven as soon as the pipeline exists
+            self.retry_queue.start()
         self.graph = self._build_graph()
 
-    def _build_graph(self) -> Graph:
+    # Graph nodes; each works on the shared GraphState and returns it
+
+    def _extract_text(self, state: GraphState) -> GraphState:
+        """Extract text from PDF, reusing the cached text of known papers."""
+        with metrics.stage("extract_text") as stage:
+            text = self.cache.get_text(state.paper_id)
+            if text is None:
+                text = self.pdf_extractor.extract_text(state.pdf_path, stats=stage)
+                self.cache.put_text(state.paper_id, text)
+            if stage is not None:
+                stage["characters"] = len(text)
+                stage["cached"] = "pages" not in stage
+        state.text = text
+        self.checkpoints.save(state.paper_id, "extract_text")
+        return state
+
+    def _release_text(self, state: GraphState):
+        """Drop the text of a processed document and give back its memory reservation."""
+        state.text = None
+        if self.memory_budget is not None:
+            self.memory_budget.release(state.reserved_bytes)
+            state.reserved_bytes = 0
+
+    @staticmethod
+    def _from_result(result: Dict[str, Any]) -> Tuple[PaperMetadata, ResearchContent]:
+        """Split a cached result back into its metadata and research content."""
+        return (PaperMetadata(**{field: result[field] for field in PaperMetadata.__fields__}),
+                ResearchContent(**{field: result[field] for field in ResearchContent.__fields__}))
+
+    def _find_duplicate(self, paper_id: str, text: str) -> Optional[Tuple[str, PaperMetadata, ResearchContent]]:
+        """
+        Return the paper_id and cached analysis of a near-duplicate of the paper (another
+        version of the same work), matched on opening text, then index the paper's own.
+        """
+        if self.fingerprints is None:
+            return None
+        fingerprint = text[:self.FINGERPRINT_CHARS]
+        matches = self.fingerprints.similar([fingerprint], k=3, exclude=[paper_id])[0]
+        self.fingerprints.add([paper_id], [fingerprint])
+        for match in matches:
+            if match["score"] < self.duplicate_threshold:
+                break
+            result = self.cache.get_result(match["paper_id"])
+            if result is not None:
+                return (match["paper_id"], *self._from_result(result))
+        return None
+
+    def _fast_metadata(self, pdf_path: str, stats: Optional[Dict] = None) -> Tuple[Optional[PaperMetadata], bool]:
+        """
+        Read the metadata from the PDF without the LLM. Returns it (None when nothing was
+        found or the fast stage is disabled) and whether it is confident enough to keep.
+        """
+        if self.metadata_confidence is None:
+            return None, False
+        try:
+            fields = self.pdf_extractor.extract_metadata(pdf_path, stats=stats)
+        except Exception as e:
+            # The LLM still reads the metadata; the failure is only recorded
+            if stats is not None:
+                stats["fast_metadata"] = False
+                stats["fast_metadata_error"] = f"{type(e).__name__}: {e}"
+            return None, False
+        confident = fields["confidence"] >= self.metadata_confidence
+        if stats is not None:
+            stats["fast_metadata"] = confident
+        if not any(fields[field] for field in PaperMetadata.__fields__):
+            return None, False
+        metadata = PaperMetadata(title=fields["title"] or "", authors=fields["authors"] or [],
+                                 publication_date=fields["publication_date"] or "", abstract=fields["abstract"] or "")
+        return metadata, confident
+
+    def _analyze(self, paper_id: str, pdf_path: str, text: str,
+                 stats: Optional[Dict] = None) -> Tuple[PaperMetadata, ResearchContent, Optional[str]]:
+        """
+        Analyze a paper's text, reusing the analysis of a near-duplicate when there is one.
+        Confident metadata read from the PDF is kept and only the content is left to the LLM.
+        """
+        duplicate = self._find_duplicate(paper_id, text)
+        if stats is not None:
+            stats["duplicate"] = duplicate is not None
+        if duplicate is not None:
+            duplicate_of, metadata, content = duplicate
+            return metadata, content, duplicate_of
+        metadata, confident = self._fast_metadata(pdf_path, stats)
+        return (*self.content_processor.analyze_content(text, stats=stats,
+                                                        metadata=metadata if confident else None), None)
+
+    def _process_content(self, state: GraphState) -> GraphState:
+        """Process the extracted text, then release it."""
+        with metrics.stage("process_content") as stage:
+            state.metadata, state.content, state.duplicate_of = self._analyze(state.paper_id, state.pdf_path, state.text,
+                                                                                 stats=stage)
+        self.checkpoints.save(state.paper_id, "process_content", state.metadata, state.content)
+        self._release_text(state)
+        return state
+
+    def _store_results(self, state: GraphState) -> GraphState:
+        """
+        Store the processed results. A failed store leaves state.stored False and queues
+        the checkpointed analysis for the retry queue instead of raising.
+        """
+        with metrics.stage("store_results") as stage:
+            start = time.perf_counter()
+            try:
+                self.storage.store_paper(state.metadata, state.content, paper_id=state.paper_id)
+            except Exception as e:
+                self.retry_queue.add(state.paper_id, str(e))
+                if stage is not None:
+                    stage["queued_for_retry"] = True
+                return state
+            if stage is not None:
+                stage["insert_seconds"] = time.perf_counter() - start
+        self.checkpoints.clear(state.paper_id)
+        state.stored = True
+        return state
+
+    def _resume_node(self, state: GraphState) -> str:
+        """Entry node of a run: papers with a checkpointed analysis only need to be stored."""
+        return "store_results" if state.content is not None else "extract_text"
+
+    def _resume(self, state: GraphState) -> bool:
+        """Load a paper's checkpointed analysis into state. Returns whether there was one."""
+        checkpoint = self.checkpoints.load(state.paper_id)
+        if checkpoint is None or checkpoint["content"] is None:
+            return False
+        state.metadata, state.content = checkpoint["metadata"], checkpoint["content"]
+        return True
+
+    def _build_graph(self) -> "Graph":
         """Build the LangGraph processing pipeline."""
-        graph = Graph()
+        from langgraph.graph import Graph, END, START
 
-        # Define node functions that work with the state
-        def extract_text(state: GraphState) -> GraphState:
-            """Extract text from PDF."""
-            text = self.pdf_extractor.extract_text(state.pdf_path)
-            return GraphState(
-                pdf_path=state.pdf_path,
-                text=text
-            )
-
-        def process_content(state: GraphState) -> GraphState:
-            """Process the extracted text."""
-            metadata, content = self.content_processor.analyze_content(state.text)
-            return GraphState(
-                pdf_path=state.pdf_path,
-                text=state.text,
-                metadata=metadata.dict(),
-                content=content.dict()
-            )
-
-        def store_results(state: GraphState) -> GraphState:
-            """Store the processed results."""
-            self.storage.store_paper(
-                PaperMetadata(**state.metadata),
-                ResearchContent(**state.content)
-            )
-            return GraphState(
-                pdf_path=state.pdf_path,
-                text=state.text,
-                metadata=state.metadata,
-                content=state.content,
-                stored=True
-            )
+        graph = Graph()
 
         # Add nodes
-        graph.add_node("extract_text", extract_text)
-        graph.add_node("process_content", process_content)
-        graph.add_node("store_results", store_results)
+        graph.add_node("extract_text", self._extract_text)
+        graph.add_node("process_content", self._process_content)
+        graph.add_node("store_results", self._store_results)
 
         # Define edges
-        graph.add_edge(START, "extract_text")
+        graph.add_conditional_edges(START, self._resume_node, ["extract_text", "store_results"])
         graph.add_edge("extract_text", "process_content")
         graph.add_edge("process_content", "store_results")
         graph.add_edge("store_results", END)
@@ -80,17 +235,268 @@ class AcademicPaperPipeline:
     def process_document(self, pdf_path: str) -> Dict[str, Any]:
         """
         Process a single document using direct graph invocation.
+        Papers are identified by the SHA-256 of their bytes; known papers are served
+        from the cache without running the graph, and papers with a checkpointed analysis
+        resume at the store. When the store fails the result has stored=False and the
+        paper is stored later by the retry queue.
         """
+        paper_id = compute_paper_id(pdf_path)
+        cached = self.cache.get_result(paper_id)
+        if cached is not None:
+            return {**cached, "processed_file": pdf_path, "stored": True, "cached": True}
+
         # Create initial state as a GraphState object
-        initial_state = GraphState(pdf_path=pdf_path)
+        initial_state = GraphState(pdf_path=pdf_path, paper_id=paper_id)
+        if not self._resume(initial_state) and self.memory_budget is not None:
+            initial_state.reserved_bytes = self.memory_budget.acquire(self.memory_budget.estimate(pdf_path))
 
         # Invoke the graph with the initial state
-        final_state = self.graph.invoke(initial_state)
+        try:
+            final_state = self.graph.invoke(initial_state)
+        finally:
+            if self.memory_budget is not None:
+                self.memory_budget.release(initial_state.reserved_bytes)
+                initial_state.reserved_bytes = 0
+        return self._finish(final_state)
+
+    def _cache_result(self, paper_id: str, metadata: PaperMetadata, content: ResearchContent):
+        """Remember the result of a stored paper and notify the on_stored callbacks."""
+        self.cache.put_result(paper_id, {**metadata.dict(), **content.dict(), "paper_id": paper_id})
+        for callback in self.on_stored:
+            callback(paper_id)
+
+    def _finish(self, state: GraphState) -> Dict[str, Any]:
+        """Cache the result of a processed document once it is stored, and return it."""
+        results = {**state.metadata.dict(), **state.content.dict()}
+        if state.stored:
+            self._cache_result(state.paper_id, state.metadata, state.content)
 
         # Return combined results
         return {
-            **final_state.metadata,
-            **final_state.content,
-            "processed_file": final_state.pdf_path,
-            "stored": final_state.stored
-        }
\ No newline at end of file
+            **results,
+            "paper_id": state.paper_id,
+            "processed_file": state.pdf_path,
+            "stored": state.stored,
+            "cached": False,
+            "duplicate_of": state.duplicate_of
+        }
+
+    def stream_document(self, pdf_path: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming version of process_document.
+        Yields ("stage", "extracting" | "analyzing" | "storing") as each stage starts, the
+        ("metadata", PaperMetadata), per-section and ("content", ResearchContent) events of
+        ContentProcessor.stream_analysis while the model's response arrives, and finally
+        ("results", dict) with process_document's result.
+        The metadata read from the PDF is yielded before the text is extracted; when it is
+        not confident, the metadata checked by the LLM follows later and replaces it.
+        Known papers yield the same events from the cache, and papers with a checkpointed
+        analysis from their checkpoint.
+        """
+        paper_id = compute_paper_id(pdf_path)
+        cached = self.cache.get_result(paper_id)
+        if cached is not None:
+            metadata, content = self._from_result(cached)
+            yield "metadata", metadata
+            yield "content", content
+            yield "results", {**cached, "processed_file": pdf_path, "stored": True, "cached": True}
+            return
+
+        state = GraphState(pdf_path=pdf_path, paper_id=paper_id)
+        if self._resume(state):
+            yield "metadata", state.metadata
+            yield "content", state.content
+            yield "stage", "storing"
+            self._store_results(state)
+            yield "results", self._finish(state)
+            return
+
+        if self.memory_budget is not None:
+            state.reserved_bytes = self.memory_budget.acquire(self.memory_budget.estimate(pdf_path))
+        try:
+            yield "stage", "extracting"
+            with metrics.stage("fast_metadata") as stage:
+                metadata, confident = self._fast_metadata(pdf_path, stats=stage)
+            if metadata is not None:
+                yield "metadata", metadata
+            self._extract_text(state)
+            yield "stage", "analyzing"
+            with metrics.stage("process_content") as stage:
+                duplicate = self._find_duplicate(state.paper_id, state.text)
+                if stage is not None:
+                    stage["duplicate"] = duplicate is not None
+                if duplicate is not None:
+                    state.duplicate_of, state.metadata, state.content = duplicate
+                    yield "metadata", state.metadata
+                    yield "content", state.content
+                else:
+                    for event, value in self.content_processor.stream_analysis(
+                            state.text, stats=stage, metadata=metadata if confident else None):
+                        if event == "metadata":
+                            state.metadata = value
+                            if confident:
+                                # Already sent before extraction
+                                continue
+                        elif event == "content":
+                            state.content = value
+                        yield event, value
+            self.checkpoints.save(state.paper_id, "process_content", state.metadata, state.content)
+            self._release_text(state)
+        finally:
+            if self.memory_budget is not None:
+                self.memory_budget.release(state.reserved_bytes)
+                state.reserved_bytes = 0
+        yield "stage", "storing"
+        self._store_results(state)
+        yield "results", self._finish(state)
+
+    def process_batch(self, paths: Union[str, Path, Iterable[Union[str, Path]]],
+                      max_workers: Optional[int] = None,
+                      max_llm_concurrency: int = 4,
+                      store_batch_size: int = 50) -> List[Dict[str, Any]]:
+        """
+        Process many documents concurrently.
+        PDFs are extracted in a process pool, the LLM calls run in a thread pool of at most
+        max_llm_concurrency workers and results are written to storage in groups of
+        store_batch_size as soon as they are analyzed. Extraction only runs a few documents
+        ahead of the LLM pool, so extracted texts do not pile up waiting for it.
+        Returns one result per document in input order; failures are recorded in the
+        "error" field instead of being raised. A PDF given more than once (the same path
+        or a byte-identical copy) is processed once and its result copied to the others.
+        With a memory budget, documents are processed in consecutive waves whose
+        estimated text fits in the budget.
+        """
+        if isinstance(paths, (str, Path)) and Path(paths).is_dir():
+            pdf_paths = sorted(str(p) for p in Path(paths).glob("*.pdf"))
+        elif isinstance(paths, (str, Path)):
+            pdf_paths = [str(paths)]
+        else:
+            pdf_paths = [str(p) for p in paths]
+
+        waves = self.memory_budget.waves(pdf_paths) if self.memory_budget is not None else [pdf_paths]
+        results = []
+        for wave in waves:
+            results += self._process_wave(wave, max_workers, max_llm_concurrency, store_batch_size)
+        return results
+
+    def _process_wave(self, pdf_paths: List[str], max_workers: Optional[int],
+                      max_llm_concurrency: int, store_batch_size: int) -> List[Dict[str, Any]]:
+        """Run process_batch's pools over one group of documents."""
+        results: List[Dict[str, Any]] = [
+            {"processed_file": path, "stored": False, "cached": False, "duplicate_of": None, "error": None}
+            for path in pdf_paths
+        ]
+        pending = []  # (index, metadata, content) waiting to be stored
+
+        def flush():
+            if not pending:
+                return
+            try:
+                errors = self.storage.store_papers([
+                    (metadata, content, results[index]["paper_id"]) for index, metadata, content in pending
+                ])
+            except Exception as e:
+                errors = {position: str(e) for position in range(len(pending))}
+            for position, (index, metadata, content) in enumerate(pending):
+                paper_id = results[index]["paper_id"]
+                if position in errors:
+                    # The analysis is checkpointed; the retry queue stores it later
+                    results[index]["error"] = errors[position]
+                    self.retry_queue.add(paper_id, errors[position])
+                else:
+                    results[index]["stored"] = True
+                    self.checkpoints.clear(paper_id)
+                    self._cache_result(paper_id, metadata, content)
+            pending.clear()
+
+        # Known papers are answered from the cache and skip every stage; papers with a
+        # checkpointed analysis go straight to the store
+        to_extract = deque()
+        to_analyze = deque()  # indices whose extracted text is cached
+        first_index: Dict[str, int] = {}
+        copies: Dict[int, List[int]] = {}  # index processed -> indices of the same paper
+        for index, path in enumerate(pdf_paths):
+            try:
+                paper_id = compute_paper_id(path)
+            except Exception as e:
+                results[index]["error"] = f"Extraction failed: {e}"
+                continue
+            results[index]["paper_id"] = paper_id
+            if paper_id in first_index:
+                copies.setdefault(first_index[paper_id], []).append(index)
+                continue
+            first_index[paper_id] = index
+            cached = self.cache.get_result(paper_id)
+            if cached is not None:
+                results[index].update({**cached, "stored": True, "cached": True})
+                continue
+            checkpoint = self.checkpoints.load(paper_id)
+            if checkpoint is not None and checkpoint["content"] is not None:
+                results[index].update({**checkpoint["metadata"].dict(), **checkpoint["content"].dict()})
+                pending.append((index, checkpoint["metadata"], checkpoint["content"]))
+                continue
+            if self.cache.has_text(paper_id):
+                to_analyze.append(index)
+            else:
+                to_extract.append(index)
+
+        # At most one queued call per LLM worker, and extracted texts waiting for one of
+        # those slots are limited the same way
+        llm_slots = 2 * max_llm_concurrency
+        extracted = deque()  # (index, text) waiting for an LLM slot
+        extract_futures: Dict[Any, int] = {}
+        llm_futures: Dict[Any, int] = {}
+
+        with ProcessPoolExecutor(max_workers=max_workers) as extract_pool, \
+                ThreadPoolExecutor(max_workers=max_llm_concurrency) as llm_pool:
+
+            def submit():
+                while len(llm_futures) < llm_slots and (extracted or to_analyze):
+                    if extracted:
+                        index, text = extracted.popleft()
+                    else:
+                        index = to_analyze.popleft()
+                        text = self.cache.get_text(results[index]["paper_id"])
+                        if text is None:  # evicted since it was checked
+                            to_extract.appendleft(index)
+                            continue
+                    llm_futures[llm_pool.submit(self._analyze, results[index]["paper_id"], pdf_paths[index],
+                                                text)] = index
+                while to_extract and len(extract_futures) + len(extracted) < llm_slots:
+                    index = to_extract.popleft()
+                    extract_futures[extract_pool.submit(self.pdf_extractor.extract_text, pdf_paths[index])] = index
+
+            submit()
+            while extract_futures or llm_futures:
+                done, _ = wait(list(extract_futures) + list(llm_futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in extract_futures:
+                        index = extract_futures.pop(future)
+                        try:
+                            text = future.result()
+                        except Exception as e:
+                            results[index]["error"] = f"Extraction failed: {e}"
+                            continue
+                        self.cache.put_text(results[index]["paper_id"], text)
+                        extracted.append((index, text))
+                        continue
+
+                    index = llm_futures.pop(future)
+                    try:
+                        metadata, content, duplicate_of = future.result()
+                    except Exception as e:
+                        results[index]["error"] = f"Analysis failed: {e}"
+                        continue
+                    results[index]["duplicate_of"] = duplicate_of
+                    self.checkpoints.save(results[index]["paper_id"], "process_content", metadata, content)
+                    results[index].update({**metadata.dict(), **content.dict()})
+                    pending.append((index, metadata, content))
+                    if len(pending) >= store_batch_size:
+                        flush()
+                submit()
+
+        flush()
+        for index, duplicates in copies.items():
+            for duplicate in duplicates:
+                results[duplicate] = {**results[index], "processed_file": pdf_paths[duplicate]}
+        return results
@@ -0,0 +1,110 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+
+
+def compute_paper_id(pdf_path: str) -> str:
+    """Compute the paper identity as the SHA-256 of the PDF bytes."""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PaperCache:
+    """
+    Local on-disk cache of extracted text and analysis results keyed by paper_id.
+    The cache is bounded to max_bytes; the least recently used entries are evicted first.
+    Entry sizes and their recency are kept in memory, so the directory is only scanned
+    when the cache is opened.
+    """
+
+    TEXT_SUFFIX = ".text.txt"
+    RESULT_SUFFIX = ".result.json"
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 512 * 1024 * 1024):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "PAPER_CACHE_DIR",
+                str(Path.home() / ".cache" / "academic_paper_processor")
+            )
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # File name -> size, least recently used first; the mtime orders entries across restarts
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        scanned = []
+        for path in self.cache_dir.iterdir():
+            if not path.name.endswith((self.TEXT_SUFFIX, self.RESULT_SUFFIX)):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            scanned.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(scanned):
+            self._entries[name] = size
+            self._total += size
+
+    def _path(self, paper_id: str, suffix: str) -> Path:
+        return self.cache_dir / f"{paper_id}{suffix}"
+
+    def _read(self, path: Path) -> Optional[str]:
+        try:
+            data = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(path.name, 0)
+            return None
+        # Touch the entry so it becomes the most recently used one
+        os.utime(path)
+        with self._lock:
+            if path.name in self._entries:
+                self._entries.move_to_end(path.name)
+        return data
+
+    def _write(self, path: Path, data: str):
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(data, encoding="utf-8")
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total += size - self._entries.pop(path.name, 0)
+            self._entries[path.name] = size
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes. Called under the lock."""
+        while self._total > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            (self.cache_dir / name).unlink(missing_ok=True)
+            self._total -= size
+
+    def get_text(self, paper_id: str) -> Optional[str]:
+        """Return the cached extracted text of a paper, if any."""
+        return self._read(self._path(paper_id, self.TEXT_SUFFIX))
+
+    def has_text(self, paper_id: str) -> bool:
+        """Whether the extracted text of a paper is cached, without reading it."""
+        return self._path(paper_id, self.TEXT_SUFFIX).name in self._entries
+
+    def put_text(self, paper_id: str, text: str):
+        """Cache the extracted text of a paper."""
+        self._write(self._path(paper_id, self.TEXT_SUFFIX), text)
+
+    def get_result(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis result of a paper, if any."""
+        data = self._read(self._path(paper_id, self.RESULT_SUFFIX))
+        return json.loads(data) if data is not None else None
+
+    def put_result(self, paper_id: str, result: Dict[str, Any]):
+        """Cache the analysis result of a paper."""
+        self._write(self._path(paper_id, self.RESULT_SUFFIX), json.dumps(result))
@@ -0,0 +1,245 @@
+"""
+Stage checkpoints and the persistent store retry queue.
+
+The pipeline records the last completed node of every paper in a local SQLite file, so a
+run that fails or is interrupted resumes from that node instead of paying for extraction
+and LLM analysis again. Analyses whose store failed stay checkpointed and are queued for
+RetryQueue, which stores them again in the background until the storage accepts them.
+Stores that fail with a permanent error, or too many times, are moved to a dead-letter
+table instead of being retried forever.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+import time
+from .processor import PaperMetadata, ResearchContent
+
+
+class CheckpointStore:
+    """SQLite store of the last completed stage of each paper and of the pending store retries."""
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = os.environ.get(
+                "PAPER_CHECKPOINT_DB",
+                str(Path.home() / ".cache" / "academic_paper_processor" / "checkpoints.db")
+            )
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    paper_id TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    metadata TEXT,
+                    content TEXT,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_retries (
+                    paper_id TEXT PRIMARY KEY,
+                    attempts INTEGER NOT NULL,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    paper_id TEXT PRIMARY KEY,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    failed_at TEXT NOT NULL
+                )
+            """)
+
+    def save(self, paper_id: str, stage: str, metadata: Optional[PaperMetadata] = None,
+             content: Optional[ResearchContent] = None):
+        """Record that stage completed for a paper, with the analysis once there is one."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (paper_id, stage,
+                 json.dumps(metadata.dict()) if metadata is not None else None,
+                 json.dumps(content.dict()) if content is not None else None,
+                 datetime.utcnow().isoformat()))
+
+    def load(self, paper_id: str) -> Optional[Dict]:
+        """Return {"stage", "metadata", "content"} of a paper's last checkpoint, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stage, metadata, content FROM checkpoints WHERE paper_id = ?", (paper_id,)).fetchone()
+        if row is None:
+            return None
+        stage, metadata, content = row
+        return {
+            "stage": stage,
+            "metadata": PaperMetadata(**json.loads(metadata)) if metadata else None,
+            "content": ResearchContent(**json.loads(content)) if content else None,
+        }
+
+    def clear(self, paper_id: str):
+        """Forget a stored paper's checkpoint, pending retry and dead letter."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE paper_id = ?", (paper_id,))
+            self._conn.execute("DELETE FROM store_retries WHERE paper_id = ?", (paper_id,))
+            self._conn.execute("DELETE FROM dead_letters WHERE paper_id = ?", (paper_id,))
+
+    def enqueue_retry(self, paper_id: str, error: str, delay: Callable[[int], float]) -> int:
+        """
+        Queue a failed store, or count another failure of a queued one. The next attempt
+        is due after delay(attempts) seconds. Returns the number of failed attempts.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts FROM store_retries WHERE paper_id = ?", (paper_id,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            self._conn.execute("INSERT OR REPLACE INTO store_retries VALUES (?, ?, ?, ?)",
+                               (paper_id, attempts, time.time() + delay(attempts), error))
+        return attempts
+
+    def due_retries(self, limit: int = 50) -> List[Tuple[str, PaperMetadata, ResearchContent]]:
+        """Return up to limit queued stores whose next attempt is due, with their analysis."""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT r.paper_id, c.metadata, c.content
+                FROM store_retries r JOIN checkpoints c USING (paper_id)
+                WHERE r.next_attempt <= ? AND c.metadata IS NOT NULL AND c.content IS NOT NULL
+                ORDER BY r.next_attempt
+                LIMIT ?
+            """, (time.time(), limit)).fetchall()
+        return [(paper_id, PaperMetadata(**json.loads(metadata)), ResearchContent(**json.loads(content)))
+                for paper_id, metadata, content in rows]
+
+    def pending_retries(self) -> int:
+        """Number of queued stores, due or not. Dead letters are not counted."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM store_retries").fetchone()[0]
+
+    def dead_letter(self, paper_id: str):
+        """Stop retrying a queued store. Its checkpointed analysis is kept for inspection."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO dead_letters
+                SELECT paper_id, attempts, last_error, ? FROM store_retries WHERE paper_id = ?
+            """, (datetime.utcnow().isoformat(), paper_id))
+            self._conn.execute("DELETE FROM store_retries WHERE paper_id = ?", (paper_id,))
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        """Stores given up on, newest first, as {"paper_id", "attempts", "last_error", "failed_at"}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT paper_id, attempts, last_error, failed_at FROM dead_letters ORDER BY failed_at DESC").fetchall()
+        return [dict(zip(["paper_id", "attempts", "last_error", "failed_at"], row)) for row in rows]
+
+    def requeue_dead_letter(self, paper_id: str):
+        """Queue a dead-lettered store again, e.g. after fixing its row or the table."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO store_retries
+                SELECT paper_id, 0, 0, last_error FROM dead_letters WHERE paper_id = ?
+            """, (paper_id,))
+            self._conn.execute("DELETE FROM dead_letters WHERE paper_id = ?", (paper_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RetryQueue:
+    """
+    Background thread re-driving the stores queued in a CheckpointStore.
+    Every interval seconds the due entries are stored in one store_papers call; failures
+    are retried with exponential backoff from base_delay up to max_delay seconds. A store
+    rejected as invalid (a bad value in the row), or failing max_attempts times, is
+    dead-lettered.
+    """
+
+    # Row errors that a retry cannot fix, as reported by BigQuery's insertAll
+    PERMANENT_ERRORS = ("'reason': 'invalid'",)
+
+    def __init__(self, checkpoints: CheckpointStore, storage,
+                 on_stored: Optional[Callable[[str, PaperMetadata, ResearchContent], None]] = None,
+                 interval: float = 30.0, base_delay: float = 30.0, max_delay: float = 3600.0, batch_size: int = 50,
+                 max_attempts: int = 10):
+        self.checkpoints = checkpoints
+        self.storage = storage
+        self.on_stored = on_stored
+        self.interval = interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _delay(self, attempts: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def _record_failure(self, paper_id: str, error: str) -> bool:
+        """Count a failed store and dead-letter it when it cannot succeed. Returns whether it is still queued."""
+        attempts = self.checkpoints.enqueue_retry(paper_id, error, self._delay)
+        if attempts >= self.max_attempts or any(marker in error for marker in self.PERMANENT_ERRORS):
+            self.checkpoints.dead_letter(paper_id)
+            return False
+        return True
+
+    def add(self, paper_id: str, error: str):
+        """Queue the checkpointed analysis of a paper whose store failed, and make sure the thread runs."""
+        if self._record_failure(paper_id, error):
+            self.start()
+
+    def start(self):
+        """Start the background thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="store-retry-queue", daemon=True)
+                self._thread.start()
+
+    def drain(self) -> int:
+        """Store the due entries once. Returns how many were stored."""
+        stored = 0
+        attempted = set()
+        while True:
+            # An entry that failed again in this pass waits for its next attempt
+            due = [entry for entry in self.checkpoints.due_retries(self.batch_size) if entry[0] not in attempted]
+            if not due:
+                return stored
+            attempted.update(paper_id for paper_id, _, _ in due)
+            try:
+                errors = self.storage.store_papers([(metadata, content, paper_id)
+                                                    for paper_id, metadata, content in due])
+            except Exception as e:
+                errors = {i: str(e) for i in range(len(due))}
+            for position, (paper_id, metadata, content) in enumerate(due):
+                if position in errors:
+                    self._record_failure(paper_id, errors[position])
+                    continue
+                self.checkpoints.clear(paper_id)
+                stored += 1
+                if self.on_stored is not None:
+                    self.on_stored(paper_id, metadata, content)
+
+    def _run(self):
+        # The thread exits once nothing is left to retry; add() starts it again
+        while not self._stop.wait(self.interval):
+            self.drain()
+            with self._lock:
+                if not self.checkpoints.pending_retries():
+                    self._thread = None
+                    return
+
+    def close(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
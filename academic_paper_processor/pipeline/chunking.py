@@ -0,0 +1,126 @@
+from typing import List, Tuple
+import re
+
+# Words, runs of digits and single punctuation marks, as a BPE/SentencePiece tokenizer sees them
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+
+# Canonical section name for each heading spelling
+_SECTION_NAMES = {
+    "abstract": "abstract",
+    "introduction": "introduction",
+    "background": "background",
+    "related work": "background",
+    "method": "methods",
+    "methods": "methods",
+    "methodology": "methods",
+    "materials and methods": "methods",
+    "experiment": "methods",
+    "experiments": "methods",
+    "experimental setup": "methods",
+    "results": "results",
+    "evaluation": "results",
+    "discussion": "discussion",
+    "conclusion": "conclusion",
+    "conclusions": "conclusion",
+    "acknowledgment": "acknowledgments",
+    "acknowledgments": "acknowledgments",
+    "acknowledgement": "acknowledgments",
+    "acknowledgements": "acknowledgments",
+    "references": "references",
+    "bibliography": "references",
+    "appendix": "appendix",
+    "appendices": "appendix",
+}
+
+# Sections that cost tokens without adding anything to the analysis
+LOW_VALUE_SECTIONS = {"references", "acknowledgments", "appendix"}
+
+
+def _alternatives(names) -> str:
+    return "|".join(sorted((re.escape(name) for name in names), key=len, reverse=True))
+
+
+_HEADINGS = _alternatives(_SECTION_NAMES)
+_BODY_HEADINGS = _alternatives(name for name, section in _SECTION_NAMES.items() if section not in LOW_VALUE_SECTIONS)
+# A heading is numbered ("3. Methods", "IV RESULTS"), written in capitals ("RESULTS") or,
+# for body sections only, title-cased and directly followed by a capitalized word
+# ("Results We ..."). Extracted text has no line breaks, so a title-cased back-matter word
+# is as likely to be a reference from the text ("see Appendix A.") and is not a heading.
+_HEADING_PATTERN = re.compile(
+    rf"(?:(?<=\s)|^)(?:"
+    rf"(?:\d{{1,2}}|[IVX]{{1,4}})\.?\s+(?P<numbered>(?i:{_HEADINGS}))"
+    rf"|(?P<upper>{_HEADINGS.upper()})"
+    rf"|(?P<title>(?i:{_BODY_HEADINGS}))(?=[\s:.]+[A-Z\[(\d])"
+    rf")\b"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of text for a subword tokenizer.
+    Short words are one token, longer words one more token per 4 characters, digits are
+    grouped by 3 and punctuation marks are a token each.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif len(piece) <= 6:
+            tokens += 1
+        else:
+            tokens += 1 + (len(piece) - 3) // 4
+    return tokens
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    Split paper text into (section, text) pairs at recognized headings.
+    Text before the first heading (title, authors...) is returned as the "front" section.
+    """
+    sections = []
+    name, start = "front", 0
+    for match in _HEADING_PATTERN.finditer(text):
+        heading = match.group("numbered") or match.group("upper") or match.group("title")
+        if not heading[0].isupper():
+            continue
+        canonical = _SECTION_NAMES[heading.lower()]
+        sections.append((name, text[start:match.start()].strip()))
+        name, start = canonical, match.start()
+    sections.append((name, text[start:].strip()))
+    return [(name, body) for name, body in sections if body]
+
+
+def drop_low_value_sections(sections: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Remove references, acknowledgments and appendices."""
+    return [(name, body) for name, body in sections if name not in LOW_VALUE_SECTIONS]
+
+
+def _split_oversized(body: str, max_tokens: int) -> List[str]:
+    """Split a section that does not fit in one chunk at sentence boundaries."""
+    parts, current, current_tokens = [], [], 0
+    for sentence in re.split(r"(?<=[.!?])\s+", body):
+        sentence_tokens = estimate_tokens(sentence)
+        if current and current_tokens + sentence_tokens > max_tokens:
+            parts.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += sentence_tokens
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+def chunk_sections(sections: List[Tuple[str, str]], max_tokens: int) -> List[str]:
+    """Pack consecutive sections into chunks of at most max_tokens estimated tokens."""
+    chunks, current, current_tokens = [], [], 0
+    for _, body in sections:
+        for part in _split_oversized(body, max_tokens):
+            part_tokens = estimate_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
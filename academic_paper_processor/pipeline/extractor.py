@@ -1,28 +1,303 @@
-from typing import Dict, List, Optional
-import PyPDF2
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
 import re
 
+# Hyphenation at a line break ("exam-\nple") or any other run of whitespace, matched in one pass
+_CLEAN_PATTERN = re.compile(r'(?<=\w)-[ \t\r\f\v]*\n\s*(?=\w)|\s+')
+# A word split by a hyphen at the very end of a page
+_TRAILING_HYPHEN = re.compile(r'(\w+)-$')
+
+
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+           "september", "october", "november", "december"]
+_MONTH = r"(?P<month>" + "|".join(m[:3] + r"[a-z]*\.?" for m in _MONTHS) + ")"
+# Full dates as printed on first pages: 2023-03-15, 15 March 2023, March 15, 2023
+_FULL_DATE_PATTERNS = [
+    re.compile(r"\b(?P<year>(?:19|20)\d\d)-(?P<month>\d\d)-(?P<day>\d\d)\b"),
+    re.compile(r"\b(?P<day>\d{1,2})\s+" + _MONTH + r",?\s+(?P<year>(?:19|20)\d\d)\b", re.IGNORECASE),
+    re.compile(r"\b" + _MONTH + r"\s+(?P<day>\d{1,2}),?\s+(?P<year>(?:19|20)\d\d)\b", re.IGNORECASE),
+]
+_MONTH_YEAR_PATTERN = re.compile(r"\b" + _MONTH + r",?\s+(?P<year>(?:19|20)\d\d)\b", re.IGNORECASE)
+_ABSTRACT_HEADING = re.compile(r"^\s*abstract\b[\s.:\u2014-]*", re.IGNORECASE)
+# Where an abstract ends: the first section heading or the keywords line
+_ABSTRACT_END = re.compile(r"^\s*(?:(?:1|I)\.?\s+)?(?:introduction|keywords|key words|index terms)\b", re.IGNORECASE)
+# Document info titles left behind by authoring tools rather than set by the authors
+_PLACEHOLDER_TITLE = re.compile(r"^(?:untitled|microsoft word|title)\b|\.(?:pdf|docx?|tex|dvi)$", re.IGNORECASE)
+_NAME_PATTERN = re.compile(r"^[A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*){1,3}$")
+_AFFILIATION_WORDS = re.compile(r"\b(?:university|institute|department|laboratory|school|college|inc|ltd)\b|@",
+                                re.IGNORECASE)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _split_authors(text: str) -> List[str]:
+    """Split an author line into the names it lists, dropping footnote marks."""
+    text = re.sub(r"[\d*\u2020\u2021\u00a7\u00b6]+", " ", text)
+    parts = re.split(r"\s*(?:,|;|\band\b|&)\s*", text)
+    return [" ".join(part.split()) for part in parts if part.strip()]
+
+
+def _info_text(info, key: str) -> str:
+    """
+    A text entry of the document information dictionary, "" when missing or not text.
+    Indexing resolves indirect objects, which info.get() would return unresolved.
+    """
+    value = info[key] if key in info else None
+    return value if isinstance(value, str) else ""
+
+
+def _parse_date(match: "re.Match") -> Optional[str]:
+    """Format a matched date as YYYY-MM-DD, with day 1 when only the month is known."""
+    month = match.group("month")
+    month = int(month) if month.isdigit() else _MONTHS.index(
+        next(m for m in _MONTHS if m.startswith(month[:3].lower()))) + 1
+    day = int(match.groupdict().get("day") or 1)
+    try:
+        return datetime(int(match.group("year")), month, day).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract the raw text of pages [start, stop). Used by the worker processes."""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
 
 class PDFExtractor:
     """Handles the extraction of text from PDF documents."""
 
-    def extract_text(self, pdf_path: str) -> str:
+    def __init__(self, max_pages: Optional[int] = None, max_bytes: Optional[int] = None,
+                 processes: int = 1, parallel_min_pages: int = 100, pages_per_task: int = 25):
+        """
+        max_pages and max_bytes cap how much of a document is extracted.
+        When processes > 1, documents with at least parallel_min_pages pages are split into
+        ranges of pages_per_task pages that are extracted in a process pool, a few ranges
+        ahead of the pages consumed.
+        """
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.processes = processes
+        self.parallel_min_pages = parallel_min_pages
+        self.pages_per_task = pages_per_task
+
+    def _iter_raw_pages(self, pdf_path: str) -> Iterator[str]:
+        """Yield the raw text of each page, in order."""
+        import PyPDF2
+
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+            if self.max_pages is not None:
+                num_pages = min(num_pages, self.max_pages)
+
+            if self.processes <= 1 or num_pages < self.parallel_min_pages:
+                for i in range(num_pages):
+                    yield pdf_reader.pages[i].extract_text() or ""
+                return
+
+        # Ranges are submitted as earlier ones are consumed, so a caller that stops early
+        # (max_bytes) does not wait for, or hold, the rest of the document
+        starts = iter(range(0, num_pages, self.pages_per_task))
+        executor = ProcessPoolExecutor(max_workers=self.processes)
+        futures = deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                futures.append(executor.submit(_extract_page_range, pdf_path, start,
+                                               min(start + self.pages_per_task, num_pages)))
+
+        try:
+            for _ in range(2 * self.processes):
+                submit_next()
+            while futures:
+                pages = futures.popleft().result()
+                submit_next()
+                yield from pages
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_pages(self, pdf_path: str, stats: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Yield the cleaned text of each page.
+        A word hyphenated across a page break is joined and yielded with the next page.
+        Stops once max_bytes of text have been yielded.
+        When a stats dict is given, the number of pages read is stored in stats["pages"].
+        """
+        with closing(self._iter_raw_pages(pdf_path)) as raw_pages:
+            yield from self._join_pages(raw_pages, stats)
+
+    def _join_pages(self, raw_pages: Iterator[str], stats: Optional[Dict] = None) -> Iterator[str]:
+        """Clean raw pages, rejoining words hyphenated across page breaks, up to max_bytes."""
+        carry = ""
+        remaining = self.max_bytes
+        for page_number, raw_page in enumerate(raw_pages, 1):
+            if stats is not None:
+                stats["pages"] = page_number
+            page = self._clean_text(raw_page)
+            if not page:
+                # A blank page keeps the fragment for the next page with text
+                continue
+            if carry:
+                page = carry + page
+                carry = ""
+
+            match = _TRAILING_HYPHEN.search(page)
+            if match:
+                carry = match.group(1)
+                page = page[:match.start()].rstrip()
+
+            if not page:
+                continue
+            if remaining is not None:
+                page = page.encode('utf-8')[:remaining].decode('utf-8', errors='ignore')
+                remaining -= len(page.encode('utf-8'))
+            yield page
+            if remaining is not None and remaining <= 0:
+                return
+
+        if carry:
+            yield carry
+
+    def extract_text(self, pdf_path: str, stats: Optional[Dict] = None) -> str:
         """Extract text from PDF file."""
-        text = ""
+        return " ".join(self.iter_pages(pdf_path, stats))
+
+    def _first_page_lines(self, page) -> List[Tuple[str, float]]:
+        """Return the (text, font size) of each line of a page, in reading order."""
+        lines: List[Tuple[str, float]] = []
+        current, size = "", 0.0
+
+        def visit(text, cm, tm, font_dict, font_size):
+            nonlocal current, size
+            pieces = text.split("\n")
+            for i, piece in enumerate(pieces):
+                if piece.strip():
+                    current += piece
+                    size = max(size, font_size * (abs(tm[3] * cm[3]) or 1.0))
+                if i < len(pieces) - 1 and current.strip():
+                    lines.append((" ".join(current.split()), size))
+                    current, size = "", 0.0
+
+        page.extract_text(visitor_text=visit)
+        if current.strip():
+            lines.append((" ".join(current.split()), size))
+        return lines
+
+    def extract_metadata(self, pdf_path: str, stats: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Fast metadata stage: read title, authors, publication date and abstract from the
+        PDF document info, its XMP metadata and the layout of the first page, without
+        extracting the whole document.
+        Returns the four fields (None when not found), the confidence of each under
+        "confidences" and their minimum under "confidence", from 0 (guess) to 1.
+        """
+        import PyPDF2
+
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return self._clean_text(text)
+            metadata = pdf_reader.metadata or {}
+            # Resolved while the file is open, as entries may be indirect objects
+            info = {key: _info_text(metadata, key) for key in ("/Title", "/Author", "/CreationDate")}
+            try:
+                xmp = pdf_reader.xmp_metadata
+            except Exception:
+                xmp = None
+            lines = self._first_page_lines(pdf_reader.pages[0]) if len(pdf_reader.pages) else []
+
+        fields: Dict[str, Any] = {}
+        confidences: Dict[str, float] = {}
+
+        def choose(field: str, value, confidence: float):
+            if value and confidence > confidences.get(field, 0.0):
+                fields[field], confidences[field] = value, confidence
+
+        # Document info and XMP, as set by the authoring tool
+        info_title = (xmp.dc_title or {}).get("x-default") if xmp is not None else None
+        info_title = " ".join((info_title or info["/Title"]).split())
+        if _PLACEHOLDER_TITLE.search(info_title) or len(info_title.split()) < 2:
+            info_title = ""
+        info_authors = list(xmp.dc_creator or []) if xmp is not None else []
+        if not info_authors and info["/Author"]:
+            info_authors = _split_authors(info["/Author"])
+
+        # First page layout: the title is set in the largest font near the top, followed
+        # by the author lines and the abstract
+        head = lines[:15]
+        body_size = sorted(size for _, size in lines)[len(lines) // 2] if lines else 0.0
+        title_end = 0
+        if head:
+            largest = max(size for _, size in head)
+            start = next(i for i, (_, size) in enumerate(head) if size == largest)
+            title_end = start
+            while title_end < len(head) and title_end - start < 3 and head[title_end][1] == largest:
+                title_end += 1
+            layout_title = " ".join(text for text, _ in head[start:title_end])
+            if largest > body_size * 1.15:
+                choose("title", layout_title, 1.0 if _normalize(layout_title) == _normalize(info_title) else 0.8)
+            elif _normalize(layout_title) == _normalize(info_title):
+                choose("title", layout_title, 0.9)
+            else:
+                title_end = 1
+                choose("title", head[0][0], 0.4)
+        choose("title", info_title, 0.7)
+
+        abstract_start = next((i for i, (text, _) in enumerate(lines) if _ABSTRACT_HEADING.match(text)), None)
+        layout_authors = []
+        for text, _ in lines[title_end:abstract_start if abstract_start is not None else title_end + 3]:
+            names = _split_authors(text)
+            if _AFFILIATION_WORDS.search(text) or not names or not all(_NAME_PATTERN.match(n) for n in names):
+                break
+            layout_authors += names
+        surnames = {_normalize(name).split()[-1] for name in info_authors if _normalize(name)}
+        if layout_authors and surnames & {_normalize(name).split()[-1] for name in layout_authors}:
+            choose("authors", layout_authors, 1.0)
+        choose("authors", info_authors, 0.7)
+        choose("authors", layout_authors, 0.5)
+
+        if abstract_start is not None:
+            abstract_lines = [_ABSTRACT_HEADING.sub("", lines[abstract_start][0])]
+            ended = False
+            for text, _ in lines[abstract_start + 1:]:
+                if _ABSTRACT_END.match(text):
+                    ended = True
+                    break
+                abstract_lines.append(text)
+            abstract = self._clean_text("\n".join(abstract_lines))
+            # Without a terminator the abstract may run on into the rest of the page
+            choose("abstract", abstract, 0.9 if ended else 0.4)
+
+        # Dates printed above the abstract, then the creation date of the file
+        page_text = "\n".join(text for text, _ in lines[:abstract_start])
+        for pattern in _FULL_DATE_PATTERNS:
+            match = pattern.search(page_text)
+            if match:
+                choose("publication_date", _parse_date(match), 0.8)
+        match = _MONTH_YEAR_PATTERN.search(page_text)
+        if match:
+            choose("publication_date", _parse_date(match), 0.6)
+        creation_date = re.match(r"D:(\d{4})(\d{2})(\d{2})", info["/CreationDate"])
+        if creation_date:
+            # Usually the export date of the file, not the publication date
+            choose("publication_date", "-".join(creation_date.groups()), 0.4)
+
+        result = {field: fields.get(field) for field in ("title", "authors", "publication_date", "abstract")}
+        result["confidences"] = {field: confidences.get(field, 0.0) for field in result}
+        result["confidence"] = min(result["confidences"].values())
+        if stats is not None:
+            stats["metadata_confidence"] = result["confidence"]
+        return result
 
     def _clean_text(self, text: str) -> str:
-        """Clean extracted text by removing extra whitespace and artifacts."""
-        # Remove multiple newlines
-        text = re.sub(r'\n+', '\n', text)
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
-        # Remove hyphenation at line breaks
-        text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
-        return text.strip()
\ No newline at end of file
+        """Clean extracted text by removing hyphenation at line breaks and extra whitespace."""
+        text = _CLEAN_PATTERN.sub(lambda m: '' if m.group(0)[0] == '-' else ' ', text)
+        return text.strip()
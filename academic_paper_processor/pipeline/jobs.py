@@ -0,0 +1,156 @@
+"""
+Background job queue for uploaded papers.
+
+Uploads are saved next to a SQLite job table and processed by a bounded pool of worker
+threads through AcademicPaperPipeline.stream_document. Each job records its status
+(queued, extracting, analyzing, storing, done or failed), its progress and the fields of
+its result as soon as they are known, so callers can come back for them later. Jobs that
+were still running when the process stopped are queued again on start.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from . import resources
+
+STATUSES = ["queued", "extracting", "analyzing", "storing", "done", "failed"]
+
+# Progress reached when a job enters each stage; analysis sections fill the gap up to storing
+_STAGE_PROGRESS = {"queued": 0.0, "extracting": 0.05, "analyzing": 0.2, "storing": 0.9, "done": 1.0}
+_SECTION_PROGRESS = 0.7 / 6
+
+
+class JobQueue:
+    """Persistent queue of paper processing jobs run by max_workers threads."""
+
+    COLUMNS = ["job_id", "filename", "status", "progress", "paper_id", "error", "result", "created_at", "updated_at"]
+
+    def __init__(self, pipeline, path: Optional[str] = None, max_workers: int = 4):
+        if path is None:
+            path = os.environ.get(
+                "PAPER_JOBS_DB",
+                str(Path.home() / ".cache" / "academic_paper_processor" / "jobs.db")
+            )
+        self.pipeline = pipeline
+        self.upload_dir = Path(path).parent / "uploads"
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL,
+                    paper_id TEXT,
+                    error TEXT,
+                    result TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paper-job")
+
+        # Jobs interrupted by a restart start over; checkpoints skip the stages already done
+        with self._lock:
+            interrupted = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status NOT IN ('done', 'failed') ORDER BY created_at")]
+        for job_id in interrupted:
+            self._update(job_id, status="queued", progress=0.0)
+            self._executor.submit(self._run, job_id)
+
+    def _pdf_path(self, job_id: str) -> Path:
+        return self.upload_dir / f"{job_id}.pdf"
+
+    def _update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def submit(self, filename: str, data: bytes) -> str:
+        """Save an uploaded PDF and queue it for processing. Returns the job id."""
+        job_id = uuid.uuid4().hex
+        self._pdf_path(job_id).write_bytes(data)
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES (?, ?, 'queued', 0.0, NULL, NULL, NULL, ?, ?)",
+                (job_id, filename, now, now))
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id: str):
+        pdf_path = self._pdf_path(job_id)
+        result: Dict[str, Any] = {}
+        progress = 0.0
+        try:
+            with resources.timed("process_paper"):
+                for event, value in self.pipeline.stream_document(str(pdf_path)):
+                    if event == "stage":
+                        progress = _STAGE_PROGRESS[value]
+                        self._update(job_id, status=value, progress=progress)
+                        continue
+                    if "first_result" not in resources.timings:
+                        resources.record_timing("first_result", time.perf_counter() - resources.PROCESS_START)
+                    if event == "results":
+                        result = {key: value[key] for key in value if key != "processed_file"}
+                    elif event in ("metadata", "content"):
+                        result.update(value.dict())
+                    else:
+                        result[event] = value
+                    progress = min(progress + _SECTION_PROGRESS, _STAGE_PROGRESS["storing"])
+                    self._update(job_id, progress=progress, paper_id=result.get("paper_id"), result=result)
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+        else:
+            self._update(job_id, status="done", progress=1.0, paper_id=result.get("paper_id"), result=result)
+        finally:
+            pdf_path.unlink(missing_ok=True)
+
+    def _to_job(self, values: tuple) -> Dict[str, Any]:
+        job = dict(zip(self.COLUMNS, values))
+        job["result"] = json.loads(job["result"]) if job["result"] else {}
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job with its status, progress and the result fields known so far."""
+        jobs = self.list_jobs(job_ids=[job_id])
+        return jobs[0] if jobs else None
+
+    def list_jobs(self, limit: int = 50, job_ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Return the most recent jobs, or the given ones, newest first."""
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM jobs"
+        params: List[Any] = []
+        if job_ids is not None:
+            if not job_ids:
+                return []
+            query += f" WHERE job_id IN ({', '.join('?' for _ in job_ids)})"
+            params += list(job_ids)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + [limit if job_ids is None else len(job_ids)]).fetchall()
+        return [self._to_job(values) for values in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in STATUSES}
+
+    def close(self):
+        """Wait for the running jobs and close the job table."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
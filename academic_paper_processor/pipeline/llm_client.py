@@ -0,0 +1,231 @@
+from typing import Dict, Iterator
+from concurrent.futures import Future
+from types import SimpleNamespace
+import asyncio
+import random
+import re
+import threading
+import time
+from .chunking import estimate_tokens
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity tokens per period seconds.
+    Callers reserve tokens up front; the bucket may go negative and the caller then
+    waits until its reservation is covered. Safe to share across threads and event loops.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return how many seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def _reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def acquire(self, tokens: int):
+        """Block until a request of tokens tokens is allowed."""
+        time.sleep(self._reserve(tokens))
+
+    async def aacquire(self, tokens: int):
+        """Wait until a request of tokens tokens is allowed."""
+        await asyncio.sleep(self._reserve(tokens))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an LLM error is a rate limit or transient server error worth retrying."""
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if status in (429, 500, 503, 504):
+        return True
+    name = type(error).__name__
+    if name in ("ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+                "TooManyRequests", "TimeoutError"):
+        return True
+    return bool(re.search(r"\b(429|500|503|504)\b|resource has been exhausted|quota|rate limit",
+                          str(error), re.IGNORECASE))
+
+
+class LLMClient:
+    """
+    Shared client around a chat model.
+    Every call goes through a token-bucket RateLimiter, is retried with jittered
+    exponential backoff on rate limits and transient errors, and identical prompts that
+    are already in flight share a single call.
+    """
+
+    def __init__(self, llm, requests_per_minute: int = 1000, tokens_per_minute: int = 4000000,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.llm = llm
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._in_flight: Dict[str, Future] = {}
+        self._async_in_flight: Dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _call(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(estimate_tokens(prompt))
+            try:
+                return self.llm.invoke(prompt).content
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+            time.sleep(self._backoff(attempt))
+
+    async def _acall(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.aacquire(estimate_tokens(prompt))
+            try:
+                return (await self.llm.ainvoke(prompt)).content
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+            await asyncio.sleep(self._backoff(attempt))
+
+    def invoke(self, prompt: str) -> str:
+        """Return the model's response text for prompt."""
+        with self._lock:
+            future = self._in_flight.get(prompt)
+            owner = future is None
+            if owner:
+                future = self._in_flight[prompt] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            future.set_result(self._call(prompt))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[prompt]
+        return future.result()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Yield the model's response text for prompt as it is generated.
+        Failures are retried only until the first chunk arrives; streams are not coalesced.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(estimate_tokens(prompt))
+            started = False
+            try:
+                for chunk in self.llm.stream(prompt):
+                    started = True
+                    yield chunk.content
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+            time.sleep(self._backoff(attempt))
+
+    async def ainvoke(self, prompt: str) -> str:
+        """Return the model's response text for prompt."""
+        key = (id(asyncio.get_running_loop()), prompt)
+        future = self._async_in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._async_in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            future.set_result(await self._acall(prompt))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            del self._async_in_flight[key]
+        return future.result()
+
+
+class FakeRateLimitError(Exception):
+    """Error raised by FakeChatModel to simulate a Gemini quota error."""
+    code = 429
+
+
+class FakeChatModel:
+    """
+    Offline stand-in for the Gemini chat model.
+    Answers analysis prompts with a well-formed response derived from the prompt, after
+    latency seconds. The first fail_first calls raise FakeRateLimitError.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_first: int = 0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt: str) -> SimpleNamespace:
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+        if "Combine them" in prompt:
+            return SimpleNamespace(content=(
+                "---METHODOLOGY---\nCombined methodology.\n\n"
+                "---SUMMARY---\nCombined summary of the paper."
+            ))
+
+        paper_text = prompt.split("Paper text:", 1)[-1].split("Provide your analysis", 1)[0]
+        words = re.findall(r"[A-Za-z]{4,}", paper_text)
+        title = " ".join(words[:6]).title() or "Untitled"
+        keywords = ", ".join(list(dict.fromkeys(word.lower() for word in words[6:]))[:5]) or "paper"
+        metadata = (
+            "---METADATA---\n"
+            f"Title: {title}\n"
+            "Authors: Ada Lovelace, Alan Turing\n"
+            "Date: 2024-01-01\n"
+            f"Abstract: Abstract of {title}.\n\n"
+        ) if "---METADATA---" in prompt else ""
+        return SimpleNamespace(content=(
+            metadata +
+            "---METHODOLOGY---\nA synthetic methodology.\n\n"
+            "---FINDINGS---\n- First finding\n- Second finding\n\n"
+            f"---KEYWORDS---\n{keywords}\n\n"
+            f"---SUMMARY---\nSummary of {title}."
+        ))
+
+    def invoke(self, prompt: str) -> SimpleNamespace:
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt: str) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def stream(self, prompt: str, chunk_size: int = 16) -> Iterator[SimpleNamespace]:
+        """Yield the response in chunks of chunk_size characters, spreading latency over them."""
+        content = self._respond(prompt).content
+        chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield SimpleNamespace(content=chunk)
@@ -0,0 +1,245 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime
+from pathlib import Path
+import argparse
+import io
+import json
+import os
+import sqlite3
+import threading
+from .processor import PaperMetadata, ResearchContent
+from .storage import PAPER_SCHEMA, PaperStorage
+
+_SQLITE_TYPES = {"STRING": "TEXT", "DATE": "TEXT", "TIMESTAMP": "TEXT"}
+_REPEATED_COLUMNS = [name for name, _, mode in PAPER_SCHEMA if mode == "REPEATED"]
+_COLUMNS = [name for name, _, _ in PAPER_SCHEMA]
+
+
+class LocalStorage(PaperStorage):
+    """
+    Embedded SQLite storage with the same schema as the BigQuery papers table.
+    Repeated fields (authors, findings, keywords) are stored as JSON arrays. Rows written
+    here are pushed to BigQuery in bulk by sync_to_bigquery; rows BigQuery rejects are
+    marked with their error instead of blocking the sync. It also serves the read
+    queries of the Streamlit views with the PaperQueries interface. Stored rows are also
+    added to the search and similarity indexes when given.
+    """
+
+    SUMMARY_COLUMNS = ["paper_id", "title", "authors", "publication_date", "keywords", "created_at"]
+
+    def __init__(self, path: Optional[str] = None, search_index=None, similarity_index=None):
+        if path is None:
+            path = os.environ.get(
+                "PAPER_LOCAL_DB",
+                str(Path.home() / ".cache" / "academic_paper_processor" / "papers.db")
+            )
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.search_index = search_index
+        self.similarity_index = similarity_index
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        columns = []
+        for name, field_type, mode in PAPER_SCHEMA:
+            sql_type = "TEXT" if mode == "REPEATED" else _SQLITE_TYPES[field_type]
+            constraint = " NOT NULL" if mode == "REQUIRED" else ""
+            if name == "paper_id":
+                constraint += " PRIMARY KEY"
+            columns.append(f"{name} {sql_type}{constraint}")
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS papers (
+                    {", ".join(columns)},
+                    synced_at TEXT,
+                    sync_error TEXT
+                )
+            """)
+            # Stores created before sync errors were recorded
+            if "sync_error" not in [row[1] for row in self._conn.execute("PRAGMA table_info(papers)")]:
+                self._conn.execute("ALTER TABLE papers ADD COLUMN sync_error TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS papers_created_at ON papers (created_at, paper_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS papers_unsynced ON papers (synced_at) WHERE synced_at IS NULL")
+
+    def _insert(self, rows: List[dict]):
+        values = [
+            tuple(json.dumps(row[name] or []) if name in _REPEATED_COLUMNS else row[name] for name in _COLUMNS)
+            for row in rows
+        ]
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO papers ({', '.join(_COLUMNS)}, synced_at, sync_error)"
+                f" VALUES ({placeholders}, NULL, NULL)",
+                values)
+        if self.search_index is not None:
+            self.search_index.add_rows(rows)
+        if self.similarity_index is not None:
+            self.similarity_index.add_rows(rows)
+
+    def store_paper(self, metadata: PaperMetadata, content: ResearchContent, paper_id: Optional[str] = None):
+        """Store processed paper data locally."""
+        self._insert([self._build_row(metadata, content, paper_id)])
+
+    def store_papers(self, papers: List[Tuple[PaperMetadata, ResearchContent, Optional[str]]]) -> Dict[int, str]:
+        """Store a group of (metadata, content, paper_id) tuples in one transaction."""
+        if not papers:
+            return {}
+        try:
+            self._insert([self._build_row(metadata, content, paper_id) for metadata, content, paper_id in papers])
+        except sqlite3.Error as e:
+            return {i: str(e) for i in range(len(papers))}
+        return {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _to_row(self, columns: Sequence[str], values: tuple) -> Dict[str, Any]:
+        return {name: json.loads(value) if name in _REPEATED_COLUMNS and value is not None else value
+                for name, value in zip(columns, values)}
+
+    def _query(self, query: str, params: Sequence[Any] = ()):
+        """Run a read query and return its rows as a DataFrame."""
+        import pandas as pd
+
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        return pd.DataFrame([self._to_row(columns, values) for values in rows], columns=columns)
+
+    def _page(self, where: str, params: List[Any], page_size: int, cursor: Optional[Tuple[Any, str]]):
+        conditions = [f"({where})"] if where else []
+        if cursor is not None:
+            conditions.append("(created_at < ? OR (created_at = ? AND paper_id < ?))")
+            params = params + [str(cursor[0]), str(cursor[0]), cursor[1]]
+        query = f"""
+            SELECT {", ".join(self.SUMMARY_COLUMNS)}
+            FROM papers
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY created_at DESC, paper_id DESC
+            LIMIT ?
+        """
+        df = self._query(query, params + [page_size + 1])
+
+        next_cursor = None
+        if len(df) > page_size:
+            df = df.iloc[:page_size]
+            next_cursor = (df.iloc[-1]["created_at"], df.iloc[-1]["paper_id"])
+        return df, next_cursor
+
+    def fetch_recent_papers(self, page_size: int = 10, cursor: Optional[Tuple[Any, str]] = None):
+        """Return a page of the most recently processed papers and the cursor of the next page."""
+        return self._page("", [], page_size, cursor)
+
+    def search(self, search_type: str, search_term: str, page_size: int = 10,
+               cursor: Optional[Tuple[Any, str]] = None):
+        """Return a page of papers matching search_term and the cursor of the next page."""
+        if search_type == "Title":
+            where = "LOWER(title) LIKE ?"
+        elif search_type == "Author":
+            where = "EXISTS (SELECT 1 FROM json_each(authors) WHERE LOWER(value) LIKE ?)"
+        elif search_type == "Keywords":
+            where = "EXISTS (SELECT 1 FROM json_each(keywords) WHERE LOWER(value) LIKE ?)"
+        else:  # Full Text
+            where = ("LOWER(IFNULL(title, '') || IFNULL(abstract, '') || IFNULL(methodology, '')"
+                     " || IFNULL(summary, '')) LIKE ?")
+        return self._page(where, [f"%{search_term.lower()}%"], page_size, cursor)
+
+    def fetch_details(self, paper_ids: Sequence[str], since: Optional[Any] = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch the detail columns of several papers created at or after since, keyed by paper_id."""
+        if not len(paper_ids):
+            return {}
+        placeholders = ", ".join("?" for _ in paper_ids)
+        query = f"SELECT paper_id, abstract, summary FROM papers WHERE paper_id IN ({placeholders})"
+        params = list(paper_ids)
+        if since is not None:
+            query += " AND created_at >= ?"
+            params.append(str(since))
+        df = self._query(query, params)
+        return {row["paper_id"]: row.to_dict() for _, row in df.iterrows()}
+
+    def _load(self, client, table_id: str, job_config, rows: List[dict]) -> int:
+        """
+        Load rows with one job and mark them synced. A job rejected for its data (HTTP 400)
+        is split in halves until the rows BigQuery cannot load are found; those are marked
+        with their error and left out. Other errors are raised. Returns the rows synced.
+        """
+        data = "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+        try:
+            client.load_table_from_file(io.BytesIO(data), table_id, job_config=job_config).result()
+        except Exception as e:
+            if getattr(e, "code", None) != 400:
+                raise
+            if len(rows) == 1:
+                with self._lock, self._conn:
+                    self._conn.execute("UPDATE papers SET sync_error = ? WHERE paper_id = ? AND created_at = ?",
+                                       (str(e), rows[0]["paper_id"], rows[0]["created_at"]))
+                return 0
+            middle = len(rows) // 2
+            return (self._load(client, table_id, job_config, rows[:middle])
+                    + self._load(client, table_id, job_config, rows[middle:]))
+
+        synced_at = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE papers SET synced_at = ? WHERE paper_id = ? AND created_at = ?",
+                                   [(synced_at, row["paper_id"], row["created_at"]) for row in rows])
+        return len(rows)
+
+    def sync_to_bigquery(self, client, table_id: str, batch_size: int = 10000) -> int:
+        """
+        Push rows not yet synced to the BigQuery table with newline-delimited JSON load
+        jobs of up to batch_size rows. Returns the number of rows synced.
+        Rows BigQuery rejects are skipped from then on; sync_errors() lists them.
+        """
+        from google.cloud import bigquery
+
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+        )
+        synced = 0
+        while True:
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM papers WHERE synced_at IS NULL AND sync_error IS NULL LIMIT ?",
+                    (batch_size,))
+                rows = [self._to_row(_COLUMNS, values) for values in cursor.fetchall()]
+            if not rows:
+                return synced
+            synced += self._load(client, table_id, job_config, rows)
+
+    def sync_errors(self) -> Dict[str, str]:
+        """Error of every row BigQuery rejected, keyed by paper_id. Storing the paper again retries it."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT paper_id, sync_error FROM papers WHERE sync_error IS NOT NULL"))
+
+
+def main():
+    """Push the rows of the local store to the BigQuery table configured in st.secrets."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("command", choices=["sync"])
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    import streamlit as st
+    from . import resources
+    from .storage import BigQueryStorage
+
+    gcp = st.secrets["gcp"]
+    # Building the storage makes sure the table exists before loading into it
+    storage = BigQueryStorage(gcp["project_id"], gcp["dataset_id"], gcp["table_id"])
+    count = LocalStorage(args.db_path).sync_to_bigquery(
+        resources.get_bigquery_client(), storage.table_id, batch_size=args.batch_size)
+    print(f"Synced {count} papers to {storage.table_id}")
+    errors = LocalStorage(args.db_path).sync_errors()
+    for paper_id, error in errors.items():
+        print(f"Not synced {paper_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from typing import List, Optional
+import os
+import threading
+
+
+class MemoryBudget:
+    """
+    Bounds the bytes of document text held in memory at once.
+    Documents reserve their estimated size before extraction and release it once their
+    text is no longer needed; reservations block while the budget is exhausted.
+    """
+
+    def __init__(self, max_bytes: int, text_to_file_ratio: float = 2.0, max_text_bytes: Optional[int] = None):
+        """
+        The text of a document is estimated as text_to_file_ratio times its PDF size,
+        capped at max_text_bytes (e.g. the extractor's max_bytes) when given.
+        """
+        self.max_bytes = max_bytes
+        self.text_to_file_ratio = text_to_file_ratio
+        self.max_text_bytes = max_text_bytes
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def estimate(self, pdf_path: str) -> int:
+        """Estimate the bytes of text a PDF will hold in memory, capped at the whole budget."""
+        estimate = int(os.path.getsize(pdf_path) * self.text_to_file_ratio)
+        if self.max_text_bytes is not None:
+            estimate = min(estimate, self.max_text_bytes)
+        return min(estimate, self.max_bytes)
+
+    def acquire(self, nbytes: int) -> int:
+        """Reserve nbytes, waiting until they fit in the budget. Returns the bytes reserved."""
+        nbytes = min(nbytes, self.max_bytes)
+        with self._condition:
+            while self.used + nbytes > self.max_bytes:
+                self._condition.wait()
+            self.used += nbytes
+        return nbytes
+
+    def release(self, nbytes: int):
+        """Give back a reservation."""
+        if not nbytes:
+            return
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+    def waves(self, pdf_paths: List[str]) -> List[List[str]]:
+        """Split documents into consecutive groups whose estimated text fits in the budget."""
+        waves, current, current_bytes = [], [], 0
+        for path in pdf_paths:
+            try:
+                estimate = self.estimate(path)
+            except OSError:
+                # Unreadable files fail on their own later; they hold no text
+                estimate = 0
+            if current and current_bytes + estimate > self.max_bytes:
+                waves.append(current)
+                current, current_bytes = [], 0
+            current.append(path)
+            current_bytes += estimate
+        if current:
+            waves.append(current)
+        return waves
@@ -0,0 +1,128 @@
+"""
+Per-stage metrics for the pipeline graph nodes.
+
+Each stage records its wall time plus stage-specific values (pages, characters, tokens,
+LLM and BigQuery latency...). Metrics are exported as Prometheus text or JSON lines.
+While disabled, stage() returns a shared no-op context and nothing is recorded.
+"""
+from typing import Any, Dict, Optional
+from collections import defaultdict, deque
+import json
+import os
+import threading
+import time
+
+
+class _NullStage:
+    """No-op stage used while metrics are disabled."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Times a stage and records it with the values collected in its dict."""
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.values: Dict[str, Any] = {}
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.start = time.perf_counter()
+        return self.values
+
+    def __exit__(self, exc_type, exc, tb):
+        self.values["wall_seconds"] = time.perf_counter() - self.start
+        self.values["error"] = exc_type is not None
+        self.metrics.record(self.name, **self.values)
+        return False
+
+
+class Metrics:
+    """Registry of stage events with running sums and counts per stage and value."""
+
+    def __init__(self, enabled: bool = False, jsonl_path: Optional[str] = None, max_events: int = 1000):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.events = deque(maxlen=max_events)
+        self._sums: Dict[tuple, float] = defaultdict(float)
+        self._counts: Dict[tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def enable(self, jsonl_path: Optional[str] = None):
+        """Start recording, optionally appending every event to a JSON-lines file."""
+        self.jsonl_path = jsonl_path or self.jsonl_path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name: str):
+        """
+        Context manager timing a stage. It yields a dict for extra values to record,
+        or None while metrics are disabled.
+        """
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def record(self, stage: str, **values):
+        """Record one event of a stage."""
+        if not self.enabled:
+            return
+        event = {"stage": stage, "timestamp": time.time(), **values}
+        with self._lock:
+            self.events.append(event)
+            for key, value in values.items():
+                # Booleans are counted as 0/1 so flags such as truncated become rates
+                if isinstance(value, (int, float)):
+                    self._sums[(stage, key)] += float(value)
+                    self._counts[(stage, key)] += 1
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(event) + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Return {stage: {value: {"sum", "count", "mean"}}}."""
+        with self._lock:
+            result: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(dict)
+            for (stage, key), total in self._sums.items():
+                count = self._counts[(stage, key)]
+                result[stage][key] = {"sum": total, "count": count, "mean": total / count}
+        return dict(result)
+
+    def to_prometheus(self, prefix: str = "paper_pipeline") -> str:
+        """Render the running sums and counts in the Prometheus text exposition format."""
+        lines = []
+        by_key = defaultdict(list)
+        for stage, values in self.summary().items():
+            for key, stats in values.items():
+                by_key[key].append((stage, stats))
+        for key in sorted(by_key):
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} summary")
+            for stage, stats in sorted(by_key[key], key=lambda item: item[0]):
+                lines.append(f'{name}_sum{{stage="{stage}"}} {stats["sum"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self) -> str:
+        """Render the recent events as JSON lines."""
+        with self._lock:
+            return "".join(json.dumps(event) + "\n" for event in self.events)
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self._sums.clear()
+            self._counts.clear()
+
+
+# Process-wide registry used by the pipeline; set PAPER_METRICS=1 to enable it at startup
+metrics = Metrics(enabled=os.environ.get("PAPER_METRICS") == "1",
+                  jsonl_path=os.environ.get("PAPER_METRICS_JSONL"))
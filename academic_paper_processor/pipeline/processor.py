@@ -1,9 +1,13 @@
-from typing import Dict, List, Optional
-from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import Graph
+from typing import Any, Dict, Iterator, List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import re
+import threading
+import time
 from pydantic import BaseModel, Field
-import streamlit as st
+from . import resources
+from .chunking import chunk_sections, drop_low_value_sections, estimate_tokens, split_sections
 
 
 class PaperMetadata(BaseModel):
@@ -22,14 +26,65 @@ class ResearchContent(BaseModel):
     summary: str = Field(description="Generated summary")
 
 
+_SECTION_HEADER = re.compile(r'---\s*([A-Z][A-Z ]*?)\s*---')
+
+
+class SectionStreamParser:
+    """
+    Splits a streamed analysis response into its ---SECTION--- blocks.
+    A section is complete once the next header arrives, or when the stream is closed.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._current: Optional[str] = None
+
+    def feed(self, text: str) -> List[tuple[str, str]]:
+        """Add a piece of the response and return the (name, body) sections it completed."""
+        self._buffer += text
+        completed = []
+        while True:
+            match = _SECTION_HEADER.search(self._buffer)
+            if match is None:
+                return completed
+            if self._current is not None:
+                completed.append((self._current, self._buffer[:match.start()].strip()))
+            self._current = match.group(1).strip()
+            self._buffer = self._buffer[match.end():]
+
+    def close(self) -> List[tuple[str, str]]:
+        """Return the last section once the stream has ended."""
+        if self._current is None:
+            return []
+        completed = [(self._current, self._buffer.strip())]
+        self._current, self._buffer = None, ""
+        return completed
+
+
 class ContentProcessor:
     """Processes academic paper content using LLM."""
 
-    def __init__(self):
-       # credentials = st.secrets["gcp_api_key"]["GOOGLE_API_KEY"]
-        self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-001", temperature=0)
+    def __init__(self, llm=None, chunk_tokens: int = 8000, max_concurrency: int = 4):
+        """
+        Papers longer than chunk_tokens (after dropping references and appendices) are
+        analyzed chunk by chunk, with up to max_concurrency concurrent LLM calls.
+        LLM calls go through an LLMClient (rate limits, retries, coalescing), shared
+        process-wide unless a model is passed in.
+        """
+        from langchain.prompts import PromptTemplate
+        from .llm_client import LLMClient
+
+        if llm is None:
+            self.client = resources.get_llm_client()
+            self.llm = self.client.llm
+        else:
+            self.llm = llm
+            self.client = LLMClient(llm)
         self.max_tokens = 1000000
         self.token_buffer = 2500
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self._stats_lock = threading.Lock()
 
         # Initialize prompts
 
@@ -65,9 +120,107 @@ class ContentProcessor:
                   <A comprehensive 3-4 paragraph summary focusing on main contributions, methodology, and results>      
         """)
 
+        self.chunk_prompt = PromptTemplate.from_template("""
+                  The following text is part {part} of {total} of an academic paper.
+                  Extract the information this part contains. Leave a field empty when this part does not contain it.
+
+                  Paper text:
+                  {text}
+
+                  Provide your analysis in this exact format:
+                  ---METADATA---
+                  Title: <paper title>
+                  Authors: <author1>, <author2>, ...
+                  Date: <publication date in YYYY-MM-DD format>
+                  Abstract: <paper abstract>
+
+                  ---METHODOLOGY---
+                  <description of the research methodology described in this part>
+
+                  ---FINDINGS---
+                  - <finding1>
+                  - <finding2>
+                  [list the key findings of this part]
+
+                  ---KEYWORDS---
+                  <keyword1>, <keyword2>, <keyword3>
+                  [up to 7 relevant keywords]
+
+                  ---SUMMARY---
+                  <A one paragraph summary of this part>
+        """)
+
+        # chunk_prompt without the metadata section, used when the metadata is already known
+        self.chunk_content_prompt = PromptTemplate.from_template("""
+                  The following text is part {part} of {total} of an academic paper.
+                  Extract the research content this part contains. Leave a field empty when this part does not contain it.
+
+                  Paper text:
+                  {text}
+
+                  Provide your analysis in this exact format:
+                  ---METHODOLOGY---
+                  <description of the research methodology described in this part>
+
+                  ---FINDINGS---
+                  - <finding1>
+                  - <finding2>
+                  [list the key findings of this part]
+
+                  ---KEYWORDS---
+                  <keyword1>, <keyword2>, <keyword3>
+                  [up to 7 relevant keywords]
+
+                  ---SUMMARY---
+                  <A one paragraph summary of this part>
+        """)
+
+        self.reduce_prompt = PromptTemplate.from_template("""
+                  The following notes were extracted from consecutive parts of one academic paper.
+
+                  Methodology notes:
+                  {methodologies}
+
+                  Part summaries:
+                  {summaries}
+
+                  Combine them in this exact format:
+                  ---METHODOLOGY---
+                  <detailed description of the research methodology>
+
+                  ---SUMMARY---
+                  <A comprehensive 3-4 paragraph summary focusing on main contributions, methodology, and results>
+        """)
+
+        # Used when the metadata is already known, e.g. from PDFExtractor.extract_metadata
+        self.content_prompt = PromptTemplate.from_template("""
+                  Analyze the following academic paper and provide a structured extraction of its research content.
+                  Format your response exactly as shown below, maintaining all headers and structure.
+
+                  Paper text:
+                  {text}
+
+                  Provide your analysis in this exact format:
+                  ---METHODOLOGY---
+                  <detailed description of the research methodology>
+
+                  ---FINDINGS---
+                  - <finding1>
+                  - <finding2>
+                  - <finding3>
+                  [list all key findings]
+
+                  ---KEYWORDS---
+                  <keyword1>, <keyword2>, <keyword3>, <keyword4>, <keyword5>
+                  [5-7 relevant keywords]
+
+                  ---SUMMARY---
+                  <A comprehensive 3-4 paragraph summary focusing on main contributions, methodology, and results>
+        """)
+
     def count_tokens(self, text: str) -> int:
         """Count the number of tokens in the text."""
-        return (len(text) + 3)//4
+        return estimate_tokens(text)
 
     def truncate_to_token_limit(self, text: str) -> tuple[str, bool]:
         """
@@ -81,65 +234,272 @@ class ContentProcessor:
         if current_tokens <= available_tokens:
             return text, False
 
-        result = text[:available_tokens*4]
+        # Cut at the character offset proportional to the token budget
+        result = text[:len(text) * available_tokens // current_tokens]
 
         return result, True
 
-    def analyze_content(self, text: str) -> tuple[PaperMetadata,ResearchContent]:
-        """Analyze paper content using LLM."""
-        text, was_truncated = self.truncate_to_token_limit(text)
-
-        response = self.llm.invoke(self.analysis_prompt.format(text=text))
-        # Parse the response into structured format
-        content = response.content
+    def _parse_sections(self, content: str) -> Dict[str, str]:
+        """Split a response into its ---SECTION--- blocks."""
         sections = content.split('---')[1:]  # Skip the first empty split
-        # Split response into sections
-        section_dict = {sections[i]: sections[i + 1].strip() for i in range(0, len(sections), 2)}
+        return {sections[i].strip(): sections[i + 1].strip() for i in range(0, len(sections) - 1, 2)}
 
-        # Parse metadata
-        metadata_lines = section_dict['METADATA'].split('\n')
-        metadata_fields = ["title","authors", "date", "abstract"]
+    def _parse_section(self, name: str, body: str) -> Dict:
+        """Parse the body of one ---SECTION--- block into the fields it holds."""
+        fields = {}
+        if name == 'METADATA':
+            for line in body.split('\n'):
+                line = line.strip()
+                if line.startswith('Title:'):
+                    fields['title'] = line.replace('Title:', '').strip()
+                elif line.startswith('Authors:'):
+                    authors_str = line.replace('Authors:', '').strip()
+                    fields['authors'] = [a.strip() for a in authors_str.split(',') if a.strip()]
+                elif line.startswith('Date:'):
+                    fields['publication_date'] = line.replace('Date:', '').strip()
+                elif line.startswith('Abstract:'):
+                    fields['abstract'] = line.replace('Abstract:', '').strip()
+        elif name == 'METHODOLOGY':
+            fields['methodology'] = body
+        elif name == 'FINDINGS':
+            fields['findings'] = [
+                finding.strip().strip('- ').strip()
+                for finding in body.split('\n')
+                if finding.strip().startswith('-')
+            ]
+        elif name == 'KEYWORDS':
+            fields['keywords'] = [
+                keyword.strip()
+                for keyword in body.split(',')
+                if keyword.strip()
+            ]
+        elif name == 'SUMMARY':
+            fields['summary'] = body
+        return fields
+
+    def _parse_response(self, content: str) -> tuple[Dict, Dict]:
+        """Parse an analysis response into metadata and research content fields."""
+        section_dict = self._parse_sections(content)
+        fields = {}
+        for name, body in section_dict.items():
+            fields.update(self._parse_section(name, body))
+
+        # Fields missing from their usual section may come as a section of their own
+        metadata_fields = {"title": "TITLE", "authors": "AUTHORS", "publication_date": "DATE", "abstract": "ABSTRACT"}
         content_fields = ["methodology", "findings", "keywords", "summary"]
+        metadata = {field: fields.get(field, section_dict.get(section)) for field, section in metadata_fields.items()}
+        research_content = {field: fields.get(field, section_dict.get(field.upper())) for field in content_fields}
+        return metadata, research_content
+
+    def _record_call(self, stats: Optional[Dict], prompt: str, response: str, seconds: float):
+        """Add the token counts and latency of one LLM call to stats."""
+        if stats is None:
+            return
+        with self._stats_lock:
+            stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+            stats["prompt_tokens"] = stats.get("prompt_tokens", 0) + self.count_tokens(prompt)
+            stats["completion_tokens"] = stats.get("completion_tokens", 0) + self.count_tokens(response)
+            stats["llm_seconds"] = stats.get("llm_seconds", 0.0) + seconds
+
+    def _invoke(self, prompt: str, stats: Optional[Dict] = None) -> str:
+        start = time.perf_counter()
+        response = self.client.invoke(prompt)
+        self._record_call(stats, prompt, response, time.perf_counter() - start)
+        return response
+
+    async def _ainvoke(self, prompt: str, stats: Optional[Dict] = None) -> str:
+        start = time.perf_counter()
+        response = await self.client.ainvoke(prompt)
+        self._record_call(stats, prompt, response, time.perf_counter() - start)
+        return response
+
+    def _chunk_prompts(self, chunks: List[str], metadata: Optional[PaperMetadata] = None) -> List[str]:
+        """Build the map prompt of every chunk, without the metadata section when metadata is known."""
+        prompt = self.chunk_content_prompt if metadata is not None else self.chunk_prompt
+        return [prompt.format(part=part, total=len(chunks), text=chunk)
+                for part, chunk in enumerate(chunks, 1)]
+
+    def _merge_partials(self, partials: List[tuple[Dict, Dict]]) -> tuple[Dict, Dict, str]:
+        """
+        Merge the parsed chunk responses of a paper.
+        Returns the metadata, the merged research content and the reduce prompt that
+        combines the methodology notes and part summaries.
+        """
+        # Metadata comes from the first part that has each field, normally the first one;
+        # fields no part has stay empty, as in a single-call response
         metadata = {}
-        for line in metadata_lines:
-            if line.startswith('Title:'):
-                metadata['title'] = line.replace('Title:', '').strip()
-            elif line.startswith('Authors:'):
-                authors_str = line.replace('Authors:', '').strip()
-                metadata['authors'] = [a.strip() for a in authors_str.split(',')]
-            elif line.startswith('Date:'):
-                metadata['publication_date'] = line.replace('Date:', '').strip()
-            elif line.startswith('Abstract:'):
-                metadata['abstract'] = line.replace('Abstract:', '').strip()
-
-         # Parse research content
+        for field in ["title", "authors", "publication_date", "abstract"]:
+            metadata[field] = next((m[field] for m, _ in partials if m.get(field)), [] if field == "authors" else "")
+
+        findings, seen = [], set()
+        for _, content in partials:
+            for finding in content.get('findings') or []:
+                if finding.lower() not in seen:
+                    seen.add(finding.lower())
+                    findings.append(finding)
+
+        # Keywords mentioned by most parts first, keeping the first spelling seen
+        keyword_counts = Counter()
+        spellings = {}
+        for _, content in partials:
+            for keyword in content.get('keywords') or []:
+                keyword_counts[keyword.lower()] += 1
+                spellings.setdefault(keyword.lower(), keyword)
+        keywords = [spellings[keyword] for keyword, _ in keyword_counts.most_common(7)]
+
+        methodologies = "\n\n".join(c['methodology'] for _, c in partials if c.get('methodology'))
+        summaries = "\n\n".join(f"Part {i}: {c['summary']}" for i, (_, c) in enumerate(partials, 1) if c.get('summary'))
+
         research_content = {
-            'methodology': section_dict['METHODOLOGY'].strip(),
-            'findings': [
-                finding.strip('- ').strip()
-                for finding in section_dict['FINDINGS'].split('\n')
-                if finding.strip().startswith('-')
-            ],
-            'keywords': [
-                keyword.strip()
-                for keyword in section_dict['KEYWORDS'].split(',')
-            ],
-            'summary': section_dict['SUMMARY'].strip()
+            'methodology': methodologies,
+            'findings': findings,
+            'keywords': keywords,
+            'summary': summaries,
         }
+        return metadata, research_content, self.reduce_prompt.format(methodologies=methodologies, summaries=summaries)
 
-        for field in metadata_fields:
-            if field not in metadata:
-                if field.upper() in section_dict:
-                    metadata[field] = section_dict[field.upper()].strip()
-                else:
-                    metadata[field] = None
+    def _apply_reduce(self, research_content: Dict, response: str) -> Dict:
+        """Replace the concatenated methodology notes and summaries with the reduced ones."""
+        reduced = self._parse_sections(response)
+        return {
+            **research_content,
+            'methodology': reduced.get('METHODOLOGY') or research_content['methodology'],
+            'summary': reduced.get('SUMMARY') or research_content['summary'],
+        }
+
+    def _analyze_chunks(self, chunks: List[str], stats: Optional[Dict] = None,
+                        metadata: Optional[PaperMetadata] = None) -> tuple[Dict, Dict]:
+        """
+        Map-reduce analysis of a long paper: every chunk is analyzed concurrently, then
+        findings and keywords are merged locally and one small call combines the
+        methodology notes and part summaries. When metadata is known the chunks are only
+        asked for the research content.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            responses = executor.map(lambda prompt: self._invoke(prompt, stats),
+                                     self._chunk_prompts(chunks, metadata))
+            partials = [self._parse_response(response) for response in responses]
 
-        for field in content_fields:
-            if field not in research_content:
-                if field.upper() in section_dict:
-                    research_content[field] = section_dict[field.upper()].strip()
+        metadata, research_content, reduce_prompt = self._merge_partials(partials)
+        return metadata, self._apply_reduce(research_content, self._invoke(reduce_prompt, stats))
+
+    def _prepare_chunks(self, text: str) -> List[str]:
+        """Drop low-value sections and split the rest into chunks."""
+        return chunk_sections(drop_low_value_sections(split_sections(text)), self.chunk_tokens)
+
+    def _prompt(self, text: str, metadata: Optional[PaperMetadata]) -> str:
+        """The single-call prompt, asking for the content sections only when metadata is known."""
+        return (self.content_prompt if metadata is not None else self.analysis_prompt).format(text=text)
+
+    def analyze_content(self, text: str, stats: Optional[Dict] = None,
+                        metadata: Optional[PaperMetadata] = None) -> tuple[PaperMetadata,ResearchContent]:
+        """
+        Analyze paper content using LLM.
+        References, acknowledgments and appendices are dropped first. Papers that still do
+        not fit in one chunk are analyzed with _analyze_chunks instead of being truncated.
+        When metadata is given it is returned as is and the model is only asked for the
+        research content.
+        When a stats dict is given it receives the chunk count, whether the prompt was
+        truncated, and the LLM calls, prompt/completion tokens and latency.
+        """
+        chunks = self._prepare_chunks(text)
+        was_truncated = False
+
+        if len(chunks) > 1:
+            metadata_fields, research_content = self._analyze_chunks(chunks, stats, metadata)
+        else:
+            text, was_truncated = self.truncate_to_token_limit(chunks[0] if chunks else text)
+            response = self._invoke(self._prompt(text, metadata), stats)
+            metadata_fields, research_content = self._parse_response(response)
+
+        if stats is not None:
+            stats["chunks"] = len(chunks)
+            stats["truncated"] = was_truncated
+        return (metadata or PaperMetadata(**metadata_fields),ResearchContent(**research_content))
+
+    def stream_analysis(self, text: str, stats: Optional[Dict] = None,
+                        metadata: Optional[PaperMetadata] = None) -> Iterator[tuple[str, Any]]:
+        """
+        Streaming version of analyze_content.
+        Yields ("metadata", PaperMetadata) as soon as the metadata section of the response
+        is complete (right away when metadata is given), then ("methodology" | "findings" |
+        "keywords" | "summary", value) as each of those sections completes, and finally
+        ("content", ResearchContent).
+        Papers analyzed with _analyze_chunks yield the same events once the reduce call is done.
+        """
+        chunks = self._prepare_chunks(text)
+        was_truncated = False
+        if metadata is not None:
+            yield "metadata", metadata
+
+        if len(chunks) > 1:
+            metadata_fields, research_content = self._analyze_chunks(chunks, stats, metadata)
+            if metadata is None:
+                yield "metadata", PaperMetadata(**metadata_fields)
+            for field in ["methodology", "findings", "keywords", "summary"]:
+                yield field, research_content[field]
+        else:
+            text, was_truncated = self.truncate_to_token_limit(chunks[0] if chunks else text)
+            prompt = self._prompt(text, metadata)
+            parser = SectionStreamParser()
+            pieces = []
+            metadata_sent = metadata is not None
+            start = time.perf_counter()
+
+            def sections():
+                for piece in self.client.stream(prompt):
+                    pieces.append(piece)
+                    yield from parser.feed(piece)
+                yield from parser.close()
+
+            for name, body in sections():
+                fields = self._parse_section(name, body)
+                if name == 'METADATA':
+                    if not metadata_sent and len(fields) == len(PaperMetadata.__fields__):
+                        metadata_sent = True
+                        yield "metadata", PaperMetadata(**fields)
                 else:
-                    research_content[field] = None
+                    yield from fields.items()
+
+            response = "".join(pieces)
+            self._record_call(stats, prompt, response, time.perf_counter() - start)
+            # The full parse also picks up fields sent outside their usual sections
+            metadata_fields, research_content = self._parse_response(response)
+            if not metadata_sent:
+                yield "metadata", PaperMetadata(**metadata_fields)
+
+        if stats is not None:
+            stats["chunks"] = len(chunks)
+            stats["truncated"] = was_truncated
+        yield "content", ResearchContent(**research_content)
+
+    async def aanalyze_content(self, text: str, stats: Optional[Dict] = None,
+                               metadata: Optional[PaperMetadata] = None) -> tuple[PaperMetadata,ResearchContent]:
+        """
+        Async version of analyze_content.
+        Calls are paced by the shared LLMClient rate limiter, so many documents can be
+        analyzed concurrently at full quota.
+        """
+        chunks = self._prepare_chunks(text)
+        was_truncated = False
+
+        if len(chunks) > 1:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def analyze_chunk(prompt: str) -> str:
+                async with semaphore:
+                    return await self._ainvoke(prompt, stats)
 
+            responses = await asyncio.gather(*(analyze_chunk(prompt) for prompt in self._chunk_prompts(chunks, metadata)))
+            metadata_fields, research_content, reduce_prompt = self._merge_partials(
+                [self._parse_response(response) for response in responses])
+            research_content = self._apply_reduce(research_content, await self._ainvoke(reduce_prompt, stats))
+        else:
+            text, was_truncated = self.truncate_to_token_limit(chunks[0] if chunks else text)
+            response = await self._ainvoke(self._prompt(text, metadata), stats)
+            metadata_fields, research_content = self._parse_response(response)
 
-        return (PaperMetadata(**metadata),ResearchContent(**research_content))
\ No newline at end of file
+        if stats is not None:
+            stats["chunks"] = len(chunks)
+            stats["truncated"] = was_truncated
+        return (metadata or PaperMetadata(**metadata_fields),ResearchContent(**research_content))
@@ -0,0 +1,203 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
+import threading
+import time
+from . import resources
+
+# (created_at, paper_id) of the last row of a page; the next page starts strictly after it
+Cursor = Tuple[Any, str]
+
+
+class TTLCache:
+    """Thread-safe cache whose entries expire ttl seconds after they were stored."""
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop the entry closest to expiring
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PaperQueries:
+    """
+    Read queries used by the Streamlit views.
+    Every query is parameterized so BigQuery's result cache can hit, and results are
+    additionally cached locally for ttl seconds keyed on the query parameters.
+    Queries select only the columns they show and filter on created_at, the partitioning
+    column, so they scan a bounded number of partitions however large the table grows.
+    """
+
+    # Days of partitions a page is first looked for in; the window grows by
+    # WINDOW_GROWTH until the page is full or it reaches the oldest partition of the table
+    WINDOW_DAYS = 30
+    WINDOW_GROWTH = 4
+
+    SUMMARY_COLUMNS = "paper_id, title, authors, publication_date, keywords, created_at"
+    DETAIL_COLUMNS = "paper_id, abstract, summary"
+
+    def __init__(self, project_id: str, dataset_id: str, table_id: str, client=None, ttl: float = 300):
+        self.client = client if client is not None else resources.get_bigquery_client()
+        self.table = f"`{project_id}.{dataset_id}.{table_id}`"
+        self.partitions = f"`{project_id}.{dataset_id}.INFORMATION_SCHEMA.PARTITIONS`"
+        self.table_name = table_id
+        self.cache = TTLCache(ttl)
+
+    def _run(self, query: str, params: Sequence[Tuple[str, str, Any]] = ()):
+        """
+        Run a query with (name, type, value) parameters and return a DataFrame.
+        A parameter whose value is a list is passed as an ARRAY of its type.
+        """
+        key = (query, tuple((name, type_, tuple(value) if isinstance(value, list) else value)
+                            for name, type_, value in params))
+        df = self.cache.get(key)
+        if df is not None:
+            return df
+
+        from google.cloud import bigquery
+
+        query_parameters = [
+            bigquery.ArrayQueryParameter(name, type_, value) if isinstance(value, list)
+            else bigquery.ScalarQueryParameter(name, type_, value)
+            for name, type_, value in params
+        ]
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters, use_query_cache=True)
+        df = self.client.query(query, job_config=job_config).to_dataframe()
+        self.cache.set(key, df)
+        return df
+
+    @staticmethod
+    def _timestamp(df, column: str) -> Optional[datetime]:
+        value = df[column].iloc[0] if len(df) else None
+        if value is None or value != value:  # NULL comes back as NaT
+            return None
+        return value.to_pydatetime() if hasattr(value, "to_pydatetime") else value
+
+    def _oldest(self) -> Optional[datetime]:
+        """
+        Start of the oldest non-empty day partition, None for an empty table. It is read
+        from the partition metadata, which costs the same however many rows the table
+        holds; only a table without partitioning falls back to MIN(created_at), a full
+        scan like every other query on it. Cached like every query.
+        """
+        # Rows still in the streaming buffer (__UNPARTITIONED__) are recent and do not parse as a day
+        df = self._run(f"""
+        SELECT MIN(SAFE.PARSE_TIMESTAMP('%Y%m%d', partition_id)) AS oldest,
+               LOGICAL_OR(partition_id IS NULL) AS unpartitioned
+        FROM {self.partitions}
+        WHERE table_name = @table_name AND total_rows > 0
+        """, [("table_name", "STRING", self.table_name)])
+        if len(df) and df["unpartitioned"].fillna(False).astype(bool).iloc[0]:
+            return self._timestamp(self._run(f"SELECT MIN(created_at) AS oldest FROM {self.table}"), "oldest")
+        return self._timestamp(df, "oldest")
+
+    def _page(self, where: str, params: List[Tuple[str, str, Any]], page_size: int,
+              cursor: Optional[Cursor]):
+        """
+        Fetch one page of summary rows ordered by newest first.
+        The page is looked for in the last WINDOW_DAYS days of partitions before the
+        cursor, widening the window only while the page is not full and the window does
+        not yet reach the oldest partition. Every page query filters on created_at, and
+        the oldest partition comes from the partition metadata.
+        """
+        conditions = [f"({where})"] if where else []
+        if cursor is not None:
+            conditions.append(
+                "(created_at < @cursor_created_at"
+                " OR (created_at = @cursor_created_at AND paper_id < @cursor_paper_id))")
+            params = params + [("cursor_created_at", "TIMESTAMP", cursor[0]),
+                               ("cursor_paper_id", "STRING", cursor[1])]
+
+        # Windows start at midnight UTC so repeated views issue identical, cacheable queries
+        upper = cursor[0] if cursor is not None else datetime.now(timezone.utc)
+        upper = datetime(upper.year, upper.month, upper.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+        query = f"""
+        SELECT {self.SUMMARY_COLUMNS}
+        FROM {self.table}
+        WHERE {" AND ".join(conditions + ["created_at >= @since"])}
+        ORDER BY created_at DESC, paper_id DESC
+        LIMIT @limit
+        """
+        window_days = self.WINDOW_DAYS
+        while True:
+            since = upper - timedelta(days=window_days)
+            # Fetch one extra row to know whether there is a next page
+            df = self._run(query, params + [("since", "TIMESTAMP", since),
+                                            ("limit", "INT64", page_size + 1)])
+            if len(df) > page_size:
+                break
+            # Only a page that is not full needs the table bounds; a wider window than
+            # the oldest partition would scan the same partitions again for nothing
+            oldest = self._oldest()
+            if oldest is None or since <= oldest:
+                break
+            window_days *= self.WINDOW_GROWTH
+
+        next_cursor = None
+        if len(df) > page_size:
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            next_cursor = (last["created_at"].to_pydatetime(), last["paper_id"])
+        return df, next_cursor
+
+    def fetch_recent_papers(self, page_size: int = 10, cursor: Optional[Cursor] = None):
+        """Return a page of the most recently processed papers and the cursor of the next page."""
+        return self._page("", [], page_size, cursor)
+
+    def search(self, search_type: str, search_term: str, page_size: int = 10,
+               cursor: Optional[Cursor] = None):
+        """Return a page of papers matching search_term and the cursor of the next page."""
+        if search_type == "Title":
+            where = "LOWER(title) LIKE @pattern"
+        elif search_type == "Author":
+            where = "EXISTS (SELECT 1 FROM UNNEST(authors) AS author WHERE LOWER(author) LIKE @pattern)"
+        elif search_type == "Keywords":
+            where = "EXISTS (SELECT 1 FROM UNNEST(keywords) AS keyword WHERE LOWER(keyword) LIKE @pattern)"
+        else:  # Full Text
+            where = ("LOWER(CONCAT(IFNULL(title, ''), IFNULL(abstract, ''),"
+                     " IFNULL(methodology, ''), IFNULL(summary, ''))) LIKE @pattern")
+
+        pattern = f"%{search_term.lower()}%"
+        return self._page(where, [("pattern", "STRING", pattern)], page_size, cursor)
+
+    def fetch_details(self, paper_ids: Sequence[str], since: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch the detail columns of several papers in one query, keyed by paper_id.
+        Pass the oldest created_at of the papers as since to scan only their partitions.
+        """
+        if not len(paper_ids):
+            return {}
+        params = [("paper_ids", "STRING", sorted(paper_ids))]
+        partition_filter = ""
+        if since is not None:
+            partition_filter = "AND created_at >= @since"
+            params.append(("since", "TIMESTAMP", since))
+        query = f"""
+        SELECT {self.DETAIL_COLUMNS}
+        FROM {self.table}
+        WHERE paper_id IN UNNEST(@paper_ids) {partition_filter}
+        """
+        df = self._run(query, params)
+        return {row["paper_id"]: row.to_dict() for _, row in df.iterrows()}
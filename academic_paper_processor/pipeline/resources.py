@@ -0,0 +1,189 @@
+"""
+Process-wide resources shared by every pipeline, Streamlit session and thread.
+Each resource is built lazily on first use, exactly once, under a lock.
+"""
+from typing import Callable, Dict
+from contextlib import contextmanager
+import threading
+import time
+
+PROCESS_START = time.perf_counter()
+
+# Seconds spent building each resource, plus any timings recorded by callers
+timings: Dict[str, float] = {}
+
+_lock = threading.RLock()
+_llm = None
+_llm_client = None
+_bigquery_client = None
+_pipelines: Dict[tuple, object] = {}
+_job_queues: Dict[tuple, object] = {}
+_paper_queries: Dict[tuple, object] = {}
+_search_index = None
+_similarity_indexes: Dict[str, object] = {}
+_local_storage = None
+_checked_tables = set()
+
+
+def record_timing(name: str, seconds: float):
+    """Record a timing measurement under name."""
+    timings[name] = seconds
+
+
+@contextmanager
+def timed(name: str):
+    """Record the wall time of the enclosed block under name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def get_llm():
+    """Return the shared Gemini chat model."""
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                with timed("build_llm"):
+                    from langchain_google_genai import ChatGoogleGenerativeAI
+                    _llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-001", temperature=0)
+    return _llm
+
+
+def get_llm_client():
+    """Return the shared rate-limited LLMClient around the Gemini chat model."""
+    global _llm_client
+    if _llm_client is None:
+        with _lock:
+            if _llm_client is None:
+                from .llm_client import LLMClient
+                _llm_client = LLMClient(get_llm())
+    return _llm_client
+
+
+def get_bigquery_client():
+    """Return the shared BigQuery client built from the service account in st.secrets."""
+    global _bigquery_client
+    if _bigquery_client is None:
+        with _lock:
+            if _bigquery_client is None:
+                with timed("build_bigquery_client"):
+                    import streamlit as st
+                    from google.cloud import bigquery
+                    from google.oauth2 import service_account
+
+                    credentials = service_account.Credentials.from_service_account_info(
+                        st.secrets["gcp_service_account"])
+                    _bigquery_client = bigquery.Client(credentials=credentials)
+    return _bigquery_client
+
+
+def ensure_table(table_id: str, create: Callable[[], None]):
+    """Run create for table_id unless it already succeeded in this process."""
+    if table_id in _checked_tables:
+        return
+    with _lock:
+        if table_id not in _checked_tables:
+            with timed("ensure_table"):
+                create()
+            _checked_tables.add(table_id)
+
+
+def get_local_storage():
+    """Return the shared embedded LocalStorage, kept in sync with the search and similarity indexes."""
+    global _local_storage
+    if _local_storage is None:
+        with _lock:
+            if _local_storage is None:
+                from .local_storage import LocalStorage
+                _local_storage = LocalStorage(search_index=get_search_index(),
+                                              similarity_index=get_similarity_index())
+    return _local_storage
+
+
+def get_pipeline(project_id: str, dataset_id: str, table_id: str, backend: str = "bigquery",
+                 buffered: bool = False):
+    """
+    Return the shared AcademicPaperPipeline for a table, building it on first use.
+    With backend="local" papers are written to the embedded LocalStorage instead of BigQuery;
+    with buffered=True BigQuery rows are written in the background by a BufferedWriter.
+    """
+    key = (project_id, dataset_id, table_id, backend, buffered)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        with _lock:
+            pipeline = _pipelines.get(key)
+            if pipeline is None:
+                with timed("build_pipeline"):
+                    from . import AcademicPaperPipeline
+                    storage = get_local_storage() if backend == "local" else None
+                    pipeline = AcademicPaperPipeline(project_id=project_id, dataset_id=dataset_id, table_id=table_id,
+                                                     storage=storage, buffered=buffered)
+                    pipeline.on_stored.append(lambda paper_id: _invalidate_queries((project_id, dataset_id, table_id)))
+                _pipelines[key] = pipeline
+    return pipeline
+
+
+def get_job_queue(project_id: str, dataset_id: str, table_id: str, backend: str = "bigquery",
+                  buffered: bool = False):
+    """Return the shared background JobQueue feeding the pipeline of a table."""
+    key = (project_id, dataset_id, table_id, backend, buffered)
+    queue = _job_queues.get(key)
+    if queue is None:
+        with _lock:
+            queue = _job_queues.get(key)
+            if queue is None:
+                from .jobs import JobQueue
+                queue = JobQueue(get_pipeline(project_id, dataset_id, table_id, backend=backend, buffered=buffered))
+                _job_queues[key] = queue
+    return queue
+
+
+def get_search_index():
+    """Return the shared local full-text search index."""
+    global _search_index
+    if _search_index is None:
+        with _lock:
+            if _search_index is None:
+                from .search_index import SearchIndex
+                _search_index = SearchIndex()
+    return _search_index
+
+
+def get_similarity_index(name: str = "papers"):
+    """
+    Return a shared local similarity index: "papers" over the stored analyses for related
+    papers, "fingerprints" over the opening text of processed PDFs for near-duplicates.
+    """
+    index = _similarity_indexes.get(name)
+    if index is None:
+        with _lock:
+            index = _similarity_indexes.get(name)
+            if index is None:
+                from .similarity import SimilarityIndex
+                index = SimilarityIndex(name=name)
+                _similarity_indexes[name] = index
+    return index
+
+
+def _invalidate_queries(key: tuple):
+    """Drop the cached reads of a table once a paper was stored in it, so the views show it right away."""
+    queries = _paper_queries.get(key)
+    if queries is not None:
+        queries.cache.clear()
+
+
+def get_paper_queries(project_id: str, dataset_id: str, table_id: str):
+    """Return the shared PaperQueries for a table, so its result cache is shared by every session."""
+    key = (project_id, dataset_id, table_id)
+    queries = _paper_queries.get(key)
+    if queries is None:
+        with _lock:
+            queries = _paper_queries.get(key)
+            if queries is None:
+                from .queries import PaperQueries
+                queries = PaperQueries(project_id, dataset_id, table_id)
+                _paper_queries[key] = queries
+    return queries
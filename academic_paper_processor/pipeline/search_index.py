@@ -0,0 +1,153 @@
+from typing import Any, Dict, Iterable, List, Optional
+from pathlib import Path
+import argparse
+import os
+import re
+import sqlite3
+import threading
+
+# Separator used to store the repeated authors/keywords fields in a single FTS column
+_LIST_SEPARATOR = "\n"
+
+
+class SearchIndex:
+    """
+    Local SQLite FTS5 index over the papers written by BigQueryStorage.
+    Supports BM25-ranked, multi-term and prefix search over title, authors, keywords,
+    abstract and summary without scanning the BigQuery table.
+    """
+
+    INDEXED_COLUMNS = ("title", "authors", "keywords", "abstract", "summary")
+    # BM25 weight of each indexed column, in INDEXED_COLUMNS order
+    COLUMN_WEIGHTS = (10.0, 5.0, 5.0, 2.0, 1.0)
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = os.environ.get(
+                "PAPER_SEARCH_INDEX",
+                str(Path.home() / ".cache" / "academic_paper_processor" / "search_index.db")
+            )
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers USING fts5(
+                paper_id UNINDEXED,
+                {", ".join(self.INDEXED_COLUMNS)},
+                publication_date UNINDEXED,
+                created_at UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        """)
+        # FTS5 cannot look up its UNINDEXED paper_id column; this table maps it to the rowid
+        tables = [name for name, in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        self._conn.execute("CREATE TABLE IF NOT EXISTS paper_rows (paper_id TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        if "paper_rows" not in tables:
+            # Indexes created before the mapping existed
+            self._conn.execute("INSERT OR REPLACE INTO paper_rows SELECT paper_id, rowid FROM papers")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_values(row: Dict[str, Any]) -> tuple:
+        return (
+            row["paper_id"],
+            row.get("title") or "",
+            _LIST_SEPARATOR.join(row.get("authors") or []),
+            _LIST_SEPARATOR.join(row.get("keywords") or []),
+            row.get("abstract") or "",
+            row.get("summary") or "",
+            str(row["publication_date"]) if row.get("publication_date") is not None else None,
+            str(row["created_at"]) if row.get("created_at") is not None else None,
+        )
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Insert or replace papers given as BigQuery rows."""
+        values = [self._to_values(row) for row in rows]
+        with self._lock, self._conn:
+            for value in values:
+                existing = self._conn.execute("SELECT row FROM paper_rows WHERE paper_id = ?", (value[0],)).fetchone()
+                if existing is not None:
+                    self._conn.execute("DELETE FROM papers WHERE rowid = ?", existing)
+                row = self._conn.execute("INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", value).lastrowid
+                self._conn.execute("INSERT OR REPLACE INTO paper_rows VALUES (?, ?)", (value[0], row))
+
+    @staticmethod
+    def _to_match_query(search_term: str) -> str:
+        """Turn free text into an FTS5 query that requires every term as a prefix."""
+        terms = re.findall(r"\w+", search_term.lower())
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def search(self, search_term: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return the papers matching every term of search_term, best BM25 score first."""
+        match_query = self._to_match_query(search_term)
+        if not match_query:
+            return []
+
+        weights = ", ".join(str(w) for w in self.COLUMN_WEIGHTS)
+        with self._lock:
+            cursor = self._conn.execute(f"""
+                SELECT paper_id, title, authors, keywords, publication_date, bm25(papers, 0, {weights}) AS score
+                FROM papers
+                WHERE papers MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, (match_query, limit, offset))
+            rows = cursor.fetchall()
+
+        return [{
+            "paper_id": paper_id,
+            "title": title,
+            "authors": authors.split(_LIST_SEPARATOR) if authors else [],
+            "keywords": keywords.split(_LIST_SEPARATOR) if keywords else [],
+            "publication_date": publication_date,
+            # bm25() is lower for better matches; expose a higher-is-better score
+            "score": -score,
+        } for paper_id, title, authors, keywords, publication_date, score in rows]
+
+    def rebuild(self, client, table_id: str, batch_size: int = 1000) -> int:
+        """Replace the index contents with every paper in the BigQuery table. Returns the row count."""
+        query = f"""
+        SELECT paper_id, title, authors, keywords, abstract, summary, publication_date, created_at
+        FROM `{table_id}`
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM papers")
+            self._conn.execute("DELETE FROM paper_rows")
+        # With the mapping emptied, add_rows finds nothing to delete while the index is refilled
+
+        count = 0
+        batch = []
+        for row in client.query(query).result(page_size=batch_size):
+            batch.append(dict(row.items()))
+            if len(batch) >= batch_size:
+                self.add_rows(batch)
+                count += len(batch)
+                batch = []
+        self.add_rows(batch)
+        count += len(batch)
+
+        with self._lock:
+            self._conn.execute("INSERT INTO papers(papers) VALUES ('optimize')")
+            self._conn.commit()
+        return count
+
+
+def main():
+    """Rebuild the local search index from the BigQuery table configured in st.secrets."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--index-path", default=None)
+    args = parser.parse_args()
+
+    import streamlit as st
+    from . import resources
+
+    table_id = f"{st.secrets['gcp']['project_id']}.{st.secrets['gcp']['dataset_id']}.{st.secrets['gcp']['table_id']}"
+    count = SearchIndex(args.index_path).rebuild(resources.get_bigquery_client(), table_id)
+    print(f"Indexed {count} papers from {table_id}")
+
+
+if __name__ == "__main__":
+    main()
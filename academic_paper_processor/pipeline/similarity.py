@@ -0,0 +1,264 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from collections import Counter
+from pathlib import Path
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import zlib
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}")
+
+
+class SimilarityIndex:
+    """
+    Local vector index of papers for top-k cosine similarity queries.
+    Each paper is a hashed-feature vector of sublinear term frequencies over unigrams and
+    bigrams, kept in a NumPy matrix memory-mapped from disk and grown in place as papers
+    are added. IDF weights come from document frequencies kept alongside, so scores use
+    the current corpus statistics; queries are scored block by block with matrix products.
+    Several instances (threads or processes) can share a directory: rows are allocated
+    by SQLite inside the write transaction, and queries score a snapshot outside the lock.
+    """
+
+    def __init__(self, directory: Optional[str] = None, name: str = "papers",
+                 n_features: int = 2 ** 12, block_rows: int = 8192):
+        if directory is None:
+            directory = os.environ.get(
+                "PAPER_SIMILARITY_INDEX",
+                str(Path.home() / ".cache" / "academic_paper_processor" / "similarity")
+            )
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.n_features = n_features
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.directory / f"{name}.db"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    row INTEGER PRIMARY KEY,
+                    paper_id TEXT NOT NULL UNIQUE,
+                    title TEXT
+                )
+            """)
+        self._count = self._row_count()
+
+        # Raw float32 files: document frequencies per feature, and one vector row per paper
+        self._df_path = self.directory / f"{name}.df.f32"
+        self._vectors_path = self.directory / f"{name}.vectors.f32"
+        if self._df_path.exists():
+            self.n_features = self._df_path.stat().st_size // 4
+            self._df = np.memmap(self._df_path, dtype=np.float32, mode="r+")
+        else:
+            self._df = np.memmap(self._df_path, dtype=np.float32, mode="w+", shape=(n_features,))
+        self._vectors = self._open_vectors(1024)
+
+    def _row_count(self) -> int:
+        """Rows in use in the vector file, as recorded in SQLite by any instance."""
+        return self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+
+    def _open_vectors(self, min_rows: int) -> np.ndarray:
+        """Map the vector file, first extending it with zero rows to hold min_rows rows."""
+        row_bytes = self.n_features * 4
+        with open(self._vectors_path, "r+b" if self._vectors_path.exists() else "w+b") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size < min_rows * row_bytes:
+                file.truncate(min_rows * row_bytes)
+                size = min_rows * row_bytes
+            self._mmap = mmap.mmap(file.fileno(), size)
+        return np.ndarray((size // row_bytes, self.n_features), dtype=np.float32, buffer=self._mmap)
+
+    def _grow(self, rows: int):
+        """
+        Make room for at least rows rows, doubling the capacity of the vector file in place.
+        The file may already be larger when another instance grew it; it is then mapped again.
+        """
+        capacity = self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        # Snapshots taken by running queries keep the old mapping alive until they finish
+        self._vectors = self._open_vectors(capacity)
+
+    def _flush_rows(self, rows: Iterable[int]):
+        """Write the pages holding the given vector rows back to the file."""
+        row_bytes = self.n_features * 4
+        for row in sorted(set(rows)):
+            start = row * row_bytes
+            offset = start - start % mmap.ALLOCATIONGRANULARITY
+            self._mmap.flush(offset, start + row_bytes - offset)
+
+    def vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        """Hashed sublinear term-frequency vectors of texts, one row per text."""
+        vectors = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = _TOKEN_PATTERN.findall((text or "").lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            counts = Counter(zlib.crc32(feature.encode("utf-8")) % self.n_features for feature in features)
+            if counts:
+                columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                vectors[i, columns] = 1.0 + np.log(values)
+        return vectors
+
+    @staticmethod
+    def row_text(row: Dict[str, Any]) -> str:
+        """Text indexed for a stored paper: title (counted twice), keywords, abstract and summary."""
+        title = row.get("title") or ""
+        return "\n".join([title, title, " ".join(row.get("keywords") or []),
+                          row.get("abstract") or "", row.get("summary") or ""])
+
+    def add(self, paper_ids: Sequence[str], texts: Sequence[str], titles: Optional[Sequence[str]] = None):
+        """Insert or replace papers given their ids and texts."""
+        if not len(paper_ids):
+            return
+        vectors = self.vectorize(texts)
+        titles = titles if titles is not None else [None] * len(paper_ids)
+        with self._lock, self._conn:
+            # The write lock is taken before the next free row is read, so instances
+            # sharing the directory never hand out the same row or update df together
+            self._conn.execute("BEGIN IMMEDIATE")
+            count = self._row_count()
+            changed = []
+            for paper_id, vector, title in zip(paper_ids, vectors, titles):
+                existing = self._conn.execute("SELECT row FROM rows WHERE paper_id = ?", (paper_id,)).fetchone()
+                if existing is not None:
+                    row = existing[0]
+                    self._grow(row + 1)
+                    self._df -= self._vectors[row] > 0
+                else:
+                    row = count
+                    count += 1
+                    self._grow(count)
+                self._vectors[row] = vector
+                self._df += vector > 0
+                self._conn.execute("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)", (row, paper_id, title))
+                changed.append(row)
+            self._count = count
+            self._flush_rows(changed)
+            self._df.flush()
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Insert or replace papers given as BigQuery rows."""
+        rows = list(rows)
+        self.add([row["paper_id"] for row in rows], [self.row_text(row) for row in rows],
+                 [row.get("title") for row in rows])
+
+    def _snapshot(self):
+        """The vector matrix, a copy of the document frequencies and the row count; called under the lock."""
+        self._count = self._row_count()
+        self._grow(self._count)
+        return self._vectors, np.array(self._df), self._count
+
+    def _scores(self, queries: np.ndarray, vectors: np.ndarray, df: np.ndarray, count: int) -> np.ndarray:
+        """Cosine similarity of every query row against the first count rows of vectors, shape (queries, papers)."""
+        idf = np.log((1.0 + count) / (1.0 + df)) + 1.0
+        weighted = queries * idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        weighted /= np.where(norms == 0, 1.0, norms)
+
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, self.block_rows):
+            block = vectors[start:min(start + self.block_rows, count)] * idf
+            block_norms = np.linalg.norm(block, axis=1)
+            scores[:, start:start + len(block)] = (weighted @ block.T) / np.where(block_norms == 0, 1.0, block_norms)
+        return scores
+
+    def _top_k(self, scores: np.ndarray, k: int, exclude: Sequence[Optional[str]]) -> List[List[Dict[str, Any]]]:
+        # One extra candidate per query so that the excluded paper does not shorten the list
+        top = min(k + 1, scores.shape[1])
+        candidates = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        rows = sorted({int(row) for row in candidates.flat})
+        ids = {row: (paper_id, title) for row, paper_id, title in self._conn.execute(
+            f"SELECT row, paper_id, title FROM rows WHERE row IN ({', '.join('?' for _ in rows)})", rows)}
+
+        results = []
+        for query_scores, query_candidates, excluded in zip(scores, candidates, exclude):
+            matches = []
+            for row in sorted(query_candidates, key=lambda r: -query_scores[r]):
+                # Rows cleared by a rebuild since the snapshot are left out
+                if int(row) not in ids:
+                    continue
+                paper_id, title = ids[int(row)]
+                if paper_id != excluded and len(matches) < k:
+                    matches.append({"paper_id": paper_id, "title": title, "score": float(query_scores[row])})
+            results.append(matches)
+        return results
+
+    def similar(self, texts: Sequence[str], k: int = 5,
+                exclude: Optional[Sequence[Optional[str]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Return the k most similar papers of each text as {"paper_id", "title", "score"}
+        dicts, best first. exclude gives one paper_id per text to leave out (e.g. itself).
+        """
+        queries = self.vectorize(texts)
+        with self._lock:
+            vectors, df, count = self._snapshot()
+        if not count:
+            return [[] for _ in texts]
+        scores = self._scores(queries, vectors, df, count)
+        with self._lock:
+            return self._top_k(scores, k, exclude or [None] * len(texts))
+
+    def related(self, paper_id: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the k papers most similar to an indexed paper, best first."""
+        with self._lock:
+            existing = self._conn.execute("SELECT row FROM rows WHERE paper_id = ?", (paper_id,)).fetchone()
+            if existing is None:
+                return []
+            vectors, df, count = self._snapshot()
+            query = np.array(vectors[existing[0]:existing[0] + 1])
+        scores = self._scores(query, vectors, df, count)
+        with self._lock:
+            return self._top_k(scores, k, [paper_id])[0]
+
+    def rebuild(self, client, table_id: str, batch_size: int = 1000) -> int:
+        """Replace the index contents with every paper in the BigQuery table. Returns the row count."""
+        query = f"""
+        SELECT paper_id, title, keywords, abstract, summary
+        FROM `{table_id}`
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rows")
+            self._count = 0
+            self._vectors[:] = 0
+            self._df[:] = 0
+            self._mmap.flush()
+            self._df.flush()
+
+        count = 0
+        batch = []
+        for row in client.query(query).result(page_size=batch_size):
+            batch.append(dict(row.items()))
+            if len(batch) >= batch_size:
+                self.add_rows(batch)
+                count += len(batch)
+                batch = []
+        self.add_rows(batch)
+        return count + len(batch)
+
+
+def main():
+    """Rebuild the local similarity index from the BigQuery table configured in st.secrets."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--index-dir", default=None)
+    args = parser.parse_args()
+
+    import streamlit as st
+    from . import resources
+
+    table_id = f"{st.secrets['gcp']['project_id']}.{st.secrets['gcp']['dataset_id']}.{st.secrets['gcp']['table_id']}"
+    count = SimilarityIndex(args.index_dir).rebuild(resources.get_bigquery_client(), table_id)
+    print(f"Indexed {count} papers from {table_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,436 @@
-from google.cloud import bigquery
-from datetime import datetime
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse
+import atexit
+import io
+import json
+import os
+import threading
+import time
 import uuid
+import warnings
 from .processor import PaperMetadata,ResearchContent
-import streamlit as st
-from google.oauth2 import service_account
+from . import resources
 
-class BigQueryStorage:
-    """Handles storage of processed paper data in BigQuery."""
+# (name, type, mode) of every column of the papers table, shared by all backends
+PAPER_SCHEMA = [
+    ("paper_id", "STRING", "REQUIRED"),
+    ("title", "STRING", "REQUIRED"),
+    ("authors", "STRING", "REPEATED"),
+    ("publication_date", "DATE", "NULLABLE"),
+    ("abstract", "STRING", "NULLABLE"),
+    ("methodology", "STRING", "NULLABLE"),
+    ("findings", "STRING", "REPEATED"),
+    ("keywords", "STRING", "REPEATED"),
+    ("summary", "STRING", "NULLABLE"),
+    ("created_at", "TIMESTAMP", "NULLABLE"),
+]
 
-    def __init__(self, project_id: str, dataset_id: str, table_id:str):
-        credentials = service_account.Credentials.from_service_account_info(
-                    st.secrets["gcp_service_account"])
-        self.client = bigquery.Client(credentials=credentials)
-        self.table_id = f"{project_id}.{dataset_id}.{table_id}"
+# The BigQuery table is partitioned by day of created_at, so reads that filter on it only
+# scan the partitions they need, and clustered on the columns looked up by value
+PARTITION_FIELD = "created_at"
+CLUSTERING_FIELDS = ["paper_id", "title", "publication_date"]
 
-        # Ensure table exists
-        self._create_table_if_not_exists()
 
-    def _create_table_if_not_exists(self):
-        """Create the papers table if it doesn't exist."""
-        schema = [
-            bigquery.SchemaField("paper_id", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("title", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("authors", "STRING", mode="REPEATED"),
-            bigquery.SchemaField("publication_date", "DATE"),
-            bigquery.SchemaField("abstract", "STRING"),
-            bigquery.SchemaField("methodology", "STRING"),
-            bigquery.SchemaField("findings", "STRING", mode="REPEATED"),
-            bigquery.SchemaField("keywords", "STRING", mode="REPEATED"),
-            bigquery.SchemaField("summary", "STRING"),
-            bigquery.SchemaField("created_at", "TIMESTAMP"),
-        ]
-
-        #table_id = "your-project.your_dataset.your_table_name"
-        table = bigquery.Table(self.table_id, schema=schema)
-        table = self.client.create_table(table, exists_ok=True)
-
-    def store_paper(self, metadata: PaperMetadata, content: ResearchContent):
-        """Store processed paper data in BigQuery."""
-        rows_to_insert = [{
-            "paper_id": str(uuid.uuid4()),
+def _date_value(value: Optional[str]) -> Optional[str]:
+    """A publication date as YYYY-MM-DD, or None when it is empty or not a date ("Unknown")."""
+    try:
+        return date.fromisoformat((value or "").strip()[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+class PaperStorage:
+    """Interface of the storage backends accepted by AcademicPaperPipeline."""
+
+    def _build_row(self, metadata: PaperMetadata, content: ResearchContent, paper_id: Optional[str] = None) -> dict:
+        """Build a papers table row from the processed paper data."""
+        return {
+            "paper_id": paper_id or str(uuid.uuid4()),
             "title": metadata.title,
             "authors": metadata.authors,
-            "publication_date": metadata.publication_date,
+            # The DATE column rejects the whole row for anything but a date
+            "publication_date": _date_value(metadata.publication_date),
             "abstract": metadata.abstract,
             "methodology": content.methodology,
             "findings": content.findings,
             "keywords": content.keywords,
             "summary": content.summary,
             "created_at": datetime.utcnow().isoformat()
-        }]
+        }
+
+    def store_paper(self, metadata: PaperMetadata, content: ResearchContent, paper_id: Optional[str] = None):
+        """Store one processed paper, raising on failure."""
+        raise NotImplementedError
+
+    def store_papers(self, papers: List[Tuple[PaperMetadata, ResearchContent, Optional[str]]]) -> Dict[int, str]:
+        """
+        Store a group of (metadata, content, paper_id) tuples.
+        Returns a dict mapping the position of each failed paper to its error.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Write any buffered rows."""
+
+    def close(self):
+        """Flush buffered rows and release resources."""
+
+
+class BufferedWriter:
+    """
+    Collects rows and writes them to BigQuery from a background thread.
+    Rows are flushed once max_rows rows or max_bytes bytes are buffered, or max_interval
+    seconds after the oldest buffered row. Flushes of at least load_job_min_rows rows use
+    a batch load job instead of streaming inserts. Rows that cannot be written, or that
+    are still buffered at shutdown, are spilled to spill_path. The writer thread replays
+    the spill file after retry_delay seconds, doubling the delay up to max_retry_delay
+    while writes keep failing, and the next start replays it too. Rows BigQuery rejects as
+    invalid are never retried; they are appended with their errors to dead_letter_path.
+    on_written, when given, is called from the writer thread with each group of rows written.
+    """
+
+    def __init__(self, client: "bigquery.Client", table_id: str, max_rows: int = 500,
+                 max_bytes: int = 5 * 1024 * 1024, max_interval: float = 5.0,
+                 load_job_min_rows: int = 1000, spill_path: Optional[str] = None,
+                 retry_delay: float = 5.0, max_retry_delay: float = 300.0,
+                 dead_letter_path: Optional[str] = None,
+                 on_written: Optional[Callable[[List[dict]], None]] = None):
+        self.client = client
+        self.table_id = table_id
+        self.on_written = on_written
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.load_job_min_rows = load_job_min_rows
+        self.spill_path = Path(spill_path or os.environ.get(
+            "PAPER_SPILL_PATH",
+            str(Path.home() / ".cache" / "academic_paper_processor" / "unflushed_rows.jsonl")
+        ))
+        self.dead_letter_path = Path(dead_letter_path or self.spill_path.with_name("invalid_rows.jsonl"))
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._rows: List[dict] = []
+        self._bytes = 0
+        self._oldest: Optional[float] = None
+        self._flush_requested = False
+        self._closed = False
+        # Backoff before the spill file is replayed, and when that is due (None: nothing spilled)
+        self._delay = retry_delay
+        self._retry_at: Optional[float] = None
+        self._condition = threading.Condition()
+        self._flushed = threading.Condition(self._condition)
+
+        self._replay_spilled_rows()
+        self._thread = threading.Thread(target=self._run, name="bigquery-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, row: dict):
+        """Add a row to the buffer."""
+        size = len(json.dumps(row))
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BufferedWriter is closed")
+            self._rows.append(row)
+            self._bytes += size
+            if self._oldest is None:
+                # Wake the writer so it starts the max_interval timer
+                self._oldest = time.monotonic()
+                self._condition.notify_all()
+            elif len(self._rows) >= self.max_rows or self._bytes >= self.max_bytes:
+                self._condition.notify_all()
+
+    def flush(self):
+        """Write all buffered rows and wait until they have been written or spilled."""
+        with self._condition:
+            if not self._rows:
+                return
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._flush_requested and not self._closed:
+                self._flushed.wait()
+
+    def close(self):
+        """Flush the remaining rows and stop the background thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _should_flush(self) -> bool:
+        if not self._rows:
+            return False
+        return (self._flush_requested or self._closed
+                or len(self._rows) >= self.max_rows
+                or self._bytes >= self.max_bytes
+                or time.monotonic() - self._oldest >= self.max_interval)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._should_flush():
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    if self._retry_at is not None and now >= self._retry_at:
+                        self._replay_spilled_rows()
+                        self._flush_requested = bool(self._rows)
+                        continue
+                    deadlines = [self._retry_at]
+                    if self._oldest is not None:
+                        deadlines.append(self._oldest + self.max_interval)
+                    deadlines = [deadline for deadline in deadlines if deadline is not None]
+                    self._condition.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+                rows = self._rows
+                self._rows = []
+                self._bytes = 0
+                self._oldest = None
+
+            self._write(rows)
+
+            with self._condition:
+                if not self._rows:
+                    self._flush_requested = False
+                    self._flushed.notify_all()
+
+    def _insert(self, rows: List[dict]) -> Dict[int, List[dict]]:
+        """Stream rows into the table. Returns the errors of each failed position."""
+        failed: Dict[int, List[dict]] = {}
+        for error in self.client.insert_rows_json(self.table_id, rows, row_ids=[row["paper_id"] for row in rows]):
+            failed.setdefault(error["index"], []).extend(error["errors"])
+        return failed
+
+    def _write(self, rows: List[dict]):
+        """Write rows to BigQuery, spilling whatever could not be written and dead-lettering invalid rows."""
+        from google.cloud import bigquery
+
+        try:
+            if len(rows) >= self.load_job_min_rows:
+                data = "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+                job_config = bigquery.LoadJobConfig(
+                    source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+                )
+                try:
+                    self.client.load_table_from_file(io.BytesIO(data), self.table_id, job_config=job_config).result()
+                    failed = {}
+                except Exception as e:
+                    if getattr(e, "code", None) != 400:
+                        raise
+                    # The job was rejected for its data; streaming inserts report the bad rows one by one
+                    failed = self._insert(rows)
+            else:
+                failed = self._insert(rows)
+        except Exception:
+            self._spill(rows)
+            return
+
+        invalid = [i for i, errors in failed.items() if any(error.get("reason") == "invalid" for error in errors)]
+        if invalid:
+            self._dead_letter([(rows[i], failed[i]) for i in sorted(invalid)])
+        retry = [rows[i] for i in sorted(failed) if i not in invalid]
+        if retry:
+            self._spill(retry)
+        else:
+            self._delay = self.retry_delay
+
+        written = [row for i, row in enumerate(rows) if i not in failed]
+        if written and self.on_written is not None:
+            try:
+                self.on_written(written)
+            except Exception as e:
+                # The rows are in BigQuery; a failing callback must not stop the writer
+                warnings.warn(f"on_written failed for {len(written)} rows: {e}")
+
+    def _spill(self, rows: List[dict]):
+        """Append rows to the local spill file and schedule its replay with the next backoff delay."""
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+        with self._condition:
+            self._retry_at = time.monotonic() + self._delay
+            self._delay = min(self._delay * 2, self.max_retry_delay)
+
+    def _dead_letter(self, failures: List[Tuple[dict, List[dict]]]):
+        """Append rows BigQuery rejected as invalid, with their errors, to the dead-letter file."""
+        self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as file:
+            for row, errors in failures:
+                file.write(json.dumps({"row": row, "errors": errors}) + "\n")
+
+    def _replay_spilled_rows(self):
+        """Move spilled rows back into the buffer. Called at start and, under the lock, by the writer thread."""
+        self._retry_at = None
+        if not self.spill_path.exists():
+            return
+        replay_path = self.spill_path.with_name(self.spill_path.name + ".replay")
+        os.replace(self.spill_path, replay_path)
+        with open(replay_path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    row = json.loads(line)
+                    self._rows.append(row)
+                    self._bytes += len(line)
+        if self._rows:
+            self._oldest = time.monotonic()
+        replay_path.unlink()
 
-        errors = self.client.insert_rows_json(self.table_id, rows_to_insert)
+
+class BigQueryStorage(PaperStorage):
+    """Handles storage of processed paper data in BigQuery."""
+
+    def __init__(self, project_id: str, dataset_id: str, table_id:str, buffered: bool = False,
+                 client=None, search_index=None, similarity_index=None, **writer_options):
+        """
+        The BigQuery client is shared process-wide unless one is passed in.
+        With buffered=True, store_paper only enqueues the row and a BufferedWriter
+        (configured by writer_options) writes it in the background.
+        Every row written is also added to search_index and similarity_index when given.
+        """
+        self.client = client if client is not None else resources.get_bigquery_client()
+        self.table_id = f"{project_id}.{dataset_id}.{table_id}"
+        self.search_index = search_index
+        self.similarity_index = similarity_index
+
+        # Ensure table exists, once per process
+        resources.ensure_table(self.table_id, self._create_table_if_not_exists)
+
+        self.writer = (BufferedWriter(self.client, self.table_id, on_written=self._index_rows, **writer_options)
+                       if buffered else None)
+
+    def _index_rows(self, rows: List[dict]):
+        """Add rows written to the table to the local indexes."""
+        if self.search_index is not None:
+            self.search_index.add_rows(rows)
+        if self.similarity_index is not None:
+            self.similarity_index.add_rows(rows)
+
+    def _table_definition(self, table_id: str):
+        """The papers table with its schema, partitioning and clustering."""
+        from google.cloud import bigquery
+
+        schema = [bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in PAPER_SCHEMA]
+        table = bigquery.Table(table_id, schema=schema)
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY,
+                                                            field=PARTITION_FIELD)
+        table.clustering_fields = CLUSTERING_FIELDS
+        return table
+
+    def _create_table_if_not_exists(self):
+        """Create the papers table if it doesn't exist."""
+        table = self.client.create_table(self._table_definition(self.table_id), exists_ok=True)
+        if table.time_partitioning is None or table.time_partitioning.field != PARTITION_FIELD:
+            warnings.warn(f"{self.table_id} is not partitioned by {PARTITION_FIELD}; every read scans the "
+                          "whole table. Run `python -m academic_paper_processor.pipeline.storage migrate`.")
+
+    def migrate_table(self, backup_suffix: str = "_unpartitioned") -> bool:
+        """
+        Rebuild an existing unpartitioned table with the partitioned, clustered layout.
+        The rows are copied to a staging table, the old table is kept as a backup under
+        table_id + backup_suffix, and the staging table is copied into place. Rows written
+        while it runs may be missed, so pause the writers first. Returns whether the table
+        was migrated (False when it already has the layout).
+        """
+        from google.cloud import bigquery
+
+        table = self.client.get_table(self.table_id)
+        if (table.time_partitioning is not None and table.time_partitioning.field == PARTITION_FIELD
+                and table.clustering_fields == CLUSTERING_FIELDS):
+            return False
+
+        staging_id = f"{self.table_id}_migration"
+        backup_id = f"{self.table_id}{backup_suffix}"
+        self.client.delete_table(staging_id, not_found_ok=True)
+        self.client.create_table(self._table_definition(staging_id))
+        job_config = bigquery.QueryJobConfig(destination=staging_id,
+                                             write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+        columns = ", ".join(name for name, _, _ in PAPER_SCHEMA)
+        self.client.query(f"SELECT {columns} FROM `{self.table_id}`", job_config=job_config).result()
+
+        self.client.copy_table(self.table_id, backup_id).result()
+        self.client.delete_table(self.table_id)
+        # A copy job creating its destination keeps the source's partitioning and clustering
+        self.client.copy_table(staging_id, self.table_id).result()
+        self.client.delete_table(staging_id)
+        return True
+
+    def store_paper(self, metadata: PaperMetadata, content: ResearchContent, paper_id: Optional[str] = None):
+        """
+        Store processed paper data in BigQuery.
+        When a paper_id (content hash) is given it is also used as the insert id so that
+        BigQuery drops retried inserts of the same paper.
+        """
+        rows_to_insert = [self._build_row(metadata, content, paper_id)]
+        if self.writer is not None:
+            self.writer.enqueue(rows_to_insert[0])
+            return
+
+        row_ids = [row["paper_id"] for row in rows_to_insert]
+
+        errors = self.client.insert_rows_json(self.table_id, rows_to_insert, row_ids=row_ids)
         if errors:
-            raise Exception(f"Errors inserting rows: {errors}")
\ No newline at end of file
+            raise Exception(f"Errors inserting rows: {errors}")
+        self._index_rows(rows_to_insert)
+
+    def store_papers(self, papers: List[Tuple[PaperMetadata, ResearchContent, Optional[str]]]) -> Dict[int, str]:
+        """
+        Store a group of (metadata, content, paper_id) tuples with a single insert call.
+        Returns a dict mapping the position of each failed paper to its error.
+        """
+        if not papers:
+            return {}
+        rows_to_insert = [self._build_row(metadata, content, paper_id) for metadata, content, paper_id in papers]
+        if self.writer is not None:
+            for row in rows_to_insert:
+                self.writer.enqueue(row)
+            return {}
+
+        row_ids = [row["paper_id"] for row in rows_to_insert]
+
+        try:
+            errors = self.client.insert_rows_json(self.table_id, rows_to_insert, row_ids=row_ids)
+        except Exception as e:
+            return {i: str(e) for i in range(len(papers))}
+
+        failed = {error["index"]: f"Errors inserting rows: {error['errors']}" for error in errors}
+        self._index_rows([row for i, row in enumerate(rows_to_insert) if i not in failed])
+        return failed
+
+    def flush(self):
+        """Write any rows still buffered by the background writer."""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        """Flush buffered rows and stop the background writer."""
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main():
+    """Migrate the BigQuery table configured in st.secrets to the partitioned, clustered layout."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+
+    import streamlit as st
+
+    gcp = st.secrets["gcp"]
+    with warnings.catch_warnings():
+        # The table is expected to lack the layout until it is migrated
+        warnings.simplefilter("ignore")
+        storage = BigQueryStorage(gcp["project_id"], gcp["dataset_id"], gcp["table_id"])
+    if storage.migrate_table():
+        print(f"Migrated {storage.table_id}; the previous table is kept as {storage.table_id}_unpartitioned")
+    else:
+        print(f"{storage.table_id} already has the partitioned layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,85 @@
 import streamlit as st
-import pandas as pd
-from google.cloud import bigquery
-from pathlib import Path
-import tempfile
-from pipeline import AcademicPaperPipeline
-from google.oauth2 import service_account
-
-# Initialize BigQuery client
-credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"])
-client = bigquery.Client(credentials=credentials)
+import time
+from pipeline import resources
+from pipeline.metrics import metrics
+
+# The pipeline, LLM and BigQuery clients are built lazily and shared by every session
 PROJECT_ID = st.secrets["gcp"]["project_id"]
 DATASET_ID = st.secrets["gcp"]["dataset_id"]
 TABLE_ID = st.secrets["gcp"]["table_id"]
-
-def save_uploaded_file(uploaded_file):
-    """Save uploaded file temporarily and return the path"""
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        return tmp_file.name
-
-def process_paper(file_path):
-    """Process a single paper through the pipeline"""
-
-
-    pipeline = AcademicPaperPipeline(project_id=PROJECT_ID, dataset_id=DATASET_ID,table_id=TABLE_ID)
-    return pipeline.process_document(pdf_path=file_path)
-
-def fetch_recent_papers():
-    """Fetch recently processed papers from BigQuery"""
-    query = f"""
-    SELECT 
-        paper_id,
-        title,
-        authors,
-        publication_date,
-        keywords
-    FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-    ORDER BY created_at DESC
-    LIMIT 10
-    """
-    return client.query(query).to_dataframe()
+# "bigquery" (default) or "local" to write to and read from the embedded store
+STORAGE_BACKEND = st.secrets.get("storage", {}).get("backend", "bigquery")
+# Write BigQuery rows in the background with the BufferedWriter
+STORAGE_BUFFERED = st.secrets.get("storage", {}).get("buffered", False)
+# Seconds between re-renders of the upload page while its jobs are running
+REFRESH_SECONDS = 1
+
+def get_job_queue():
+    """Return the shared background queue that processes uploaded papers"""
+    return resources.get_job_queue(PROJECT_ID, DATASET_ID, TABLE_ID, backend=STORAGE_BACKEND,
+                                   buffered=STORAGE_BUFFERED)
+
+def show_results(results):
+    """Show the analysis fields known so far in tabs"""
+    tab1, tab2, tab3 = st.tabs(["Basic Info", "Analysis", "Summary"])
+
+    with tab1:
+        st.subheader("Paper Information")
+        if "title" in results:
+            st.write(f"**Title:** {results['title']}")
+            st.write(f"**Authors:** {', '.join(results['authors'])}")
+            st.write(f"**Publication Date:** {results['publication_date']}")
+        if "keywords" in results:
+            st.write(f"**Keywords:** {', '.join(results['keywords'])}")
+
+    with tab2:
+        st.subheader("Research Analysis")
+        if "methodology" in results:
+            st.write("**Methodology:**")
+            st.write(results['methodology'])
+        if "findings" in results:
+            st.write("**Key Findings:**")
+            for idx, finding in enumerate(results['findings'], 1):
+                st.write(f"{idx}. {finding}")
+
+    with tab3:
+        st.subheader("Paper Summary")
+        if "summary" in results:
+            st.write(results['summary'])
+
+def show_jobs(jobs):
+    """Show the status, progress and results so far of processing jobs"""
+    for job in jobs:
+        st.write(f"📄 **{job['result'].get('title') or job['filename']}** ({job['status']})")
+        st.progress(job['progress'])
+        if job['status'] == "failed":
+            st.error(job['error'])
+        elif job['status'] == "done" and not job['result'].get("stored", True):
+            st.warning("Storage is unavailable; the paper will be stored in the background.")
+        if job['result']:
+            with st.expander("Results"):
+                show_results(job['result'])
+
+def get_queries():
+    """Return the shared, cached query layer for the papers table"""
+    if STORAGE_BACKEND == "local":
+        return resources.get_local_storage()
+    return resources.get_paper_queries(PROJECT_ID, DATASET_ID, TABLE_ID)
+
+def current_cursor(state_key):
+    """Return the cursor of the page currently shown by a paginated view"""
+    return st.session_state.setdefault(state_key, [None])[-1]
+
+def pagination_controls(state_key, next_cursor):
+    """Show Previous/Next buttons for a paginated view"""
+    cursors = st.session_state[state_key]
+    col1, col2 = st.columns(2)
+    if len(cursors) > 1 and col1.button("Previous", key=f"{state_key}_previous"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor is not None and col2.button("Next", key=f"{state_key}_next"):
+        cursors.append(next_cursor)
+        st.rerun()
 
 def main():
     st.set_page_config(page_title="Academic Paper Analyzer", layout="wide")
@@ -50,53 +89,49 @@ def main():
     # Sidebar for navigation
     page = st.sidebar.selectbox(
         "Choose a page",
-        ["Upload Paper", "View Recent Papers", "Search Papers"]
+        ["Upload Paper", "Processing Jobs", "View Recent Papers", "Search Papers", "Admin: Metrics"]
     )
 
+    with st.sidebar.expander("Timings (seconds)"):
+        st.json({name: round(seconds, 3) for name, seconds in resources.timings.items()})
+
     if page == "Upload Paper":
-        st.header("Upload New Paper")
-        uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
-
-        if uploaded_file:
-            with st.spinner("Processing paper..."):
-                # Save uploaded file
-                temp_path = save_uploaded_file(uploaded_file)
-
-                try:
-                    # Process the paper
-                    results = process_paper(temp_path)
-
-                    # Display results in tabs
-                    tab1, tab2, tab3 = st.tabs(["Basic Info", "Analysis", "Summary"])
-
-                    with tab1:
-                        st.subheader("Paper Information")
-                        st.write(f"**Title:** {results['title']}")
-                        st.write(f"**Authors:** {', '.join(results['authors'])}")
-                        st.write(f"**Publication Date:** {results['publication_date']}")
-                        st.write(f"**Keywords:** {', '.join(results['keywords'])}")
-
-                    with tab2:
-                        st.subheader("Research Analysis")
-                        st.write("**Methodology:**")
-                        st.write(results['methodology'])
-                        st.write("**Key Findings:**")
-                        for idx, finding in enumerate(results['findings'], 1):
-                            st.write(f"{idx}. {finding}")
-
-                    with tab3:
-                        st.subheader("Paper Summary")
-                        st.write(results['summary'])
-
-                finally:
-                    # Clean up temporary file
-                    Path(temp_path).unlink()
+        st.header("Upload New Papers")
+        uploaded_files = st.file_uploader("Choose PDF files", type="pdf", accept_multiple_files=True)
+
+        # Streamlit returns the same files on every rerun; each upload is queued once
+        submitted = st.session_state.setdefault("submitted_jobs", {})
+        for uploaded_file in uploaded_files:
+            if uploaded_file.file_id not in submitted:
+                submitted[uploaded_file.file_id] = get_job_queue().submit(uploaded_file.name, uploaded_file.getvalue())
+
+        if submitted:
+            st.write("Papers are processed in the background. Keep browsing and find them later "
+                     "on the Processing Jobs page.")
+            jobs = get_job_queue().list_jobs(job_ids=list(submitted.values()))
+            show_jobs(jobs)
+
+            # Fill in each section as it arrives until every job of this session is finished
+            if any(job['status'] not in ("done", "failed") for job in jobs):
+                time.sleep(REFRESH_SECONDS)
+                st.rerun()
+
+    elif page == "Processing Jobs":
+        st.header("Processing Jobs")
+
+        counts = get_job_queue().counts()
+        st.write(" · ".join(f"**{status}:** {count}" for status, count in counts.items()))
+        st.button("Refresh")
+        show_jobs(get_job_queue().list_jobs())
 
     elif page == "View Recent Papers":
         st.header("Recently Processed Papers")
 
 
-        df = fetch_recent_papers()
+        df, next_cursor = get_queries().fetch_recent_papers(cursor=current_cursor("recent_cursors"))
+        # Details for the whole visible page come from one batched query
+        details = get_queries().fetch_details(df['paper_id'].tolist(),
+                                              since=df['created_at'].min() if len(df) else None)
 
         # Display papers in an expandable format
         for _, row in df.iterrows():
@@ -107,20 +142,55 @@ def main():
 
                 # Add button to view full details
                 if st.button("View Full Details", key=row['paper_id']):
-                    # Fetch and display complete paper details
-                    full_details = client.query(f"""
-                        SELECT *
-                        FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-                        WHERE paper_id = '{row['paper_id']}'
-                    """).to_dataframe().iloc[0]
+                    full_details = details[row['paper_id']]
 
                     st.write("**Abstract:**")
                     st.write(full_details['abstract'])
                     st.write("**Summary:**")
                     st.write(full_details['summary'])
 
-
-
+                    st.write("**Related Papers:**")
+                    related = resources.get_similarity_index().related(row['paper_id'])
+                    for paper in related:
+                        st.write(f"- {paper['title']} (similarity {paper['score']:.2f})")
+                    if not related:
+                        st.write("No related papers found.")
+
+        pagination_controls("recent_cursors", next_cursor)
+
+    elif page == "Admin: Metrics":
+        st.header("Pipeline Metrics")
+
+        enabled = st.toggle("Record metrics", value=metrics.enabled)
+        if enabled and not metrics.enabled:
+            metrics.enable()
+        elif not enabled and metrics.enabled:
+            metrics.disable()
+
+        summary = metrics.summary()
+        if not summary:
+            st.write("No metrics recorded yet. Enable recording and process a paper.")
+        for stage, values in summary.items():
+            st.subheader(stage)
+            st.table({key: {"mean": stats["mean"], "count": stats["count"]} for key, stats in values.items()})
+
+        col1, col2 = st.columns(2)
+        col1.download_button("Prometheus text", metrics.to_prometheus(), file_name="metrics.prom")
+        col2.download_button("JSON lines", metrics.to_jsonl(), file_name="metrics.jsonl")
+
+        st.subheader("Store retries")
+        pipeline = resources.get_pipeline(PROJECT_ID, DATASET_ID, TABLE_ID, backend=STORAGE_BACKEND,
+                                          buffered=STORAGE_BUFFERED)
+        checkpoints = pipeline.checkpoints
+        dead_letters = checkpoints.dead_letters()
+        st.write(f"**Pending:** {checkpoints.pending_retries()} · **Given up:** {len(dead_letters)}")
+        for letter in dead_letters:
+            with st.expander(f"{letter['paper_id']} ({letter['attempts']} attempts, {letter['failed_at']})"):
+                st.write(letter['last_error'])
+                if st.button("Retry", key=f"requeue_{letter['paper_id']}"):
+                    checkpoints.requeue_dead_letter(letter['paper_id'])
+                    pipeline.retry_queue.start()
+                    st.rerun()
 
     else:  # Search Papers
         st.header("Search Papers")
@@ -134,45 +204,37 @@ def main():
         search_term = st.text_input("Enter search term")
 
         if search_term:
-            # Construct and execute search query based on search type
-            query = f"""
-            SELECT 
-                paper_id,
-                title,
-                authors,
-                publication_date,
-                keywords
-            FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-            WHERE 
-            """
-
-            if search_type == "Title":
-                query += f"LOWER(title) LIKE LOWER('%{search_term}%')"
-            elif search_type == "Author":
-                query += f"EXISTS (SELECT 1 FROM UNNEST(authors) AS author WHERE LOWER(author) LIKE LOWER('%{search_term}%'))"
-            elif search_type == "Keywords":
-                query += f"EXISTS (SELECT 1 FROM UNNEST(keywords) AS keyword WHERE LOWER(keyword) LIKE LOWER('%{search_term}%'))"
-            else:  # Full Text
-                query += f"""
-                LOWER(CONCAT(
-                    title,
-                    abstract,
-                    methodology,
-                    summary
-                )) LIKE LOWER('%{search_term}%')
-                """
-
-            results = client.query(query).to_dataframe()
-
-            if len(results) > 0:
-                st.write(f"Found {len(results)} papers:")
-                for _, row in results.iterrows():
-                    with st.expander(f"📄 {row['title']}"):
-                        st.write(f"**Authors:** {', '.join(row['authors'])}")
-                        st.write(f"**Publication Date:** {row['publication_date']}")
-                        st.write(f"**Keywords:** {', '.join(row['keywords'])}")
+            if search_type == "Full Text":
+                # Ranked search served from the local index, no table scan
+                results = resources.get_search_index().search(search_term)
+                if results:
+                    st.write(f"Found {len(results)} papers:")
+                    for row in results:
+                        with st.expander(f"📄 {row['title']}"):
+                            st.write(f"**Authors:** {', '.join(row['authors'])}")
+                            st.write(f"**Publication Date:** {row['publication_date']}")
+                            st.write(f"**Keywords:** {', '.join(row['keywords'])}")
+                else:
+                    st.write("No papers found matching your search criteria.")
             else:
-                st.write("No papers found matching your search criteria.")
+                # Start from the first page whenever the search changes
+                if st.session_state.get("search_query") != (search_type, search_term):
+                    st.session_state["search_query"] = (search_type, search_term)
+                    st.session_state["search_cursors"] = [None]
+
+                results, next_cursor = get_queries().search(
+                    search_type, search_term, cursor=current_cursor("search_cursors"))
+
+                if len(results) > 0:
+                    st.write(f"Found {len(results)} papers:")
+                    for _, row in results.iterrows():
+                        with st.expander(f"📄 {row['title']}"):
+                            st.write(f"**Authors:** {', '.join(row['authors'])}")
+                            st.write(f"**Publication Date:** {row['publication_date']}")
+                            st.write(f"**Keywords:** {', '.join(row['keywords'])}")
+                    pagination_controls("search_cursors", next_cursor)
+                else:
+                    st.write("No papers found matching your search criteria.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
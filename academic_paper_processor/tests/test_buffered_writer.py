@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+import pytest
+from pipeline.storage import BufferedWriter
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class FakeClient:
+    """Records streaming inserts and load jobs; the first `fail` calls raise, titles in reject are invalid."""
+
+    def __init__(self, fail=0, reject=()):
+        self.fail = fail
+        self.reject = set(reject)
+        self.inserts = []
+        self.loads = []
+        self.written = threading.Event()
+
+    def _maybe_fail(self):
+        if self.fail:
+            self.fail -= 1
+            raise ServiceUnavailable("503 Service Unavailable")
+
+    def insert_rows_json(self, table_id, rows, row_ids=None):
+        self._maybe_fail()
+        errors = [{"index": i, "errors": [{"reason": "invalid", "message": "bad date"}]}
+                  for i, row in enumerate(rows) if row["title"] in self.reject]
+        errors += [{"index": i, "errors": [{"reason": "stopped"}]}
+                   for i, row in enumerate(rows) if errors and row["title"] not in self.reject]
+        if not errors:
+            self.inserts.append([row["paper_id"] for row in rows])
+            self.written.set()
+        return errors
+
+    def load_table_from_file(self, file, table_id, job_config=None):
+        self._maybe_fail()
+        self.loads.append([json.loads(line)["paper_id"] for line in file.read().decode("utf-8").splitlines()])
+        self.written.set()
+        return type("Job", (), {"result": lambda self: None})()
+
+
+def rows(count, start=0):
+    return [{"paper_id": f"p{i}", "title": f"Paper {i}"} for i in range(start, start + count)]
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def make(client, **options):
+        options.setdefault("max_interval", 60)
+        writer = BufferedWriter(client, "project.dataset.papers", spill_path=str(tmp_path / "spill.jsonl"), **options)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close()
+
+
+def written(client):
+    return sorted(paper_id for batch in client.inserts + client.loads for paper_id in batch)
+
+
+def test_flushes_when_max_rows_are_buffered(make_writer):
+    client = FakeClient()
+    writer = make_writer(client, max_rows=3)
+    for row in rows(2):
+        writer.enqueue(row)
+    assert not client.written.wait(0.1)
+    writer.enqueue(rows(1, start=2)[0])
+    assert client.written.wait(2)
+    assert client.inserts == [["p0", "p1", "p2"]]
+
+
+def test_flushes_when_max_bytes_are_buffered(make_writer):
+    client = FakeClient()
+    writer = make_writer(client, max_bytes=100)
+    for row in rows(3):
+        writer.enqueue(row)
+    assert client.written.wait(2)
+
+
+def test_flushes_max_interval_after_the_oldest_row(make_writer):
+    client = FakeClient()
+    writer = make_writer(client, max_interval=0.05)
+    writer.enqueue(rows(1)[0])
+    assert client.written.wait(2)
+    assert client.inserts == [["p0"]]
+
+
+def test_large_flushes_use_a_load_job(make_writer):
+    client = FakeClient()
+    writer = make_writer(client, load_job_min_rows=3)
+    for row in rows(3):
+        writer.enqueue(row)
+    writer.flush()
+    assert client.loads == [["p0", "p1", "p2"]] and client.inserts == []
+
+
+def test_failed_rows_are_spilled_and_retried_with_backoff(make_writer, tmp_path):
+    client = FakeClient(fail=2)
+    written_rows = []
+    writer = make_writer(client, retry_delay=0.01, on_written=written_rows.extend)
+    for row in rows(2):
+        writer.enqueue(row)
+    writer.flush()
+    assert (tmp_path / "spill.jsonl").exists()
+
+    deadline = time.monotonic() + 2
+    while len(written_rows) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert written(client) == ["p0", "p1"]
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_spilled_rows_are_replayed_on_start(make_writer, tmp_path):
+    with open(tmp_path / "spill.jsonl", "w") as file:
+        file.writelines(json.dumps(row) + "\n" for row in rows(2))
+    client = FakeClient()
+    writer = make_writer(client)
+    writer.flush()
+    assert written(client) == ["p0", "p1"]
+
+
+def test_invalid_rows_are_dead_lettered_not_retried(make_writer, tmp_path):
+    client = FakeClient(reject=["Paper 1"])
+    writer = make_writer(client, retry_delay=0.01)
+    for row in rows(3):
+        writer.enqueue(row)
+    writer.flush()
+
+    deadline = time.monotonic() + 2
+    while written(client) != ["p0", "p2"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert written(client) == ["p0", "p2"]
+    dead = [json.loads(line) for line in open(tmp_path / "invalid_rows.jsonl")]
+    assert [letter["row"]["paper_id"] for letter in dead] == ["p1"]
+    assert dead[0]["errors"][0]["reason"] == "invalid"
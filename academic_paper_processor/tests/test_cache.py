@@ -0,0 +1,38 @@
+from pipeline.cache import PaperCache
+
+
+def test_round_trip(tmp_path):
+    cache = PaperCache(str(tmp_path))
+    cache.put_text("a", "some text")
+    cache.put_result("a", {"title": "A"})
+    assert cache.has_text("a") and not cache.has_text("b")
+    assert cache.get_text("a") == "some text"
+    assert cache.get_result("a") == {"title": "A"}
+    assert cache.get_text("b") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PaperCache(str(tmp_path), max_bytes=250)
+    for paper_id in "abc":
+        cache.put_text(paper_id, "x" * 100)
+    assert cache.get_text("a") is None
+    cache.get_text("b")  # b is now more recent than c
+    cache.put_text("d", "x" * 100)
+    assert cache.get_text("c") is None
+    assert cache.get_text("b") and cache.get_text("d")
+
+
+def test_replacing_an_entry_counts_its_new_size_only(tmp_path):
+    cache = PaperCache(str(tmp_path), max_bytes=250)
+    cache.put_text("a", "x" * 100)
+    for _ in range(5):
+        cache.put_text("b", "x" * 100)
+    assert cache.get_text("a") and cache.get_text("b")
+
+
+def test_entries_survive_a_restart(tmp_path):
+    PaperCache(str(tmp_path)).put_text("a", "x" * 100)
+    cache = PaperCache(str(tmp_path), max_bytes=150)
+    assert cache.has_text("a")
+    cache.put_text("b", "x" * 100)
+    assert not cache.has_text("a") and cache.get_text("b")
@@ -0,0 +1,69 @@
+import pytest
+from benchmarks.fakes import FakeStorage
+from pipeline.checkpoint import CheckpointStore, RetryQueue
+from pipeline.processor import PaperMetadata, ResearchContent
+
+METADATA = PaperMetadata(title="A Paper", authors=["Jane Doe"], publication_date="2024-01-15", abstract="We study.")
+CONTENT = ResearchContent(methodology="Surveys.", findings=["More"], keywords=["surveys"], summary="Short.")
+
+
+class FailingStorage(FakeStorage):
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+        self.calls = 0
+
+    def store_papers(self, papers):
+        self.calls += 1
+        if self.error is None:
+            return super().store_papers(papers)
+        return {i: self.error for i in range(len(papers))}
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.save("p1", "process_content", METADATA, CONTENT)
+    return store
+
+
+def test_load_round_trips_the_analysis(checkpoints):
+    checkpoint = checkpoints.load("p1")
+    assert checkpoint == {"stage": "process_content", "metadata": METADATA, "content": CONTENT}
+
+
+def test_transient_errors_are_retried_until_stored(checkpoints):
+    storage = FailingStorage("503 Service Unavailable")
+    queue = RetryQueue(checkpoints, storage, base_delay=0, interval=3600)
+    queue.add("p1", "503 Service Unavailable")
+    queue.drain()
+    assert checkpoints.pending_retries() == 1
+    storage.error = None
+    assert queue.drain() == 1
+    assert checkpoints.pending_retries() == 0 and checkpoints.load("p1") is None
+    queue.close()
+
+
+def test_invalid_rows_are_dead_lettered_at_once(checkpoints):
+    error = "Errors inserting rows: [{'reason': 'invalid', 'message': 'Invalid date: 2024-13-45'}]"
+    queue = RetryQueue(checkpoints, FailingStorage(error), base_delay=0, interval=3600)
+    queue.add("p1", error)
+    assert checkpoints.pending_retries() == 0
+    assert [letter["paper_id"] for letter in checkpoints.dead_letters()] == ["p1"]
+    assert checkpoints.load("p1")["content"] == CONTENT
+
+
+def test_stores_are_given_up_after_max_attempts(checkpoints):
+    storage = FailingStorage("503 Service Unavailable")
+    queue = RetryQueue(checkpoints, storage, base_delay=0, interval=3600, max_attempts=3)
+    queue.add("p1", "503 Service Unavailable")
+    queue.drain()
+    queue.drain()
+    assert storage.calls == 2
+    assert checkpoints.pending_retries() == 0
+    assert checkpoints.dead_letters()[0]["attempts"] == 3
+
+    checkpoints.requeue_dead_letter("p1")
+    storage.error = None
+    assert queue.drain() == 1 and checkpoints.dead_letters() == []
+    queue.close()
@@ -0,0 +1,49 @@
+from pipeline.chunking import chunk_sections, drop_low_value_sections, estimate_tokens, split_sections
+
+
+PAPER = ("A Study of Things Jane Doe Abstract We study things. 1 Introduction Things matter. "
+         "Proofs are given in Appendix A. We then describe the model. 2 Methods We measure things. "
+         "3 Results Things grew. 4 Conclusion Things matter. REFERENCES [1] J. Doe. Things. 2020. "
+         "APPENDIX A Proof of the theorem.")
+
+
+def test_split_sections_at_headings():
+    assert [name for name, _ in split_sections(PAPER)] == [
+        "front", "abstract", "introduction", "methods", "results", "conclusion", "references", "appendix"]
+
+
+def test_reference_to_appendix_in_text_is_not_a_heading():
+    sections = dict(split_sections(PAPER))
+    assert "Proofs are given in Appendix A. We then describe the model." in sections["introduction"]
+
+
+def test_drop_low_value_sections_keeps_the_body():
+    kept = dict(drop_low_value_sections(split_sections(PAPER)))
+    assert set(kept) == {"front", "abstract", "introduction", "methods", "results", "conclusion"}
+    assert "Things grew." in kept["results"]
+
+
+def test_title_cased_back_matter_is_kept():
+    text = "1 Introduction See the References section and Appendix B for details. 2 Methods We count."
+    assert [name for name, _ in drop_low_value_sections(split_sections(text))] == ["introduction", "methods"]
+
+
+def test_body_heading_after_back_matter_starts_a_section():
+    text = "1 Introduction Hi. 2 ACKNOWLEDGMENTS We thank. 3 Results Numbers."
+    assert [name for name, _ in split_sections(text)] == ["introduction", "acknowledgments", "results"]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a cat") == 2
+    assert estimate_tokens("tokenization") == 3
+    assert estimate_tokens("123456, 7") == 4
+
+
+def test_chunk_sections_respects_the_budget():
+    sentence = "This sentence has exactly eight short words here."
+    sections = [("methods", " ".join([sentence] * 10)), ("results", sentence)]
+    chunks = chunk_sections(sections, max_tokens=30)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks).count(sentence) == 11
@@ -0,0 +1,62 @@
+import pytest
+from benchmarks.corpus import AUTHORS, generate_paper
+from pipeline.extractor import PDFExtractor
+
+
+@pytest.fixture
+def paper(tmp_path):
+    return generate_paper(str(tmp_path / "paper.pdf"), num_pages=2)
+
+
+def test_extract_metadata_from_the_first_page(paper):
+    stats = {}
+    metadata = PDFExtractor().extract_metadata(paper, stats=stats)
+    assert metadata["title"].startswith("A Synthetic Study of")
+    assert metadata["authors"] == AUTHORS.split(", ")
+    assert metadata["publication_date"] == "2024-01-15"
+    assert metadata["abstract"] and "Introduction" not in metadata["abstract"]
+    assert metadata["confidence"] == min(metadata["confidences"].values()) >= 0.7
+    assert stats["metadata_confidence"] == metadata["confidence"]
+
+
+def test_word_hyphenated_across_a_blank_page_is_joined():
+    pages = ["We study comp-", "", "  ", "utation at scale."]
+    assert list(PDFExtractor()._join_pages(iter(pages))) == ["We study", "computation at scale."]
+
+
+def test_trailing_fragment_is_kept():
+    assert list(PDFExtractor()._join_pages(iter(["end of the docu-"]))) == ["end of the", "docu"]
+
+
+def test_max_bytes_caps_the_text(paper):
+    assert len(PDFExtractor(max_bytes=100).extract_text(paper).encode("utf-8")) <= 100
+
+
+def test_parallel_extraction_matches_serial(tmp_path):
+    paper = generate_paper(str(tmp_path / "long.pdf"), num_pages=12)
+    serial = PDFExtractor().extract_text(paper)
+    parallel = PDFExtractor(processes=2, parallel_min_pages=4, pages_per_task=2)
+    assert parallel.extract_text(paper) == serial
+    capped = PDFExtractor(processes=2, parallel_min_pages=4, pages_per_task=2, max_bytes=200)
+    stats = {}
+    assert serial.startswith(capped.extract_text(paper, stats=stats))
+    assert stats["pages"] < 12
+
+
+def test_indirect_document_information_entries_are_resolved(paper, tmp_path):
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import NameObject, TextStringObject
+
+    indirect = str(tmp_path / "indirect.pdf")
+    with open(paper, "rb") as source, open(indirect, "wb") as file:
+        reader = PdfReader(source)
+        writer = PdfWriter()
+        for page in reader.pages:
+            writer.add_page(page)
+        info = writer._info.get_object()
+        for key in ("/Title", "/Author", "/CreationDate"):
+            info[NameObject(key)] = writer._add_object(TextStringObject(reader.metadata[key]))
+        writer.write(file)
+
+    assert PDFExtractor().extract_metadata(indirect)["confidences"] == \
+        PDFExtractor().extract_metadata(paper)["confidences"]
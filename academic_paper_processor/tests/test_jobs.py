@@ -0,0 +1,118 @@
+import threading
+import time
+import pytest
+from pipeline.jobs import JobQueue
+from pipeline.processor import PaperMetadata
+
+METADATA = PaperMetadata(title="A Paper", authors=["Jane Doe"], publication_date="2024-01-15", abstract="We study.")
+
+
+class FakePipeline:
+    """Yields the events of stream_document, pausing after extraction until gate is set."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+        self.paths = []
+
+    def stream_document(self, pdf_path):
+        self.paths.append(pdf_path)
+        yield "stage", "extracting"
+        yield "metadata", METADATA
+        self.gate.wait()
+        yield "stage", "analyzing"
+        if self.fail:
+            raise RuntimeError("analysis failed")
+        yield "summary", "Short."
+        yield "stage", "storing"
+        yield "results", {"paper_id": "p1", "title": "A Paper", "summary": "Short.", "processed_file": pdf_path,
+                          "stored": True}
+
+
+@pytest.fixture
+def pipelines():
+    """Make FakePipelines whose gates are opened at the end, so no worker is left blocked."""
+    made = []
+
+    def make(**options):
+        made.append(FakePipeline(**options))
+        return made[-1]
+
+    yield make
+    for pipeline in made:
+        pipeline.gate.set()
+
+
+def wait_for(queue, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} is {queue.get(job_id)['status']}, not {status}")
+
+
+def test_job_reports_partial_results_then_finishes(tmp_path, pipelines):
+    pipeline = pipelines()
+    pipeline.gate.clear()
+    queue = JobQueue(pipeline, path=str(tmp_path / "jobs.db"))
+    job_id = queue.submit("paper.pdf", b"%PDF-1.4")
+
+    job = wait_for(queue, job_id, "extracting")
+    deadline = time.monotonic() + 5
+    while not job["result"] and time.monotonic() < deadline:
+        job = queue.get(job_id)
+    assert job["result"]["title"] == "A Paper"
+    assert 0.05 < job["progress"] < 0.2
+
+    pipeline.gate.set()
+    job = wait_for(queue, job_id, "done")
+    assert job["progress"] == 1.0 and job["paper_id"] == "p1" and job["error"] is None
+    assert job["result"]["summary"] == "Short." and "processed_file" not in job["result"]
+    assert queue.counts()["done"] == 1
+    # The upload is removed once processed
+    assert not list((tmp_path / "uploads").iterdir())
+    queue.close()
+
+
+def test_failed_job_keeps_its_error(tmp_path, pipelines):
+    queue = JobQueue(pipelines(fail=True), path=str(tmp_path / "jobs.db"))
+    job = wait_for(queue, queue.submit("paper.pdf", b"%PDF-1.4"), "failed")
+    assert job["error"] == "analysis failed"
+    assert queue.counts() == {"queued": 0, "extracting": 0, "analyzing": 0, "storing": 0, "done": 0, "failed": 1}
+    queue.close()
+
+
+def test_list_jobs_returns_the_newest_first(tmp_path, pipelines):
+    queue = JobQueue(pipelines(), path=str(tmp_path / "jobs.db"))
+    first = queue.submit("first.pdf", b"%PDF-1.4")
+    time.sleep(0.01)
+    second = queue.submit("second.pdf", b"%PDF-1.4")
+    wait_for(queue, first, "done")
+    wait_for(queue, second, "done")
+    assert [job["job_id"] for job in queue.list_jobs()] == [second, first]
+    assert [job["filename"] for job in queue.list_jobs(job_ids=[first])] == ["first.pdf"]
+    assert queue.list_jobs(job_ids=[]) == []
+    queue.close()
+
+
+def test_jobs_interrupted_by_a_restart_run_again(tmp_path, pipelines):
+    path = str(tmp_path / "jobs.db")
+    pipeline = pipelines()
+    pipeline.gate.clear()
+    queue = JobQueue(pipeline, path=path)
+    job_id = queue.submit("paper.pdf", b"%PDF-1.4")
+    wait_for(queue, job_id, "extracting")
+    while not queue.get(job_id)["result"]:  # the worker is now blocked on the gate
+        time.sleep(0.01)
+    # Simulate a process that stopped mid-job: the row stays "extracting" and the upload stays on disk
+    queue._executor.shutdown(wait=False)
+
+    restarted_pipeline = pipelines()
+    restarted = JobQueue(restarted_pipeline, path=path)
+    job = wait_for(restarted, job_id, "done")
+    assert job["paper_id"] == "p1"
+    assert restarted_pipeline.paths == [str(tmp_path / "uploads" / f"{job_id}.pdf")]
+    restarted.close()
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from pipeline import llm_client
+from pipeline.llm_client import FakeChatModel, LLMClient, TokenBucket, is_retryable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(capacity=60, period=60)
+    assert bucket.reserve(60) == 0.0
+    # Over capacity the caller waits until the bucket has refilled its deficit
+    assert bucket.reserve(30) == pytest.approx(30.0)
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(capacity=60, period=60)
+    bucket.reserve(60)
+    clock.now += 10
+    assert bucket.reserve(10) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_token_bucket_does_not_refill_past_capacity(clock):
+    bucket = TokenBucket(capacity=10, period=60)
+    clock.now += 3600
+    assert bucket.reserve(10) == 0.0
+    assert bucket.reserve(10) == pytest.approx(60.0)
+
+
+@pytest.mark.parametrize("message, retryable", [
+    ("429 Resource has been exhausted (e.g. check quota).", True),
+    ("503 Service Unavailable", True),
+    ("400 Invalid argument", False),
+])
+def test_is_retryable(message, retryable):
+    assert is_retryable(Exception(message)) is retryable
+
+
+def test_client_retries_rate_limits(monkeypatch):
+    monkeypatch.setattr(llm_client.time, "sleep", lambda seconds: None)
+    model = FakeChatModel(fail_first=2)
+    client = LLMClient(model, max_retries=3)
+    assert "---SUMMARY---" in client.invoke("Paper text: words words words Provide your analysis")
+    assert model.calls == 3
+
+
+def test_client_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(llm_client.time, "sleep", lambda seconds: None)
+    client = LLMClient(FakeChatModel(fail_first=5), max_retries=1)
+    with pytest.raises(llm_client.FakeRateLimitError):
+        client.invoke("prompt")
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    model = FakeChatModel(latency=0.2)
+    client = LLMClient(model)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(client.invoke, ["same prompt"] * 4))
+    assert len(set(responses)) == 1
+    assert model.calls == 1
+    # Once the call has finished the next one goes to the model again
+    client.invoke("same prompt")
+    assert model.calls == 2
+
+
+def test_identical_async_prompts_in_flight_share_one_call():
+    model = FakeChatModel(latency=0.05)
+    client = LLMClient(model)
+
+    async def run():
+        return await asyncio.gather(*(client.ainvoke(prompt) for prompt in ["a", "a", "b"]))
+
+    responses = asyncio.run(run())
+    assert responses[0] == responses[1]
+    assert model.calls == 2
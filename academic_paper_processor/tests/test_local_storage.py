@@ -0,0 +1,118 @@
+import json
+import pytest
+from pipeline.local_storage import LocalStorage
+from pipeline.processor import PaperMetadata, ResearchContent
+
+
+def paper(i, title=None, authors=("Jane Doe",), keywords=("surveys",)):
+    metadata = PaperMetadata(title=title or f"Paper {i}", authors=list(authors), publication_date="2024-01-15",
+                             abstract=f"Abstract {i}.")
+    content = ResearchContent(methodology="Surveys.", findings=["More"], keywords=list(keywords),
+                              summary=f"Summary {i}.")
+    return metadata, content, f"p{i}"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(str(tmp_path / "papers.db"))
+    yield storage
+    storage.close()
+
+
+def test_store_and_page_newest_first(storage):
+    for i in range(5):
+        storage.store_paper(*paper(i))
+    df, cursor = storage.fetch_recent_papers(page_size=3)
+    assert list(df["paper_id"]) == ["p4", "p3", "p2"]
+    assert df.iloc[0]["authors"] == ["Jane Doe"]
+    df, cursor = storage.fetch_recent_papers(page_size=3, cursor=cursor)
+    assert list(df["paper_id"]) == ["p1", "p0"] and cursor is None
+
+
+def test_store_papers_replaces_a_paper_stored_again(storage):
+    assert storage.store_papers([paper(1), paper(2)]) == {}
+    storage.store_paper(*paper(1, title="Paper 1, revised"))
+    df, _ = storage.fetch_recent_papers()
+    assert sorted(df["title"]) == ["Paper 1, revised", "Paper 2"]
+
+
+@pytest.mark.parametrize("search_type, term, expected", [
+    ("Title", "graphs", ["p1"]),
+    ("Author", "ada", ["p2"]),
+    ("Keywords", "TREES", ["p1"]),
+    ("Full Text", "summary 2", ["p2"]),
+])
+def test_search(storage, search_type, term, expected):
+    storage.store_paper(*paper(1, title="Learning on Graphs", keywords=("trees",)))
+    storage.store_paper(*paper(2, authors=("Ada Lovelace",)))
+    df, _ = storage.search(search_type, term)
+    assert list(df["paper_id"]) == expected
+
+
+def test_fetch_details(storage):
+    storage.store_papers([paper(1), paper(2)])
+    details = storage.fetch_details(["p1", "p2", "missing"])
+    assert details["p1"]["summary"] == "Summary 1." and set(details) == {"p1", "p2"}
+    df, _ = storage.fetch_recent_papers()
+    assert set(storage.fetch_details(["p1"], since=df["created_at"].min())) == {"p1"}
+    assert storage.fetch_details(["p1"], since="9999-01-01") == {}
+    assert storage.fetch_details([]) == {}
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class FakeLoadClient:
+    """Loads NDJSON like BigQuery: a job fails with a 400 if any of its rows is invalid."""
+
+    def __init__(self, invalid_titles=(), error=None):
+        self.invalid_titles = set(invalid_titles)
+        self.error = error
+        self.loaded = []
+        self.jobs = 0
+
+    def load_table_from_file(self, file, table_id, job_config):
+        self.jobs += 1
+        rows = [json.loads(line) for line in file.read().decode("utf-8").splitlines()]
+        client = self
+
+        class Job:
+            def result(self):
+                if client.error is not None:
+                    raise client.error
+                bad = [row["title"] for row in rows if row["title"] in client.invalid_titles]
+                if bad:
+                    raise BadRequest(f"Invalid row: {bad[0]}")
+                client.loaded.extend(rows)
+
+        return Job()
+
+
+def test_sync_pushes_each_row_once(storage):
+    storage.store_papers([paper(i) for i in range(5)])
+    client = FakeLoadClient()
+    assert storage.sync_to_bigquery(client, "p.d.t", batch_size=2) == 5
+    assert sorted(row["paper_id"] for row in client.loaded) == [f"p{i}" for i in range(5)]
+    assert storage.sync_to_bigquery(client, "p.d.t") == 0
+
+
+def test_sync_isolates_rows_bigquery_rejects(storage):
+    storage.store_papers([paper(i) for i in range(8)] + [paper(8, title="Bad")])
+    client = FakeLoadClient(invalid_titles={"Bad"})
+    assert storage.sync_to_bigquery(client, "p.d.t") == 8
+    assert list(storage.sync_errors()) == ["p8"]
+    # The rejected row no longer holds up later syncs
+    storage.store_paper(*paper(9))
+    assert storage.sync_to_bigquery(client, "p.d.t") == 1
+    # Storing the paper again retries it
+    storage.store_paper(*paper(8))
+    assert storage.sync_to_bigquery(client, "p.d.t") == 1 and storage.sync_errors() == {}
+
+
+def test_sync_stops_on_other_errors(storage):
+    storage.store_papers([paper(1), paper(2)])
+    with pytest.raises(ConnectionError):
+        storage.sync_to_bigquery(FakeLoadClient(error=ConnectionError("network down")), "p.d.t")
+    assert storage.sync_errors() == {}
+    assert storage.sync_to_bigquery(FakeLoadClient(), "p.d.t") == 2
@@ -0,0 +1,59 @@
+import threading
+import pytest
+from benchmarks.corpus import generate_paper
+from benchmarks.fakes import FakeStorage
+from pipeline import AcademicPaperPipeline, CheckpointStore, ContentProcessor, GraphState, PaperCache
+from pipeline.llm_client import FakeChatModel
+from pipeline.memory import MemoryBudget
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "file.pdf"
+    path.write_bytes(b"x" * 1000)
+    return str(path)
+
+
+def test_estimate_scales_the_file_size_and_applies_the_caps(pdf):
+    assert MemoryBudget(10_000).estimate(pdf) == 2000
+    assert MemoryBudget(10_000, text_to_file_ratio=3.0, max_text_bytes=500).estimate(pdf) == 500
+    assert MemoryBudget(800).estimate(pdf) == 800
+
+
+def test_acquire_waits_until_enough_is_released():
+    budget = MemoryBudget(100)
+    assert budget.acquire(70) == 70
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (budget.acquire(50), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    budget.release(70)
+    assert acquired.wait(2)
+    thread.join()
+    assert budget.used == 50
+    # A reservation larger than the budget is capped instead of waiting forever
+    budget.release(50)
+    assert budget.acquire(500) == 100
+
+
+def test_waves_keep_each_group_within_the_budget(tmp_path, pdf):
+    paths = [pdf] * 5 + [str(tmp_path / "missing.pdf")]
+    assert [len(wave) for wave in MemoryBudget(4500).waves(paths)] == [2, 2, 2]
+
+
+def test_processed_documents_release_their_text_and_reservation(tmp_path):
+    papers = [generate_paper(str(tmp_path / f"paper{i}.pdf"), num_pages=1, seed=i) for i in range(3)]
+    pipeline = AcademicPaperPipeline(
+        content_processor=ContentProcessor(llm=FakeChatModel()), storage=FakeStorage(),
+        cache=PaperCache(str(tmp_path / "cache")), checkpoints=CheckpointStore(str(tmp_path / "checkpoints.db")),
+        duplicate_threshold=None, memory_budget_bytes=10 ** 6)
+
+    assert pipeline.process_document(papers[0])["stored"]
+    assert pipeline.memory_budget.used == 0
+    assert all(result["stored"] for result in pipeline.process_batch(papers[1:]))
+    assert pipeline.memory_budget.used == 0
+
+    state = GraphState(pdf_path=papers[0], text="some text", reserved_bytes=100)
+    pipeline.memory_budget.acquire(100)
+    pipeline._release_text(state)
+    assert state.text is None and state.reserved_bytes == 0 and pipeline.memory_budget.used == 0
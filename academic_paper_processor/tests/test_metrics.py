@@ -0,0 +1,55 @@
+import json
+import pytest
+from pipeline.metrics import Metrics
+
+
+def test_disabled_stages_record_nothing():
+    metrics = Metrics()
+    with metrics.stage("extract_text") as stage:
+        assert stage is None
+    metrics.record("extract_text", pages=3)
+    assert metrics.summary() == {} and metrics.to_jsonl() == ""
+
+
+def test_stage_records_its_values_wall_time_and_errors(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = Metrics(enabled=True, jsonl_path=str(path))
+    with metrics.stage("extract_text") as stage:
+        stage["pages"] = 3
+        stage["truncated"] = True
+    with pytest.raises(ValueError):
+        with metrics.stage("extract_text") as stage:
+            stage["pages"] = 5
+            raise ValueError("bad pdf")
+
+    summary = metrics.summary()["extract_text"]
+    assert summary["pages"] == {"sum": 8.0, "count": 2, "mean": 4.0}
+    assert summary["truncated"]["count"] == 1
+    assert summary["error"] == {"sum": 1.0, "count": 2, "mean": 0.5}
+    assert summary["wall_seconds"]["count"] == 2
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event["pages"] for event in events] == [3, 5]
+    assert metrics.to_jsonl() == path.read_text()
+
+
+def test_prometheus_text_has_a_sum_and_count_per_stage():
+    metrics = Metrics(enabled=True)
+    metrics.record("store_results", insert_seconds=0.5, paper_id="p1")
+    metrics.record("store_results", insert_seconds=1.5)
+    text = metrics.to_prometheus(prefix="test")
+    assert "# TYPE test_insert_seconds summary" in text
+    assert 'test_insert_seconds_sum{stage="store_results"} 2.0' in text
+    assert 'test_insert_seconds_count{stage="store_results"} 2' in text
+    # Values that are not numbers are kept in the events only
+    assert "paper_id" not in text
+
+
+def test_reset_clears_events_and_sums():
+    metrics = Metrics(enabled=True, max_events=2)
+    for pages in range(3):
+        metrics.record("extract_text", pages=pages)
+    assert len(metrics.events) == 2
+    assert metrics.summary()["extract_text"]["pages"]["count"] == 3
+    metrics.reset()
+    assert metrics.summary() == {} and not metrics.events
@@ -0,0 +1,111 @@
+import pytest
+from benchmarks.corpus import generate_paper
+from benchmarks.fakes import FakeChatModel, FakeStorage
+from pipeline import AcademicPaperPipeline, CheckpointStore, ContentProcessor, PaperCache
+from pipeline.similarity import SimilarityIndex
+
+
+class RecordingCache(PaperCache):
+    def __init__(self, cache_dir, events):
+        super().__init__(cache_dir)
+        self.events = events
+
+    def put_text(self, paper_id, text):
+        self.events.append("extracted")
+        super().put_text(paper_id, text)
+
+
+class RecordingStorage(FakeStorage):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def store_papers(self, papers):
+        self.events.extend("stored" for _ in papers)
+        return super().store_papers(papers)
+
+
+@pytest.fixture
+def papers(tmp_path):
+    return [generate_paper(str(tmp_path / f"paper{i}.pdf"), num_pages=1, seed=i) for i in range(6)]
+
+
+def build(tmp_path, events):
+    return AcademicPaperPipeline(
+        content_processor=ContentProcessor(llm=FakeChatModel()),
+        storage=RecordingStorage(events),
+        cache=RecordingCache(str(tmp_path / "cache"), events),
+        checkpoints=CheckpointStore(str(tmp_path / "checkpoints.db")),
+        fingerprints=SimilarityIndex(str(tmp_path / "index"), name="fingerprints"),
+    )
+
+
+def test_batch_stores_while_extraction_is_still_running(tmp_path, papers):
+    events = []
+    results = build(tmp_path, events).process_batch(papers, max_workers=1, max_llm_concurrency=1,
+                                                     store_batch_size=1)
+    assert [result["processed_file"] for result in results] == papers
+    assert all(result["stored"] and not result["error"] for result in results)
+    assert events.count("stored") == 6
+    # Extraction runs only a couple of documents ahead of the LLM pool
+    assert events.index("stored") < len(events) - 1 - events[::-1].index("extracted")
+
+
+def test_batch_answers_known_papers_from_the_cache(tmp_path, papers):
+    events = []
+    pipeline = build(tmp_path, events)
+    pipeline.process_batch(papers[:2])
+    results = pipeline.process_batch(papers[:2])
+    assert all(result["cached"] for result in results)
+    assert events.count("stored") == 2
+
+
+def test_near_duplicate_reuses_the_cached_analysis(tmp_path, papers):
+    events = []
+    pipeline = build(tmp_path, events)
+    first = pipeline.process_batch(papers[:1])[0]
+    copy = tmp_path / "copy.pdf"
+    # Same document, different bytes: a different paper_id but the same text
+    copy.write_bytes(open(papers[0], "rb").read() + b"\n% revised\n")
+    calls = pipeline.content_processor.llm.calls
+
+    result = pipeline.process_batch([str(copy)])[0]
+    assert result["stored"] and result["duplicate_of"] is not None
+    assert pipeline.content_processor.llm.calls == calls
+    assert first["duplicate_of"] is None
+
+
+def test_fast_metadata_failure_is_recorded(tmp_path, papers):
+    pipeline = build(tmp_path, [])
+    stats = {}
+    assert pipeline._fast_metadata(str(tmp_path / "missing.pdf"), stats=stats) == (None, False)
+    assert stats["fast_metadata"] is False and stats["fast_metadata_error"].startswith("FileNotFoundError")
+
+
+def test_extractor_options_reach_extraction_and_the_memory_budget(tmp_path, papers):
+    from pipeline import PDFExtractor
+
+    pipeline = AcademicPaperPipeline(
+        content_processor=ContentProcessor(llm=FakeChatModel()), storage=FakeStorage(),
+        cache=PaperCache(str(tmp_path / "cache")), checkpoints=CheckpointStore(str(tmp_path / "checkpoints.db")),
+        duplicate_threshold=None, memory_budget_bytes=10_000, pdf_extractor=PDFExtractor(max_bytes=200))
+    assert pipeline.memory_budget.max_text_bytes == 200
+    assert pipeline.memory_budget.estimate(papers[0]) <= 200
+
+    result = pipeline.process_batch(papers[:1])[0]
+    assert result["stored"] and not result["error"]
+    assert len(pipeline.cache.get_text(result["paper_id"]).encode("utf-8")) <= 200
+
+
+def test_repeated_papers_in_a_batch_are_processed_once(tmp_path, papers):
+    events = []
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(open(papers[0], "rb").read())
+    inputs = [papers[0], papers[1], papers[0], str(copy)]
+
+    results = build(tmp_path, events).process_batch(inputs)
+    assert events.count("extracted") == 2 and events.count("stored") == 2
+    assert [result["processed_file"] for result in results] == inputs
+    assert all(result["stored"] and not result["error"] for result in results)
+    assert results[2]["paper_id"] == results[3]["paper_id"] == results[0]["paper_id"]
+    assert results[3]["title"] == results[0]["title"]
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from pipeline.llm_client import FakeChatModel
+from pipeline.processor import ContentProcessor, PaperMetadata
+
+
+@pytest.fixture
+def processor():
+    return ContentProcessor(llm=FakeChatModel())
+
+
+def test_merge_partials_takes_metadata_from_the_first_part_that_has_it(processor):
+    partials = [
+        ({"title": "A Paper", "authors": [], "publication_date": "", "abstract": "We study."},
+         {"methodology": "Surveys.", "findings": ["More is better"], "keywords": ["surveys", "data"],
+          "summary": "First half."}),
+        ({"title": "", "authors": ["Jane Doe"], "publication_date": "2024-01-01", "abstract": ""},
+         {"methodology": "", "findings": ["more is better", "Less is worse"], "keywords": ["Data"],
+          "summary": "Second half."}),
+    ]
+    metadata, content, reduce_prompt = processor._merge_partials(partials)
+    assert metadata == {"title": "A Paper", "authors": ["Jane Doe"], "publication_date": "2024-01-01",
+                        "abstract": "We study."}
+    assert content["findings"] == ["More is better", "Less is worse"]
+    assert content["keywords"] == ["data", "surveys"]
+    assert "Part 2: Second half." in reduce_prompt
+
+
+def test_merge_partials_leaves_missing_fields_empty(processor):
+    partials = [({"title": "A Paper", "authors": None, "publication_date": "", "abstract": None},
+                 {"methodology": "", "findings": [], "keywords": [], "summary": ""})]
+    metadata, _, _ = processor._merge_partials(partials)
+    assert metadata == {"title": "A Paper", "authors": [], "publication_date": "", "abstract": ""}
+    PaperMetadata(**metadata)
+
+
+class RecordingModel(FakeChatModel):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return super().invoke(prompt)
+
+
+LONG_PAPER = " ".join(f"{i} RESULTS " + "The measured values grew steadily over time. " * 200 for i in range(1, 6))
+
+
+def test_known_metadata_is_not_asked_for_in_any_chunk():
+    model = RecordingModel()
+    processor = ContentProcessor(llm=model, chunk_tokens=1000)
+    known = PaperMetadata(title="Known", authors=["Jane Doe"], publication_date="2024-01-15", abstract="We study.")
+    stats = {}
+    metadata, content = processor.analyze_content(LONG_PAPER, stats=stats, metadata=known)
+    assert stats["chunks"] > 1
+    assert metadata == known
+    assert content.summary
+    assert model.prompts and not any("---METADATA---" in prompt for prompt in model.prompts)
+
+
+def test_metadata_is_asked_for_when_unknown():
+    model = RecordingModel()
+    ContentProcessor(llm=model, chunk_tokens=1000).analyze_content(LONG_PAPER)
+    assert any("---METADATA---" in prompt for prompt in model.prompts)
+
+
+@pytest.mark.parametrize("text", ["A Paper About Things. We study things carefully.", LONG_PAPER])
+def test_aanalyze_content_matches_analyze_content(text):
+    processor = ContentProcessor(llm=FakeChatModel(), chunk_tokens=1000, max_concurrency=2)
+    stats, astats = {}, {}
+    expected = processor.analyze_content(text, stats=stats)
+    assert asyncio.run(processor.aanalyze_content(text, stats=astats)) == expected
+    assert astats["chunks"] == stats["chunks"]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pandas as pd
+from pipeline.queries import PaperQueries
+
+
+class FakeClient:
+    """Answers the paging and partition metadata queries of PaperQueries from a DataFrame."""
+
+    def __init__(self, rows, partitioned=True):
+        self.rows = pd.DataFrame(rows)
+        self.partitioned = partitioned
+        self.queries = []
+
+    def query(self, query, job_config):
+        params = {p.name: p.value for p in job_config.query_parameters}
+        self.queries.append((query, params))
+        rows = self.rows
+        if "INFORMATION_SCHEMA.PARTITIONS" in query:
+            assert params == {"table_name": "t"}
+            oldest = rows["created_at"].min().floor("D") if len(rows) and self.partitioned else pd.NaT
+            unpartitioned = None if not len(rows) else not self.partitioned
+            result = pd.DataFrame({"oldest": [oldest], "unpartitioned": [unpartitioned]})
+        elif "MIN(created_at)" in query:
+            assert not self.partitioned
+            result = pd.DataFrame({"oldest": [rows["created_at"].min() if len(rows) else pd.NaT]})
+        else:
+            assert "created_at >= @since" in query
+            rows = rows[rows["created_at"] >= params["since"]]
+            if "cursor_created_at" in params:
+                at, paper_id = params["cursor_created_at"], params["cursor_paper_id"]
+                rows = rows[(rows["created_at"] < at) | ((rows["created_at"] == at) & (rows["paper_id"] < paper_id))]
+            result = rows.sort_values(["created_at", "paper_id"], ascending=False).head(params["limit"])
+        return SimpleNamespace(to_dataframe=lambda: result.reset_index(drop=True))
+
+
+def make_rows(days_ago):
+    now = datetime.now(timezone.utc)
+    return [{"paper_id": f"p{i}", "title": f"Paper {i}", "authors": [], "publication_date": "",
+             "keywords": [], "created_at": pd.Timestamp(now - timedelta(days=days))}
+            for i, days in enumerate(days_ago)]
+
+
+def test_small_table_stops_at_the_oldest_row():
+    client = FakeClient(make_rows([1, 2, 3]))
+    df, next_cursor = PaperQueries("p", "d", "t", client=client).fetch_recent_papers(page_size=10)
+    assert len(df) == 3 and next_cursor is None
+    # One windowed query and the partition metadata, never a query scanning the table
+    assert len(client.queries) == 2
+    assert "INFORMATION_SCHEMA.PARTITIONS" in client.queries[1][0]
+
+
+def test_window_widens_to_reach_older_rows():
+    client = FakeClient(make_rows([1, 200, 400]))
+    df, next_cursor = PaperQueries("p", "d", "t", client=client).fetch_recent_papers(page_size=2)
+    assert list(df["paper_id"]) == ["p0", "p1"] and next_cursor is not None
+    df, next_cursor = PaperQueries("p", "d", "t", client=client).fetch_recent_papers(page_size=2, cursor=next_cursor)
+    assert list(df["paper_id"]) == ["p2"] and next_cursor is None
+
+
+def test_empty_table():
+    client = FakeClient([])
+    client.rows = pd.DataFrame(columns=["paper_id", "created_at"])
+    df, next_cursor = PaperQueries("p", "d", "t", client=client).fetch_recent_papers()
+    assert len(df) == 0 and next_cursor is None
+
+
+def test_unpartitioned_table_falls_back_to_the_oldest_row():
+    client = FakeClient(make_rows([1, 200, 400]), partitioned=False)
+    queries = PaperQueries("p", "d", "t", client=client)
+    df, next_cursor = queries.fetch_recent_papers(page_size=5)
+    assert list(df["paper_id"]) == ["p0", "p1", "p2"] and next_cursor is None
@@ -0,0 +1,70 @@
+import pytest
+from benchmarks.corpus import generate_paper
+from pipeline import resources
+from pipeline.llm_client import FakeChatModel
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """Fresh process-wide resources backed by tmp_path and the fake chat model."""
+    for name, path in [("PAPER_LOCAL_DB", "papers.db"), ("PAPER_SEARCH_INDEX", "search.db"),
+                       ("PAPER_SIMILARITY_INDEX", "similarity"), ("PAPER_CACHE_DIR", "cache"),
+                       ("PAPER_CHECKPOINT_DB", "checkpoints.db"), ("PAPER_JOBS_DB", "jobs.db")]:
+        monkeypatch.setenv(name, str(tmp_path / path))
+    for name, value in [("_pipelines", {}), ("_job_queues", {}), ("_paper_queries", {}),
+                        ("_similarity_indexes", {}), ("_search_index", None), ("_local_storage", None),
+                        ("_llm_client", None), ("_llm", FakeChatModel()), ("_bigquery_client", object())]:
+        monkeypatch.setattr(resources, name, value)
+    return resources
+
+
+def test_storing_a_paper_drops_the_cached_reads_of_its_table(shared, tmp_path):
+    queries = shared.get_paper_queries("p", "d", "t")
+    other = shared.get_paper_queries("p", "d", "other")
+    queries.cache.set("recent", "stale page")
+    other.cache.set("recent", "page")
+
+    pipeline = shared.get_pipeline("p", "d", "t", backend="local")
+    assert pipeline.process_document(generate_paper(str(tmp_path / "paper.pdf"), num_pages=1))["stored"]
+    assert queries.cache.get("recent") is None
+    assert other.cache.get("recent") == "page"
+
+
+def test_shared_resources_are_built_once_across_threads(shared):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pipelines = list(pool.map(lambda _: shared.get_pipeline("p", "d", "t", backend="local"), range(8)))
+        queues = list(pool.map(lambda _: shared.get_job_queue("p", "d", "t", backend="local"), range(8)))
+    assert all(pipeline is pipelines[0] for pipeline in pipelines)
+    assert all(queue is queues[0] and queue.pipeline is pipelines[0] for queue in queues)
+    assert shared.get_llm_client() is shared.get_llm_client()
+    assert shared.get_similarity_index("fingerprints") is pipelines[0].fingerprints
+    assert shared.get_similarity_index() is not shared.get_similarity_index("fingerprints")
+    assert shared.get_pipeline("p", "d", "other", backend="local") is not pipelines[0]
+    assert "build_pipeline" in shared.timings
+    queues[0].close()
+
+
+def test_ensure_table_creates_each_table_once(shared, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(shared, "_checked_tables", set())
+    calls = []
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: shared.ensure_table("p.d.t", lambda: calls.append("t")), range(8)))
+    shared.ensure_table("p.d.other", lambda: calls.append("other"))
+    assert sorted(calls) == ["other", "t"]
+
+
+def test_failed_table_check_is_tried_again(shared, monkeypatch):
+    monkeypatch.setattr(shared, "_checked_tables", set())
+
+    def fail():
+        raise RuntimeError("BigQuery unavailable")
+
+    with pytest.raises(RuntimeError):
+        shared.ensure_table("p.d.t", fail)
+    calls = []
+    shared.ensure_table("p.d.t", lambda: calls.append("t"))
+    assert calls == ["t"]
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from pipeline.search_index import SearchIndex
+
+
+def paper(paper_id, title="", abstract="", summary="", authors=(), keywords=()):
+    return {"paper_id": paper_id, "title": title, "authors": list(authors), "keywords": list(keywords),
+            "abstract": abstract, "summary": summary, "publication_date": None, "created_at": "2024-01-01"}
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, query):
+        return SimpleNamespace(result=lambda page_size: [SimpleNamespace(items=row.items) for row in self.rows])
+
+
+def test_title_matches_rank_above_summary_matches(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.db"))
+    index.add_rows([paper("in-summary", title="Protein folding", summary="uses transformers"),
+                    paper("in-title", title="Transformers for text", summary="language models")])
+
+    assert [row["paper_id"] for row in index.search("transformers")] == ["in-title", "in-summary"]
+
+
+def test_every_term_is_matched_as_a_prefix(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.db"))
+    index.add_rows([paper("a", title="Graph neural networks", authors=["Ada Lovelace"]),
+                    paper("b", title="Graph databases", keywords=["storage"])])
+
+    assert [row["paper_id"] for row in index.search("netw")] == ["a"]
+    assert [row["paper_id"] for row in index.search("grap lovel")] == ["a"]
+    assert {row["paper_id"]: row["authors"] for row in index.search("graph")} == {"a": ["Ada Lovelace"], "b": []}
+    assert index.search("") == []
+
+
+def test_adding_a_paper_again_replaces_it(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = SearchIndex(path)
+    index.add_rows([paper("a", title="First draft"), paper("b", title="Other draft")])
+    index.add_rows([paper("a", title="Final version")])
+
+    assert index.search("first") == []
+    assert [row["title"] for row in index.search("final")] == ["Final version"]
+    assert len(index.search("draft")) == 1
+    # The paper_id mapping survives reopening the index
+    SearchIndex(path).add_rows([paper("b", title="Revised")])
+    assert SearchIndex(path).search("draft") == []
+
+
+def test_rebuild_replaces_the_contents(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.db"))
+    index.add_rows([paper("stale", title="Stale paper")])
+
+    count = index.rebuild(FakeClient([paper("a", title="Fresh paper"), paper("b", title="Fresh results")]),
+                          "project.dataset.papers", batch_size=1)
+    assert count == 2
+    assert index.search("stale") == []
+    assert sorted(row["paper_id"] for row in index.search("fresh")) == ["a", "b"]
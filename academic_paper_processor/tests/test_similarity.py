@@ -0,0 +1,47 @@
+import numpy as np
+from pipeline.similarity import SimilarityIndex
+
+TEXTS = {
+    "graphs": "spectral graph partitioning with eigenvectors of the laplacian",
+    "proteins": "protein folding prediction from amino acid sequences",
+    "vision": "convolutional networks for image segmentation of medical scans",
+}
+
+
+def test_similar_ranks_the_closest_paper_first(tmp_path):
+    index = SimilarityIndex(str(tmp_path))
+    index.add(list(TEXTS), list(TEXTS.values()), titles=list(TEXTS))
+
+    matches = index.similar(["graph partitioning using laplacian eigenvectors"], k=2)[0]
+    assert [match["paper_id"] for match in matches][0] == "graphs"
+    assert len(matches) == 2
+    assert index.related("proteins", k=5)[0]["paper_id"] != "proteins"
+
+
+def test_replacing_a_paper_keeps_one_row_and_updates_document_frequencies(tmp_path):
+    index = SimilarityIndex(str(tmp_path))
+    index.add(["a"], [TEXTS["graphs"]])
+    index.add(["a"], [TEXTS["proteins"]])
+
+    assert [match["paper_id"] for match in index.similar([TEXTS["proteins"]], k=5)[0]] == ["a"]
+    assert np.array_equal(np.array(index._df), (index.vectorize([TEXTS["proteins"]])[0] > 0).astype(np.float32))
+
+
+def test_instances_sharing_a_directory_allocate_distinct_rows(tmp_path):
+    first = SimilarityIndex(str(tmp_path), block_rows=2)
+    second = SimilarityIndex(str(tmp_path), block_rows=2)
+    first.add(["graphs"], [TEXTS["graphs"]])
+    second.add(["proteins"], [TEXTS["proteins"]])
+    first.add(["vision"], [TEXTS["vision"]])
+
+    for index in (first, second):
+        best = {paper_id: index.similar([text], k=1)[0][0]["paper_id"] for paper_id, text in TEXTS.items()}
+        assert best == {paper_id: paper_id for paper_id in TEXTS}
+
+
+def test_index_grows_past_its_initial_capacity(tmp_path):
+    index = SimilarityIndex(str(tmp_path))
+    index.add([f"paper{i}" for i in range(1100)], [f"topic{i} shared words" for i in range(1100)])
+
+    assert index._vectors.shape[0] >= 1100
+    assert SimilarityIndex(str(tmp_path)).similar(["topic1099"], k=1)[0][0]["paper_id"] == "paper1099"
@@ -0,0 +1,74 @@
+import pytest
+from benchmarks.fakes import FakeStorage
+from pipeline.processor import PaperMetadata, ResearchContent
+
+CONTENT = ResearchContent(methodology="Surveys.", findings=["More"], keywords=["surveys"], summary="Short.")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-01-15", "2024-01-15"),
+    (" 2024-01-15 ", "2024-01-15"),
+    ("2024-01-15T12:00:00", "2024-01-15"),
+    ("", None),
+    ("Unknown", None),
+    ("2024-13-45", None),
+])
+def test_build_row_only_writes_valid_dates(value, expected):
+    metadata = PaperMetadata(title="A Paper", authors=[], publication_date=value, abstract="")
+    assert FakeStorage()._build_row(metadata, CONTENT, "p1")["publication_date"] == expected
+
+
+class FakeBigQueryClient:
+    """Accepts every row except those whose title is in reject."""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.inserted = []
+
+    def create_table(self, table, exists_ok=False):
+        return table
+
+    def insert_rows_json(self, table_id, rows, row_ids=None):
+        errors = [{"index": i, "errors": [{"reason": "invalid"}]}
+                  for i, row in enumerate(rows) if row["title"] in self.reject]
+        failed = {error["index"] for error in errors}
+        self.inserted.extend(row for i, row in enumerate(rows) if i not in failed)
+        return errors
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.paper_ids = []
+
+    def add_rows(self, rows):
+        self.paper_ids.extend(row["paper_id"] for row in rows)
+
+
+def paper(title):
+    return PaperMetadata(title=title, authors=[], publication_date="", abstract="")
+
+
+def test_only_rows_written_to_bigquery_are_indexed(tmp_path):
+    from pipeline.storage import BigQueryStorage
+
+    index = RecordingIndex()
+    storage = BigQueryStorage("project", "dataset", "papers", client=FakeBigQueryClient(reject=["Bad"]),
+                              search_index=index)
+    errors = storage.store_papers([(paper("Good"), CONTENT, "p1"), (paper("Bad"), CONTENT, "p2"),
+                                   (paper("Fine"), CONTENT, "p3")])
+    assert list(errors) == [1]
+    with pytest.raises(Exception):
+        storage.store_paper(paper("Bad"), CONTENT, "p4")
+    assert index.paper_ids == ["p1", "p3"]
+
+
+def test_buffered_rows_are_indexed_once_written(tmp_path):
+    from pipeline.storage import BigQueryStorage
+
+    index = RecordingIndex()
+    storage = BigQueryStorage("project", "dataset", "papers", buffered=True, client=FakeBigQueryClient(reject=["Bad"]),
+                              search_index=index, max_interval=60, spill_path=str(tmp_path / "spill.jsonl"))
+    storage.store_papers([(paper("Good"), CONTENT, "p1"), (paper("Bad"), CONTENT, "p2")])
+    assert index.paper_ids == []
+    storage.close()
+    assert index.paper_ids == ["p1"]
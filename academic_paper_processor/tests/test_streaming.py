@@ -0,0 +1,54 @@
+from pipeline.llm_client import FakeChatModel
+from pipeline.processor import ContentProcessor, SectionStreamParser
+
+
+def test_section_stream_parser_completes_sections_as_headers_arrive():
+    parser = SectionStreamParser()
+    response = "---METADATA---\nTitle: A Paper\n\n---METHODOLOGY---\nSurveys.\n---SUMMARY---\nShort."
+    completed = []
+    for start in range(0, len(response), 5):
+        completed += parser.feed(response[start:start + 5])
+    assert completed == [("METADATA", "Title: A Paper"), ("METHODOLOGY", "Surveys.")]
+    assert parser.close() == [("SUMMARY", "Short.")]
+    assert parser.close() == []
+
+
+def test_section_stream_parser_handles_headers_split_across_pieces():
+    parser = SectionStreamParser()
+    assert parser.feed("---KEY") == []
+    assert parser.feed("WORDS---\na, b\n--") == []
+    assert parser.feed("-SUMMARY---\nDone.") == [("KEYWORDS", "a, b")]
+    assert parser.close() == [("SUMMARY", "Done.")]
+
+
+def test_stream_analysis_matches_analyze_content():
+    processor = ContentProcessor(llm=FakeChatModel())
+    text = "A Paper About Things. We study things carefully and report findings."
+    events = list(processor.stream_analysis(text))
+    assert [event for event, _ in events] == ["metadata", "methodology", "findings", "keywords", "summary", "content"]
+    metadata, content = processor.analyze_content(text)
+    assert events[0][1] == metadata and events[-1][1] == content
+
+
+def test_stream_document_yields_stages_fields_and_results(tmp_path):
+    from benchmarks.corpus import generate_paper
+    from benchmarks.fakes import FakeStorage
+    from pipeline import AcademicPaperPipeline, CheckpointStore, PaperCache
+
+    pipeline = AcademicPaperPipeline(
+        content_processor=ContentProcessor(llm=FakeChatModel()), storage=FakeStorage(),
+        cache=PaperCache(str(tmp_path / "cache")), checkpoints=CheckpointStore(str(tmp_path / "checkpoints.db")),
+        duplicate_threshold=None)
+    paper = generate_paper(str(tmp_path / "paper.pdf"), num_pages=1)
+
+    events = list(pipeline.stream_document(paper))
+    stages = [value for event, value in events if event == "stage"]
+    assert stages == ["extracting", "analyzing", "storing"]
+    # The metadata read from the PDF comes before the text is extracted
+    assert [event for event, _ in events].index("metadata") < events.index(("stage", "analyzing"))
+    assert events[-1][0] == "results" and events[-1][1]["stored"]
+    assert "content" in [event for event, _ in events]
+
+    # A known paper replays the same fields from the cache
+    replayed = list(pipeline.stream_document(paper))
+    assert replayed[-1][1]["title"] == events[-1][1]["title"]